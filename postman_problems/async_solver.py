@@ -0,0 +1,182 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from postman_problems.circuit import Circuit
+from postman_problems.graph import add_augmenting_path_to_graph, add_doubled_edges_to_graph, \
+    add_balancing_paths_to_graph, create_eulerian_circuit
+from postman_problems.solver import PostmanSolver, is_tree_augmentation, get_odd_node_distances, \
+    get_min_weight_matching
+
+logger_async = logging.getLogger('{0}.{1}'.format(__name__, 'async'))
+
+# graph and solver sessions of each worker process in the default process pool, set up by `_init_worker`
+_worker_graph = None
+_worker_solvers = {}
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+    _worker_solvers.clear()
+
+
+def _get_solver(solver):
+    """
+    `solver` itself when stages run in threads.  In a worker process `solver` is a (postman_type, edge_weight) key
+    for a session on the worker's graph, created on first use and reused by later solves landing on the same worker.
+    """
+    if isinstance(solver, PostmanSolver):
+        return solver
+    if solver not in _worker_solvers:
+        _worker_solvers[solver] = PostmanSolver(_worker_graph, solver[0], solver[1], copy=False)
+    return _worker_solvers[solver]
+
+
+# Stages.  Each takes the outputs of the previous stages as arguments, so stages of one solve can run on different
+# workers, and returns something small enough to send back from a worker process.
+
+def _odd_nodes_stage(solver):
+    """Odd nodes of the required graph, and whether doubling every edge is the augmentation (tree)"""
+    solver = _get_solver(solver)
+    if solver.graph.is_directed():
+        return [], False
+    return solver.odd_nodes(), is_tree_augmentation(solver.required_graph(), solver.graph)
+
+
+def _distances_stage(solver, odd_nodes):
+    solver = _get_solver(solver)
+    return get_odd_node_distances(solver.graph, odd_nodes, solver.edge_weight)
+
+
+def _matching_stage(distances):
+    return get_min_weight_matching(distances)
+
+
+def _circuit_stage(solver, matching, start_node):
+    """Augment the required graph with `matching` (doubling every edge when it's None) and walk it"""
+    solver = _get_solver(solver)
+    g_req = solver.required_graph()
+    if solver.graph.is_directed():
+        g_augmented = add_balancing_paths_to_graph(g_req, solver.balancing_paths())
+    elif matching is None:
+        g_augmented = add_doubled_edges_to_graph(g_req, solver.edge_weight)
+    else:
+        g_augmented = add_augmenting_path_to_graph(g_req, matching)
+    return Circuit(create_eulerian_circuit(g_augmented, solver.graph, start_node), gap=0.0)
+
+
+class AsyncPostmanSolver(object):
+    """
+    asyncio front end to the postman solvers for services that can't block their event loop.  Each CPU heavy stage
+    (odd nodes, distances, matching, circuit) runs in an executor and is awaited separately, so a solve can be
+    cancelled between stages and many solves on one graph can run side by side with `asyncio.gather`.
+
+    By default stages run in a process pool that gets the graph once per worker process, and each worker keeps a
+    session per postman type and edge weight: solves differing only by start node reuse the required graph.  A thread
+    pool can be passed instead, for graphs too large to copy into worker processes.  The graph must not be modified
+    while solves run.
+
+    Cancelling a solve stops it from starting its next stage.  A stage already running in a worker runs to completion
+    and its result is dropped.
+
+    Use as an async context manager, or call `close` to shut the default process pool down.
+    """
+
+    def __init__(self, graph, executor=None, max_workers=None):
+        """
+        Args:
+            graph (networkx MultiGraph): loaded graph, shared by every solve
+            executor (concurrent.futures.Executor): executor to run stages in (optional).  A thread pool shares
+                `graph` directly.  A process pool the caller owns is sent the graph with every stage, so prefer the
+                default.
+            max_workers (int): number of processes of the default process pool
+        """
+        self.graph = graph
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(graph,))
+        self.executor = executor
+        self._in_process = self._own_executor
+        self._solvers = {}
+
+    def _solver(self, postman_type, edge_weight):
+        """What the stages get as `solver`: a worker session key or, for a caller's executor, a session"""
+        key = (postman_type, edge_weight)
+        if self._in_process:
+            return key
+        if key not in self._solvers:
+            self._solvers[key] = PostmanSolver(self.graph, postman_type, edge_weight, copy=False)
+        return self._solvers[key]
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def solve(self, postman_type='chinese', start_node=None, edge_weight='distance'):
+        """
+        Args:
+            postman_type (str): "chinese" or "rural"
+            start_node (str): name of starting (and ending) node
+            edge_weight (str): name edge attribute that indicates distance to minimize
+
+        Returns:
+            circuit.Circuit: see `solver.cpp` and `solver.rpp`
+        """
+        solver = self._solver(postman_type, edge_weight)
+
+        logger_async.info('{} stage: odd nodes'.format(postman_type))
+        odd_nodes, is_tree = await self._run(_odd_nodes_stage, solver)
+
+        if is_tree:
+            matching = None
+        elif len(odd_nodes) <= 2:
+            matching = [tuple(odd_nodes)] if odd_nodes else []
+        else:
+            logger_async.info('{} stage: distances'.format(postman_type))
+            distances = await self._run(_distances_stage, solver, odd_nodes)
+            logger_async.info('{} stage: matching'.format(postman_type))
+            matching = await self._run(_matching_stage, distances)
+
+        logger_async.info('{} stage: circuit'.format(postman_type))
+        return await self._run(_circuit_stage, solver, matching, start_node)
+
+    async def cpp(self, start_node=None, edge_weight='distance'):
+        """Async `solver.cpp_from_graph`"""
+        return await self.solve('chinese', start_node, edge_weight)
+
+    async def rpp(self, start_node=None, edge_weight='distance'):
+        """Async `solver.rpp_from_graph`"""
+        return await self.solve('rural', start_node, edge_weight)
+
+    def close(self):
+        """Shut down the default process pool (a caller's executor is left alone)"""
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+
+async def cpp_async(graph, start_node=None, edge_weight='distance', executor=None):
+    """
+    One-off async CPP.  Without an `executor` this starts and stops a process pool, so for many solves on the same
+    graph keep an `AsyncPostmanSolver` instead.
+
+    Returns:
+        circuit.Circuit
+    """
+    async with AsyncPostmanSolver(graph, executor, max_workers=1) as solver:
+        return await solver.cpp(start_node, edge_weight)
+
+
+async def rpp_async(graph, start_node=None, edge_weight='distance', executor=None):
+    """
+    One-off async RPP.  See `cpp_async`.
+
+    Returns:
+        circuit.Circuit
+    """
+    async with AsyncPostmanSolver(graph, executor, max_workers=1) as solver:
+        return await solver.rpp(start_node, edge_weight)
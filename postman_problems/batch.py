@@ -0,0 +1,221 @@
+import os
+import time
+import signal
+import logging
+import argparse
+import itertools
+import collections
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from postman_problems.solver import cpp, rpp
+from postman_problems.stats import StatsAccumulator
+from postman_problems.circuit import CsvCircuitWriter, stream_circuit
+
+logger_batch = logging.getLogger('{0}.{1}'.format(__name__, 'batch'))
+
+
+class JobTimeout(Exception):
+    """Raised inside a batch worker when a job runs past its timeout"""
+
+
+def _raise_job_timeout(signum, frame):
+    raise JobTimeout()
+
+
+def find_edgelists(path):
+    """
+    Collect the edgelists for a batch.
+
+    Args:
+        path (str): a directory (every .csv file in it is an edgelist) or a manifest: a text file with one edgelist
+            filename per line.  Relative filenames in a manifest are relative to the manifest's directory.  Blank lines
+            and lines starting with "#" are skipped.
+
+    Returns:
+        list[str]: edgelist filenames, sorted for directories and in manifest order for manifests
+    """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, f) for f in os.listdir(path) if f.endswith('.csv'))
+
+    manifest_dir = os.path.dirname(path)
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [os.path.join(manifest_dir, line) for line in lines if line and not line.startswith('#')]
+
+
+def _job_names(edgelists):
+    """Output name for each edgelist: its filename without extension, suffixed with a counter when repeated"""
+    seen = collections.Counter()
+    names = []
+    for edgelist in edgelists:
+        name = os.path.splitext(os.path.basename(edgelist))[0]
+        seen[name] += 1
+        names.append(name if seen[name] == 1 else '{}_{}'.format(name, seen[name]))
+    return names
+
+
+def solve_job(edgelist, name, output_dir, postman_type='chinese', start_node=None, edge_weight='distance',
+              timeout=None):
+    """
+    Solve one edgelist and write its circuit (`<name>_circuit.csv`) and summary stats (`<name>_stats.csv`) to
+    `output_dir`.  Runs inside a batch worker process.  Never raises: failures and timeouts are reported in the result.
+
+    Args:
+        edgelist (str): filename of edgelist.  See `cpp` and `rpp` for the expected format.
+        name (str): prefix of the output files
+        output_dir (str): directory to write the output files to
+        postman_type (str): "chinese" or "rural"
+        start_node (str): name of starting (and ending) node for the solution route
+        edge_weight (str): name of edge attribute that indicates distance to minimize
+        timeout (float): seconds after which the job is abandoned.  Enforced with SIGALRM, so only on platforms that
+            have `signal.setitimer`.
+
+    Returns:
+        OrderedDict: edgelist, status ("ok", "timeout" or "error"), seconds, error message and the summary stats of
+        the solution (for solved jobs)
+    """
+    result = collections.OrderedDict([('edgelist', edgelist), ('status', 'ok'), ('seconds', None), ('error', None)])
+    postman_algo = cpp if postman_type == 'chinese' else rpp
+
+    use_alarm = timeout is not None and hasattr(signal, 'setitimer')
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_job_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+
+    start = time.perf_counter()
+    try:
+        # components of a disconnected CPP edgelist are solved in this worker: a nested pool would oversubscribe the
+        # batch and could not be abandoned on timeout
+        extra = {'max_workers': 1} if postman_type == 'chinese' else {}
+        circuit, graph = postman_algo(edgelist, start_node=start_node, edge_weight=edge_weight, **extra)
+        if isinstance(circuit, list):
+            # disconnected CPP edgelist: one circuit per connected component, written one after the other
+            circuit = itertools.chain.from_iterable(circuit)
+        accumulator = StatsAccumulator(edge_weight)
+        with CsvCircuitWriter(os.path.join(output_dir, '{}_circuit.csv'.format(name)), (edge_weight,)) as writer:
+            stream_circuit(circuit, [writer, accumulator])
+        stats = accumulator.stats()
+        pd.DataFrame([stats]).to_csv(os.path.join(output_dir, '{}_stats.csv'.format(name)), index=False)
+        result.update(stats)
+    except JobTimeout:
+        result['status'] = 'timeout'
+    except Exception as e:
+        result['status'] = 'error'
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def solve_batch(edgelists, output_dir, postman_type='chinese', start_node=None, edge_weight='distance',
+                timeout=None, max_workers=None):
+    """
+    Solve many edgelists across a pool of worker processes, so interpreter startup and imports are paid once per
+    worker rather than once per edgelist.  Writes each job's circuit and stats (see `solve_job`) plus a
+    `batch_summary.csv` with one row per job to `output_dir`.
+
+    Args:
+        edgelists (list[str]): edgelist filenames.  See `find_edgelists`.
+        output_dir (str): directory to write results to.  Created if it doesn't exist.
+        postman_type (str): "chinese" or "rural"
+        start_node (str): name of starting (and ending) node for every solution route
+        edge_weight (str): name of edge attribute that indicates distance to minimize
+        timeout (float): seconds allowed per job
+        max_workers (int): number of worker processes.  Defaults to the number of CPUs.
+
+    Returns:
+        pandas.DataFrame: the batch summary, one row per job in the order of `edgelists`
+    """
+    assert postman_type in ('chinese', 'rural'), 'postman_type must be "chinese" or "rural"'
+    os.makedirs(output_dir, exist_ok=True)
+    names = _job_names(edgelists)
+
+    start = time.perf_counter()
+    results = [None] * len(edgelists)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(solve_job, edgelist, name, output_dir, postman_type, start_node, edge_weight,
+                                   timeout): i for i, (edgelist, name) in enumerate(zip(edgelists, names))}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            logger_batch.info('{} {} ({:.2f}s)'.format(result['edgelist'], result['status'], result['seconds']))
+    elapsed = time.perf_counter() - start
+
+    summary = pd.DataFrame(results)
+    summary.to_csv(os.path.join(output_dir, 'batch_summary.csv'), index=False)
+
+    status_counts = collections.Counter(summary['status']) if len(summary) else collections.Counter()
+    logger_batch.info('{} jobs in {:.2f}s: {:.2f} jobs per second ({} ok, {} timeout, {} error)'.format(
+        len(results), elapsed, len(results) / elapsed if elapsed else 0.0,
+        status_counts['ok'], status_counts['timeout'], status_counts['error']))
+    return summary
+
+
+def get_args():
+    """
+    Returns:
+        argparse.Namespace: parsed arguments from the user
+    """
+    parser = argparse.ArgumentParser(description='Solve a batch of Chinese or Rural Postman Problems')
+
+    parser.add_argument('--input',
+                        required=True,
+                        type=str,
+                        help='Directory of edgelist CSVs, or a manifest file listing one edgelist filename per line.')
+
+    parser.add_argument('--output_dir',
+                        required=True,
+                        type=str,
+                        help='Directory to write each circuit, its summary stats and the batch summary to.')
+
+    parser.add_argument('--postman_type',
+                        required=False,
+                        type=str,
+                        default='chinese',
+                        choices=['chinese', 'rural'],
+                        help='Postman problem to solve for every edgelist.')
+
+    parser.add_argument('--start_node',
+                        required=False,
+                        type=str,
+                        default=None,
+                        help='Node to start the CPP solution from (optional).  Must exist in every edgelist.')
+
+    parser.add_argument('--edge_weight',
+                        required=False,
+                        type=str,
+                        default='distance',
+                        help='Edge attribute used to specify the distance between nodes (optional).  Default is '
+                             '"distance".')
+
+    parser.add_argument('--timeout',
+                        required=False,
+                        type=float,
+                        default=None,
+                        help='Seconds allowed per edgelist.  Jobs that run longer are reported as "timeout".')
+
+    parser.add_argument('--max_workers',
+                        required=False,
+                        type=int,
+                        default=None,
+                        help='Number of worker processes.  Defaults to the number of CPUs.')
+
+    return parser.parse_args()
+
+
+def postman_batch():
+    """Parse command line arguments and solve every edgelist in the batch"""
+    args = get_args()
+    logging.basicConfig(level=logging.INFO)
+
+    edgelists = find_edgelists(args.input)
+    logger_batch.info('Solving {} edgelists...'.format(len(edgelists)))
+    solve_batch(edgelists, args.output_dir, postman_type=args.postman_type, start_node=args.start_node,
+                edge_weight=args.edge_weight, timeout=args.timeout, max_workers=args.max_workers)
+
+
+if __name__ == '__main__':
+    postman_batch()
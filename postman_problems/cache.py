@@ -0,0 +1,86 @@
+import os
+import pickle
+import hashlib
+import tempfile
+
+
+def hash_graph(graph):
+    """
+    Content hash of a graph: its class (directed or not), nodes, edges, keys and edge attributes, in graph order.  Two
+    graphs loaded from the same edgelist hash the same, so checkpoints survive across processes, but the same edgelist
+    loaded directed and undirected does not.
+
+    Args:
+        graph (networkx graph): graph to hash
+
+    Returns:
+        str: hex digest
+    """
+    h = hashlib.sha256()
+    h.update('{}|{}|'.format(type(graph).__name__, graph.is_directed()).encode())
+    for n in graph.nodes():
+        h.update(repr(n).encode())
+    h.update(b'|')
+    for u, v, k, d in graph.edges(keys=True, data=True):
+        h.update(repr((u, v, k, sorted(d.items(), key=lambda kv: str(kv[0])))).encode())
+    return h.hexdigest()
+
+
+class StageCache(object):
+    """
+    Checkpoints of solver stage outputs (odd nodes, distances, matching, circuit) pickled to a local directory.  Each
+    entry is keyed by a hash of the input graph and the solve parameters, so an interrupted solve resumes from its last
+    completed stage and an identical rerun only costs a cache load.
+
+    Entries are unpickled, so only point this at a directory you trust.
+    """
+
+    def __init__(self, cache_dir):
+        """
+        Args:
+            cache_dir (str): directory for checkpoint files.  Created if it doesn't exist.
+        """
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        """
+        Args:
+            parts: anything with a stable repr: graph hash, parameters, stage name...
+
+        Returns:
+            str: hex digest identifying a cache entry
+        """
+        return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+    def _path(self, stage, key):
+        return os.path.join(self.cache_dir, '{}-{}.pkl'.format(stage, key))
+
+    def load(self, stage, key):
+        """
+        Returns:
+            tuple(bool, object): whether a checkpoint was found, and its value (None if not found)
+        """
+        try:
+            with open(self._path(stage, key), 'rb') as f:
+                return True, pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+    def save(self, stage, key, value):
+        """Write a checkpoint.  Written to a temp file first, so a crash mid write never leaves a corrupt entry."""
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(stage, key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    def clear(self):
+        """Remove every checkpoint in the cache directory"""
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.pkl'):
+                os.remove(os.path.join(self.cache_dir, filename))
@@ -0,0 +1,467 @@
+import os
+import csv
+import json
+from array import array
+from collections.abc import Mapping, Sequence
+
+
+class EdgeAttributes(Mapping):
+    """
+    Read-only view of the attributes of one circuit edge: the attributes of the walked edge in the original graph,
+    with its `id` and with `augmented` set to True when this walk is a double back.  Nothing is copied: lookups go
+    straight to the original graph's edge dict, which is never modified.
+    """
+
+    __slots__ = ('_attr', '_edge_id', '_augmented')
+
+    def __init__(self, attr, edge_id, augmented):
+        self._attr = attr
+        self._edge_id = edge_id
+        self._augmented = augmented
+
+    def __getitem__(self, k):
+        if k == 'augmented':
+            if self._augmented:
+                return True
+            raise KeyError(k)
+        if k == 'id' and self._edge_id is not None:
+            return self._edge_id
+        return self._attr[k]
+
+    def __iter__(self):
+        for k in self._attr:
+            if k not in ('id', 'augmented'):
+                yield k
+        if self._edge_id is not None:
+            yield 'id'
+        if self._augmented:
+            yield 'augmented'
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CircuitEdge(object):
+    """
+    One step of a postman circuit.  Behaves like the 4-tuple (node_from, node_to, key, attributes) that circuits
+    have always been made of, but only holds the five fields below and a reference to the original edge's attributes.
+
+    Attributes:
+        node_from: name of the node the edge is walked from
+        node_to: name of the node the edge is walked to
+        key: key of the walked edge in the original MultiGraph
+        edge_id: `id` attribute of the walked edge
+        augmented (bool): is this walk a double back of an edge already walked (or an optional edge)?
+    """
+
+    __slots__ = ('node_from', 'node_to', 'key', 'edge_id', 'augmented', '_attr')
+
+    def __init__(self, node_from, node_to, key, edge_id, augmented, attr):
+        self.node_from = node_from
+        self.node_to = node_to
+        self.key = key
+        self.edge_id = edge_id
+        self.augmented = bool(augmented)
+        self._attr = attr
+
+    @property
+    def attributes(self):
+        """EdgeAttributes: attributes of the walked edge, read on demand"""
+        return EdgeAttributes(self._attr, self.edge_id, self.augmented)
+
+    def __getitem__(self, i):
+        return (self.node_from, self.node_to, self.key, self.attributes)[i]
+
+    def __len__(self):
+        return 4
+
+    def __iter__(self):
+        return iter((self.node_from, self.node_to, self.key, self.attributes))
+
+    def __eq__(self, other):
+        if isinstance(other, (CircuitEdge, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.node_from, self.node_to, self.key, self.edge_id, self.augmented))
+
+    def __repr__(self):
+        return repr((self.node_from, self.node_to, self.key, dict(self.attributes)))
+
+
+class Circuit(Sequence):
+    """
+    Array backed postman circuit.  Node names are interned once and each step is stored as two node ids, the edge
+    key, id, augmented flag and a reference to the original edge's attributes.  Indexing materializes a
+    `CircuitEdge` on demand; slicing returns a new Circuit.
+
+    Attributes:
+        gap (float): optimality gap of the route when the solver knows it: 0.0 for an exact solve, or an upper bound
+            on (distance - optimal distance) / optimal distance for a heuristic one.  None when unknown.
+    """
+
+    def __init__(self, edges=(), gap=None):
+        """
+        Args:
+            edges (iterable): CircuitEdges or (node_from, node_to, key, attributes) tuples
+            gap (float): optimality gap of the route, if known
+        """
+        self.gap = gap
+        self._nodes = []
+        self._node_index = {}
+        self._from = array('l')
+        self._to = array('l')
+        self._keys = []
+        self._edge_ids = []
+        self._augmented = bytearray()
+        self._attrs = []
+        for edge in edges:
+            self.append(edge)
+
+    def _node_id(self, node):
+        node_id = self._node_index.get(node)
+        if node_id is None:
+            node_id = self._node_index[node] = len(self._nodes)
+            self._nodes.append(node)
+        return node_id
+
+    def append(self, edge):
+        """
+        Args:
+            edge (CircuitEdge or tuple): step to add to the end of the circuit
+        """
+        if isinstance(edge, CircuitEdge):
+            edge_id, augmented, attr = edge.edge_id, edge.augmented, edge._attr
+        else:
+            edge_id, augmented, attr = edge[3].get('id'), edge[3].get('augmented'), edge[3]
+        self._from.append(self._node_id(edge[0]))
+        self._to.append(self._node_id(edge[1]))
+        self._keys.append(edge[2])
+        self._edge_ids.append(edge_id)
+        self._augmented.append(1 if augmented else 0)
+        self._attrs.append(attr)
+
+    def __len__(self):
+        return len(self._from)
+
+    def _copy_with(self, take):
+        """New Circuit sharing this one's node names, with each per-step column passed through `take`"""
+        circuit = Circuit()
+        circuit._nodes = list(self._nodes)
+        circuit._node_index = dict(self._node_index)
+        for column in ('_from', '_to', '_keys', '_edge_ids', '_augmented', '_attrs'):
+            setattr(circuit, column, take(getattr(self, column)))
+        return circuit
+
+    def rotate(self, offset):
+        """
+        Rotate the circuit to start at step `offset`, copying each column with two slices.
+
+        Args:
+            offset (int): index of the step that becomes the first step
+
+        Returns:
+            Circuit
+        """
+        rotated = self._copy_with(lambda column: column[offset:] + column[:offset])
+        rotated.gap = self.gap  # same route, so same cost
+        return rotated
+
+    def start_offsets(self):
+        """dict: index of the first step leaving each node, in order of first visit, read from the node id column"""
+        offsets = {}
+        for i, node_id in enumerate(self._from):
+            offsets.setdefault(node_id, i)
+        return {self._nodes[node_id]: i for node_id, i in offsets.items()}
+
+    def start_offset(self, node):
+        """int: index of the first step leaving `node`, found with a C level search of the node ids.  None if never"""
+        node_id = self._node_index.get(node)
+        if node_id is None or node_id not in self._from:
+            return None
+        return self._from.index(node_id)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._copy_with(lambda column: column[i])
+        if i < 0:
+            i += len(self)
+        return CircuitEdge(self._nodes[self._from[i]], self._nodes[self._to[i]], self._keys[i], self._edge_ids[i],
+                           self._augmented[i], self._attrs[i])
+
+    def __repr__(self):
+        return '<Circuit: {} edges>'.format(len(self))
+
+    def augmented_flags(self):
+        """bytes: 1 for each step that is a double back, 0 otherwise, without materializing the edges"""
+        return bytes(self._augmented)
+
+    def attribute_column(self, name, default=None):
+        """
+        Value of an edge attribute at each step, read straight from the original edges' attributes without
+        materializing the edges.  Use `augmented_flags` for "augmented".
+
+        Args:
+            name (str): edge attribute
+            default: value for steps whose edge doesn't have the attribute
+
+        Returns:
+            list
+        """
+        return [attr.get(name, default) for attr in self._attrs]
+
+
+def _assert_circuit_is_closed(circuit):
+    assert len(circuit) > 0 and circuit[0][0] == circuit[-1][1], \
+        'Circuit must start and end at the same node to be rotated.'
+
+
+def get_circuit_start_offsets(circuit):
+    """
+    Find where a closed circuit first leaves each node it visits.  Rotating the circuit to begin at that step gives
+    the same route (same cost) starting and ending at that node.  One pass over the circuit.
+
+    Args:
+        circuit (sequence): closed circuit from `cpp` or `rpp`
+
+    Returns:
+        dict: mapping each node visited to the index of the first step leaving it, in order of first visit
+    """
+    _assert_circuit_is_closed(circuit)
+    if isinstance(circuit, Circuit):
+        return circuit.start_offsets()
+    offsets = {}
+    for i, edge in enumerate(circuit):
+        offsets.setdefault(edge[0], i)
+    return offsets
+
+
+def rotate_circuit(circuit, start_node):
+    """
+    Re-root a closed circuit at another node it visits, without solving again: the route cost doesn't depend on
+    where it starts.  O(circuit length), no graph work.
+
+    Args:
+        circuit (sequence): closed circuit from `cpp` or `rpp`
+        start_node (str): node the rotated circuit should start and end at
+
+    Returns:
+        Circuit (or list when `circuit` is a plain list) starting and ending at `start_node`
+    """
+    _assert_circuit_is_closed(circuit)
+    if isinstance(circuit, Circuit):
+        offset = circuit.start_offset(start_node)
+    else:
+        offset = next((i for i, edge in enumerate(circuit) if edge[0] == start_node), None)
+    if offset is None:
+        raise ValueError('Node {} is not visited by the circuit.'.format(start_node))
+    if isinstance(circuit, Circuit):
+        return circuit.rotate(offset)
+    return list(circuit[offset:]) + list(circuit[:offset])
+
+
+def iter_circuit_rotations(circuit, start_nodes=None):
+    """
+    Generate the circuit re-rooted at each distinct depot, for serving several crews from one solve.  The offsets of
+    every node are found in a single pass and each rotation is built lazily as it is requested.
+
+    Args:
+        circuit (sequence): closed circuit from `cpp` or `rpp`
+        start_nodes (list): depots to rotate to.  None (default) yields every node visited by the circuit.
+
+    Returns:
+        generator of tuple(str, Circuit): depot and the circuit starting and ending there
+    """
+    offsets = get_circuit_start_offsets(circuit)
+    for node in (offsets if start_nodes is None else start_nodes):
+        if node not in offsets:
+            raise ValueError('Node {} is not visited by the circuit.'.format(node))
+        if isinstance(circuit, Circuit):
+            yield node, circuit.rotate(offsets[node])
+        else:
+            yield node, list(circuit[offsets[node]:]) + list(circuit[:offsets[node]])
+
+
+CIRCUIT_FIELDS = ['step', 'node_from', 'node_to', 'key', 'id', 'augmented']
+
+
+def _edge_record(step, edge):
+    """Flat dict of a circuit edge: position in the circuit, ends, key, id and augmented flag"""
+    return {
+        'step': step,
+        'node_from': edge[0],
+        'node_to': edge[1],
+        'key': edge[2],
+        'id': edge[3].get('id'),
+        'augmented': bool(edge[3].get('augmented'))
+    }
+
+
+def _json_default(value):
+    """numpy scalars (from pandas edgelists) aren't JSON serializable, but they know how to become python ones"""
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
+
+
+class CircuitWriter(object):
+    """
+    Base class for sinks that write a circuit to a file one edge at a time, so a circuit never needs to be held in
+    memory.  Subclasses implement `_write_header`, `_write_edge` and `_write_footer`.
+
+    Writers are context managers.  Files opened from a filename are closed on exit; file-like objects passed in
+    (open files, `socket.makefile('w')`, StringIO...) are flushed and left open for the caller.
+    """
+
+    def __init__(self, file):
+        """
+        Args:
+            file (str or file-like): filename to write to or a writable text file-like object
+        """
+        self._owns_file = isinstance(file, (str, os.PathLike))
+        self.file = open(file, 'w', newline='') if self._owns_file else file
+        self.steps = 0
+        self._write_header()
+
+    def write(self, edge):
+        """
+        Args:
+            edge (tuple): circuit edge: "from" node, "to" node, edge key and edge attributes
+        """
+        self._write_edge(self.steps, edge)
+        self.steps += 1
+
+    def close(self):
+        self._write_footer()
+        if self._owns_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _write_header(self):
+        pass
+
+    def _write_edge(self, step, edge):
+        raise NotImplementedError
+
+    def _write_footer(self):
+        pass
+
+
+class CsvCircuitWriter(CircuitWriter):
+    """Writes one CSV row per circuit edge"""
+
+    def __init__(self, file, edge_attrs=('distance',)):
+        """
+        Args:
+            file (str or file-like): filename to write to or a writable text file-like object
+            edge_attrs (tuple[str]): edge attributes to write as extra columns
+        """
+        self.edge_attrs = list(edge_attrs)
+        self._writer = None
+        super(CsvCircuitWriter, self).__init__(file)
+
+    def _write_header(self):
+        self._writer = csv.DictWriter(self.file, fieldnames=CIRCUIT_FIELDS + self.edge_attrs, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def _write_edge(self, step, edge):
+        row = _edge_record(step, edge)
+        for attr in self.edge_attrs:
+            row[attr] = edge[3].get(attr)
+        self._writer.writerow(row)
+
+
+class JsonlCircuitWriter(CircuitWriter):
+    """Writes one JSON object per line per circuit edge, with all of the edge's attributes"""
+
+    def _write_edge(self, step, edge):
+        row = dict(edge[3])
+        row.update(_edge_record(step, edge))
+        self.file.write(json.dumps(row, default=_json_default) + '\n')
+
+
+class GeoJsonCircuitWriter(CircuitWriter):
+    """
+    Writes the circuit as a GeoJSON FeatureCollection with one LineString feature per circuit edge.  Features are
+    written as they arrive, so only the node coordinates are held in memory.
+    """
+
+    def __init__(self, file, graph, x='X', y='Y'):
+        """
+        Args:
+            file (str or file-like): filename to write to or a writable text file-like object
+            graph (networkx graph): graph with `x` and `y` node attributes (see `viz.add_node_attributes`)
+            x (str): name of node attribute with the X coordinate
+            y (str): name of node attribute with the Y coordinate
+        """
+        self.coords = {n: [d[x], d[y]] for n, d in graph.nodes(data=True)}
+        super(GeoJsonCircuitWriter, self).__init__(file)
+
+    def _write_header(self):
+        self.file.write('{"type": "FeatureCollection", "features": [\n')
+
+    def _write_edge(self, step, edge):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'LineString', 'coordinates': [self.coords[edge[0]], self.coords[edge[1]]]},
+            'properties': _edge_record(step, edge)
+        }
+        self.file.write((',\n' if step else '') + json.dumps(feature, default=_json_default))
+
+    def _write_footer(self):
+        self.file.write('\n]}\n')
+
+
+def get_circuit_writer(filename, graph=None):
+    """
+    Pick a circuit writer from the extension of `filename`: .csv, .jsonl (or .ndjson) or .geojson.  Anything else,
+    including a plain .json, raises ValueError rather than guessing a format.
+
+    Args:
+        filename (str): file to write the circuit to
+        graph (networkx graph): graph with node coordinates.  Only needed for GeoJSON.
+
+    Returns:
+        CircuitWriter
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        return CsvCircuitWriter(filename)
+    if ext in ('.jsonl', '.ndjson'):
+        return JsonlCircuitWriter(filename)
+    if ext == '.geojson':
+        assert graph is not None, 'GeoJSON circuit output needs a graph with node coordinates.'
+        return GeoJsonCircuitWriter(filename, graph)
+    raise ValueError('Unknown circuit output format "{}".  Expected .csv, .jsonl or .geojson'.format(ext))
+
+
+def stream_circuit(circuit, sinks):
+    """
+    Feed a circuit through one or more sinks, one edge at a time.  With the generator returned by `cpp` or `rpp`
+    when `stream=True`, edges are produced and consumed lazily so the circuit is never held in memory.
+
+    Args:
+        circuit (iterable[tuple]): circuit edges, as from `cpp` or `rpp`
+        sinks (list): objects with a `write(edge)` method (such as a `CircuitWriter`), or callables taking an edge
+
+    Returns:
+        int: number of circuit edges streamed
+    """
+    writes = [sink.write if hasattr(sink, 'write') else sink for sink in sinks]
+    steps = 0
+    for edge in circuit:
+        for write in writes:
+            write(edge)
+        steps += 1
+    return steps
@@ -0,0 +1,160 @@
+from array import array
+import networkx as nx
+
+
+class CompactGraph(object):
+    """
+    Integer array representation of a networkx MultiGraph.  Nodes and edges are numbered 0..n-1 and 0..m-1 and the
+    adjacency is stored in compressed sparse row form: the edge ids incident to node `i` are
+    `adj_edges[adj_offsets[i]:adj_offsets[i + 1]]`.  Used where we walk every edge of a large graph and can't afford
+    networkx's nested dict lookups at each step.  In a directed graph an edge is only listed under its tail
+    (`edge_u`), so the adjacency holds the out-edges of each node.
+
+    Attributes:
+        nodes (list): node names indexed by node id
+        node_index (dict): mapping of node name to node id
+        edge_u (array): node id of the first end of each edge
+        edge_v (array): node id of the second end of each edge
+        edge_keys (list): networkx key of each edge
+        edge_attrs (list[dict]): networkx attribute dict of each edge (not copied)
+        adj_offsets (array): start of each node's slice in `adj_edges`.  Has n + 1 entries.
+        adj_edges (array): edge ids incident to each node, grouped by node
+        directed (bool): are edges only walked from `edge_u` to `edge_v`?
+    """
+
+    __slots__ = ('nodes', 'node_index', 'edge_u', 'edge_v', 'edge_keys', 'edge_attrs', 'adj_offsets', 'adj_edges',
+                 'directed')
+
+    def __init__(self, nodes, edge_u, edge_v, edge_keys=None, edge_attrs=None, directed=False):
+        """
+        Args:
+            nodes (list): node names.  Position in the list is the node id.
+            edge_u (iterable[int]): node id of the first end of each edge
+            edge_v (iterable[int]): node id of the second end of each edge
+            edge_keys (list): networkx key of each edge (optional)
+            edge_attrs (list[dict]): attribute dict of each edge (optional)
+            directed (bool): edges go from `edge_u` to `edge_v` only
+        """
+        self.directed = directed
+        self.nodes = list(nodes)
+        self.node_index = {n: i for i, n in enumerate(self.nodes)}
+        self.edge_u = array('l', edge_u)
+        self.edge_v = array('l', edge_v)
+        self.edge_keys = edge_keys if edge_keys is not None else [0] * len(self.edge_u)
+        self.edge_attrs = edge_attrs if edge_attrs is not None else [{} for _ in range(len(self.edge_u))]
+
+        # counting sort of the edge ends by node gives the CSR adjacency
+        offsets = array('l', bytes(array('l').itemsize * (len(self.nodes) + 1)))
+        for u, v in zip(self.edge_u, self.edge_v):
+            offsets[u + 1] += 1
+            if not directed:
+                offsets[v + 1] += 1
+        for i in range(len(self.nodes)):
+            offsets[i + 1] += offsets[i]
+        fill = offsets[:-1]
+        adj = array('l', bytes(array('l').itemsize * offsets[-1]))
+        for eid, (u, v) in enumerate(zip(self.edge_u, self.edge_v)):
+            adj[fill[u]] = eid
+            fill[u] += 1
+            if not directed:
+                adj[fill[v]] = eid
+                fill[v] += 1
+        self.adj_offsets = offsets
+        self.adj_edges = adj
+
+    @classmethod
+    def from_networkx(cls, graph):
+        """
+        Build a CompactGraph from a networkx MultiGraph or MultiDiGraph.  Edge ids follow the order of `graph.edges`.
+
+        Args:
+            graph (networkx MultiGraph): graph to convert.  Anything with `is_directed` and networkx style `nodes`
+                and `edges`.
+
+        Returns:
+            CompactGraph
+        """
+        nodes = list(graph.nodes())
+        node_index = {n: i for i, n in enumerate(nodes)}
+        edge_u, edge_v, edge_keys, edge_attrs = array('l'), array('l'), [], []
+        for u, v, k, d in graph.edges(keys=True, data=True):
+            edge_u.append(node_index[u])
+            edge_v.append(node_index[v])
+            edge_keys.append(k)
+            edge_attrs.append(d)
+        return cls(nodes, edge_u, edge_v, edge_keys, edge_attrs, graph.is_directed())
+
+    def number_of_nodes(self):
+        return len(self.nodes)
+
+    def number_of_edges(self):
+        return len(self.edge_u)
+
+    def degree(self, node_id):
+        """Degree of node `node_id` (self loops count twice, as in networkx).  Out-degree for directed graphs."""
+        return self.adj_offsets[node_id + 1] - self.adj_offsets[node_id]
+
+
+def eulerian_circuit(compact, start_node=None):
+    """
+    Hierholzer's algorithm over the integer adjacency arrays of a CompactGraph.  Each node keeps a pointer into its
+    adjacency slice and a bitmap marks used edges, so every edge end is looked at once: O(n + m) overall.  Edges of a
+    directed CompactGraph are only walked forward.
+
+    Args:
+        compact (CompactGraph): graph where every node has even degree (equal in and out degree if directed) and all
+            edges are connected.
+        start_node (str): name of starting (and ending) node.  If None, the first node with an edge is used.
+
+    Returns:
+        tuple(array, array): node ids visited (m + 1 of them) and the edge ids walked between them (m of them), in
+        order.  Edge `edges[i]` is walked from `nodes[i]` to `nodes[i + 1]`.
+    """
+    offsets, adj, edge_u, edge_v = compact.adj_offsets, compact.adj_edges, compact.edge_u, compact.edge_v
+    n_nodes, n_edges = compact.number_of_nodes(), compact.number_of_edges()
+
+    if compact.directed:
+        in_degree = array('l', bytes(array('l').itemsize * n_nodes))
+        for v in edge_v:
+            in_degree[v] += 1
+        if any(offsets[i + 1] - offsets[i] != in_degree[i] for i in range(n_nodes)):
+            raise nx.NetworkXError('G is not Eulerian.')
+    else:
+        for i in range(n_nodes):
+            if (offsets[i + 1] - offsets[i]) % 2:
+                raise nx.NetworkXError('G is not Eulerian.')
+
+    if start_node is None:
+        start = next((i for i in range(n_nodes) if offsets[i + 1] > offsets[i]), 0)
+    else:
+        start = compact.node_index[start_node]
+
+    ptr = offsets[:-1]  # next unexplored position in each node's adjacency slice
+    used = bytearray(n_edges)
+    stack_nodes, stack_edges = [start], [-1]
+    circuit_nodes, circuit_edges = array('l'), array('l')
+
+    while stack_nodes:
+        v = stack_nodes[-1]
+        p, end = ptr[v], offsets[v + 1]
+        while p < end and used[adj[p]]:
+            p += 1
+        if p == end:
+            ptr[v] = p
+            circuit_nodes.append(stack_nodes.pop())
+            e = stack_edges.pop()
+            if e >= 0:
+                circuit_edges.append(e)
+        else:
+            e = adj[p]
+            ptr[v] = p + 1
+            used[e] = 1
+            stack_nodes.append(edge_u[e] ^ edge_v[e] ^ v)  # other end of e: v for self loops, head if directed
+            stack_edges.append(e)
+
+    if len(circuit_edges) != n_edges:
+        raise nx.NetworkXError('G is not connected.')
+
+    circuit_nodes.reverse()
+    circuit_edges.reverse()
+    return circuit_nodes, circuit_edges
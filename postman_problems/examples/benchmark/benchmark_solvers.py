@@ -0,0 +1,84 @@
+"""
+Description:
+    Times the undirected and directed CPP and RPP solvers on synthetic street grids of increasing size, so changes to
+    either solver can be compared at the same graph sizes.
+
+    The undirected grid has a random distance on each street.  The directed grid is the same streets where about half
+    of the inner streets are one-way, alternating direction by row and column like Manhattan, and the rest are two-way
+    (an edge in each direction).  The streets around the edge of the grid are two-way, which keeps it strongly
+    connected.  For the RPP, a random 30% of streets are required.
+
+Usage:
+    From the repo root (or anywhere, with the package installed):
+    ```
+    python -m postman_problems.examples.benchmark.benchmark_solvers --sizes 10 20 40
+    ```
+"""
+
+import time
+import random
+import argparse
+import networkx as nx
+from postman_problems.solver import cpp_from_graph, rpp_from_graph
+
+
+def create_street_grid(size, directed=False, required_share=1.0, seed=0):
+    """
+    Args:
+        size (int): number of nodes along each side of the grid
+        directed (bool): make a MultiDiGraph with one-way and two-way streets?
+        required_share (float): share of streets that are required
+        seed (int): random seed
+
+    Returns:
+        networkx MultiGraph (or MultiDiGraph)
+    """
+    rand = random.Random(seed)
+    graph = nx.MultiDiGraph() if directed else nx.MultiGraph()
+    for u, v in nx.grid_2d_graph(size, size).edges():
+        attr = {'distance': rand.randint(1, 20), 'required': int(rand.random() < required_share)}
+        if not directed:
+            graph.add_edge(u, v, **attr)
+            continue
+        if u[0] == v[0]:  # street along column u[0]: one-way direction alternates by column
+            u, v = (u, v) if (u[0] % 2 == 0) == (u[1] < v[1]) else (v, u)
+        else:  # street along row u[1]: one-way direction alternates by row
+            u, v = (u, v) if (u[1] % 2 == 0) == (u[0] < v[0]) else (v, u)
+        graph.add_edge(u, v, **attr)
+        on_border = (u[0] == v[0] and u[0] in (0, size - 1)) or (u[1] == v[1] and u[1] in (0, size - 1))
+        if on_border or rand.random() < 0.5:
+            graph.add_edge(v, u, **dict(attr))
+    return graph
+
+
+def time_solve(solve, graph):
+    """
+    Returns:
+        tuple(float, float): seconds taken to solve and the distance of the route
+    """
+    start = time.perf_counter()
+    circuit = solve(graph)
+    seconds = time.perf_counter() - start
+    return seconds, sum([e[3]['distance'] for e in circuit])
+
+
+def main():
+    """Time each solver on each grid size and print a table of the results"""
+    parser = argparse.ArgumentParser(description='Benchmark the undirected and directed postman solvers')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 20, 30], help='Grid sizes (nodes per side).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the grids.')
+    args = parser.parse_args()
+
+    print('{:<6} {:<10} {:>8} {:>8} {:>10} {:>12}'.format('size', 'solver', 'nodes', 'edges', 'seconds', 'distance'))
+    for size in args.sizes:
+        for directed in (False, True):
+            for name, solve, required_share in (('cpp', cpp_from_graph, 1.0), ('rpp', rpp_from_graph, 0.3)):
+                graph = create_street_grid(size, directed, required_share, args.seed)
+                seconds, distance = time_solve(solve, graph)
+                print('{:<6} {:<10} {:>8} {:>8} {:>10.3f} {:>12}'.format(
+                    size, ('directed ' if directed else '') + name, graph.number_of_nodes(), graph.number_of_edges(),
+                    seconds, distance))
+
+
+if __name__ == '__main__':
+    main()
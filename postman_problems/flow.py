@@ -0,0 +1,114 @@
+import heapq
+from array import array
+import networkx as nx
+
+
+def min_cost_flow(n_nodes, arc_tails, arc_heads, arc_costs, supply):
+    """
+    Uncapacitated min cost flow by successive shortest paths, over integer arrays rather than a networkx graph.
+
+    The residual network is stored in compressed sparse row form: residual arc 2a is arc `a` walked forward (always
+    available, arcs are uncapacitated) and 2a + 1 is arc `a` walked backward (available while `a` carries flow).  Each
+    round runs one Dijkstra search on reduced costs from every node with supply left, stops at the first node with
+    demand left and pushes as much flow as possible along the path found.  Node potentials keep the reduced costs
+    non-negative, and only the nodes the search settled need their potential updated, so a round costs about as much
+    as the search, which is usually local.
+
+    Args:
+        n_nodes (int): number of nodes, numbered 0..n_nodes - 1
+        arc_tails (iterable[int]): tail node of each arc
+        arc_heads (iterable[int]): head node of each arc
+        arc_costs (iterable[float]): non-negative cost of one unit of flow on each arc
+        supply (list[int]): flow each node must send out (positive) or take in (negative).  Must sum to zero.
+
+    Returns:
+        array: units of flow on each arc
+
+    Raises:
+        networkx.NetworkXUnfeasible: if some supply can't reach the remaining demand
+    """
+    tails, heads, costs = array('l', arc_tails), array('l', arc_heads), array('d', arc_costs)
+    n_arcs = len(tails)
+    assert sum(supply) == 0, 'supply must sum to zero'
+    assert all(c >= 0 for c in costs), 'arc costs must be non-negative'
+
+    # residual arcs grouped by the node they leave: forward arcs from their tail, backward arcs from their head
+    offsets = array('l', bytes(array('l').itemsize * (n_nodes + 1)))
+    for a in range(n_arcs):
+        offsets[tails[a] + 1] += 1
+        offsets[heads[a] + 1] += 1
+    for i in range(n_nodes):
+        offsets[i + 1] += offsets[i]
+    fill = offsets[:-1]
+    residual = array('l', bytes(array('l').itemsize * offsets[-1]))
+    for a in range(n_arcs):
+        residual[fill[tails[a]]] = 2 * a
+        fill[tails[a]] += 1
+        residual[fill[heads[a]]] = 2 * a + 1
+        fill[heads[a]] += 1
+
+    flow = array('l', bytes(array('l').itemsize * n_arcs))
+    potential = array('d', bytes(array('d').itemsize * n_nodes))
+    excess = list(supply)
+    remaining = sum([s for s in supply if s > 0])
+
+    while remaining:
+        dist, pred, settled, done = {}, {}, [], set()
+        heap = [(0.0, i) for i in range(n_nodes) if excess[i] > 0]
+        for _, i in heap:
+            dist[i] = 0.0
+        heapq.heapify(heap)
+
+        target = -1
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            done.add(u)
+            settled.append(u)
+            if excess[u] < 0:
+                target = u
+                break
+            for p in range(offsets[u], offsets[u + 1]):
+                r = residual[p]
+                a = r >> 1
+                if r & 1:
+                    if not flow[a]:
+                        continue
+                    v, cost = tails[a], -costs[a]
+                else:
+                    v, cost = heads[a], costs[a]
+                if v in done:
+                    continue
+                d_v = d + cost + potential[u] - potential[v]
+                if v not in dist or d_v < dist[v]:
+                    dist[v] = d_v
+                    pred[v] = r
+                    heapq.heappush(heap, (d_v, v))
+
+        if target < 0:
+            raise nx.NetworkXUnfeasible('{} units of flow can not reach a node with demand.'.format(remaining))
+
+        # shifting every potential by the same amount changes no reduced cost, so only settled nodes need updating
+        d_target = dist[target]
+        for u in settled:
+            potential[u] += dist[u] - d_target
+
+        # trace the path back to its source and push the most flow it allows
+        path = []
+        v = target
+        while v in pred:
+            r = pred[v]
+            path.append(r)
+            v = tails[r >> 1] if not r & 1 else heads[r >> 1]
+        push = min(excess[v], -excess[target])
+        for r in path:
+            if r & 1:
+                push = min(push, flow[r >> 1])
+        for r in path:
+            flow[r >> 1] += -push if r & 1 else push
+        excess[v] -= push
+        excess[target] += push
+        remaining -= push
+
+    return flow
@@ -1,6 +1,12 @@
+import heapq
 import warnings
+import itertools
+import collections
 import networkx as nx
 import pandas as pd
+from postman_problems.compact import CompactGraph, eulerian_circuit
+from postman_problems.flow import min_cost_flow
+from postman_problems.circuit import CircuitEdge
 
 
 def read_edgelist(edgelist_filename, keep_optional=False):
@@ -30,7 +36,7 @@ def read_edgelist(edgelist_filename, keep_optional=False):
     return el
 
 
-def create_networkx_graph_from_edgelist(edgelist, edge_id='id'):
+def create_networkx_graph_from_edgelist(edgelist, edge_id='id', directed=False):
     """
     Create a networkx MultiGraph object from an edgelist (pandas dataframe).
     Used to create the user's starting graph for which a CPP solution is desired.
@@ -40,12 +46,14 @@ def create_networkx_graph_from_edgelist(edgelist, edge_id='id'):
             The first two columns are treated as source and target node names.
             The following columns are treated as edge attributes.
         edge_id (str): name of edge attribute which will be used in `create_eulerian_circuit`.
+        directed (bool): treat each row as a one-way edge from the first node to the second?  Two-way edges are then
+            listed once in each direction.
 
     Returns:
         networkx.MultiGraph:
-            Returning a MultiGraph rather than Graph to support parallel edges
+            Returning a MultiGraph rather than Graph to support parallel edges.  A MultiDiGraph if `directed`.
     """
-    g = nx.MultiGraph()
+    g = nx.MultiDiGraph() if directed else nx.MultiGraph()
     if edge_id in edgelist.columns:
         warnings.warn('{} is already an edge attribute in `edgelist`.  We will try to use it, but recommend '
                       'renaming this column in your edgelist to allow this function to create it in a standardized way'
@@ -103,7 +111,7 @@ def get_even_nodes(graph):
     return _get_even_or_odd_nodes(graph, 0)
 
 
-def get_shortest_paths_distances(graph, pairs, edge_weight_name='distance'):
+def get_shortest_paths_distances(graph, pairs, edge_weight_name='distance', progress=None):
     """
     Calculate shortest distance between each pair of nodes in a graph
 
@@ -111,16 +119,159 @@ def get_shortest_paths_distances(graph, pairs, edge_weight_name='distance'):
         graph (networkx graph)
         pairs (list[2tuple]): List of length 2 tuples containing node pairs to calculate shortest path between
         edge_weight_name (str): edge attribute used for distance calculation
+        progress (callable): called as `progress(done, total)` after each single source search (optional)
 
     Returns:
         dict: mapping each pair in `pairs` to the shortest path using `edge_weight_name` between them.
     """
-    distances = {}
+    # one single source search per distinct first node rather than one search per pair
+    pairs_by_source = collections.OrderedDict()
     for pair in pairs:
-        distances[pair] = nx.dijkstra_path_length(graph, pair[0], pair[1], weight=edge_weight_name)
+        pairs_by_source.setdefault(pair[0], []).append(pair)
+
+    distances = {}
+    for done, (source, source_pairs) in enumerate(pairs_by_source.items(), 1):
+        lengths = nx.single_source_dijkstra_path_length(graph, source, weight=edge_weight_name)
+        for pair in source_pairs:
+            if pair[1] not in lengths:
+                raise nx.NetworkXNoPath('Node {} not reachable from {}'.format(pair[1], source))
+            distances[pair] = lengths[pair[1]]
+        if progress is not None:
+            progress(done, len(pairs_by_source))
     return distances
 
 
+def _multi_source_dijkstra(graph, source_labels, edge_weight_name='distance'):
+    """
+    One Dijkstra search from many sources at once.  Each node reached is labelled with the label of its nearest source,
+    which partitions the graph into regions around the sources (a Voronoi partition).
+
+    Args:
+        graph (networkx MultiGraph): graph to search
+        source_labels (dict): mapping of each source node to its label.  Sources can share a label.
+        edge_weight_name (str): edge attribute used for distance calculation
+
+    Returns:
+        tuple(dict, dict, dict): distance of each node reached to its nearest source, label of that source, and the
+        (node, edge key) each non source node was reached from
+    """
+    dist, label, pred, heap = {}, {}, {}, []
+    tiebreak = itertools.count()  # node names needn't be comparable
+    for n, n_label in source_labels.items():
+        dist[n], label[n] = 0, n_label
+        heapq.heappush(heap, (0, next(tiebreak), n))
+    done = set()
+    while heap:
+        d, _, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        done.add(u)
+        for v, keydict in graph.adj[u].items():
+            k = min(keydict, key=lambda key: keydict[key][edge_weight_name])  # shortest of any parallel edges
+            d_v = d + keydict[k][edge_weight_name]
+            if v not in dist or d_v < dist[v]:
+                dist[v], label[v], pred[v] = d_v, label[u], (u, k)
+                heapq.heappush(heap, (d_v, next(tiebreak), v))
+    return dist, label, pred
+
+
+def _get_boundary_edges(graph, dist, label, edge_weight_name='distance'):
+    """
+    Generate the edges between regions of a `_multi_source_dijkstra` partition, along with the length of the shortest
+    path between the two regions' sources that uses the edge.
+
+    Returns:
+        generator of tuple(u, v, key, distance)
+    """
+    for u, v, k, w in graph.edges(keys=True, data=edge_weight_name):
+        if u in label and v in label and label[u] != label[v]:
+            yield u, v, k, dist[u] + w + dist[v]
+
+
+def get_nearest_node_distances(graph, nodes, edge_weight_name='distance'):
+    """
+    Shortest distance from each of `nodes` to the nearest other node in `nodes`, with a single multi-source Dijkstra
+    rather than a search per node.  The search labels every node of the graph with its closest source (a Voronoi
+    partition).  The shortest path from a source to its nearest other source has to leave the source's region through
+    some edge (u, v), and d(source, u) + w(u, v) + d(v, label(v)) is never longer than that path, so the min of this
+    over the edges leaving each region is exact.
+
+    Args:
+        graph (networkx MultiGraph): graph to search
+        nodes (list[str]): nodes to find nearest neighbors among.  Needs at least two.
+        edge_weight_name (str): edge attribute used for distance calculation
+
+    Returns:
+        dict: mapping each node in `nodes` to the distance to its nearest other node in `nodes`
+    """
+    dist, label, _ = _multi_source_dijkstra(graph, {n: n for n in nodes}, edge_weight_name)
+
+    nearest = {n: float('inf') for n in nodes}
+    for u, v, _, d in _get_boundary_edges(graph, dist, label, edge_weight_name):
+        nearest[label[u]] = min(nearest[label[u]], d)
+        nearest[label[v]] = min(nearest[label[v]], d)
+
+    unreachable = [n for n, d in nearest.items() if d == float('inf')]
+    if unreachable:
+        raise nx.NetworkXNoPath('No other node reachable from {}'.format(unreachable[0]))
+    return nearest
+
+
+def connect_required_components(graph, components, edge_weight_name='distance'):
+    """
+    Choose optional edges that join the components of the required graph, for the RPP on graphs whose required edges
+    don't form a single connected component.  The components are joined with a minimum spanning tree of the shortest
+    path distances between them, as in the Frederickson heuristic for the RPP.
+
+    Rather than a search per pair of nodes, a single multi-source Dijkstra from every required node labels each node
+    with its nearest component.  The shortest path between two components crosses the boundary between their regions,
+    so the edges crossing region boundaries give every candidate connection (Mehlhorn's construction).  The spanning
+    tree is taken over these candidates, so this is O(m log m) however many components there are.
+
+    Directed graphs are only joined up to weak connectivity.  The search follows edge direction out of each component,
+    but the regions and the tree between them are treated as undirected: the path from a crossing edge back to the
+    other component's source runs against edge direction, so its length is an estimate of the real cost of the join.
+    The joining edges are real edges, walked in their own direction, and the balancing flow adds the return paths.  A
+    route still needs the full graph to be strongly connected.
+
+    Args:
+        graph (networkx MultiGraph): graph of required and optional edges.  A MultiDiGraph is joined as above.
+        components (list[set]): node sets of the connected (weakly, if directed) components of the required graph
+        edge_weight_name (str): edge attribute used for distance calculation
+
+    Returns:
+        set[3tuple]: (node1, node2, key) of the optional edges on the connecting paths.  Empty for a single component.
+    """
+    if len(components) <= 1:
+        return set()
+
+    component_labels = {n: i for i, component in enumerate(components) for n in component}
+    dist, label, pred = _multi_source_dijkstra(graph, component_labels, edge_weight_name)
+
+    # shortest crossing edge between each pair of neighboring regions.  Undirected even for a directed graph: components
+    # only need joining up to weak connectivity
+    g_components = nx.Graph()
+    g_components.add_nodes_from(range(len(components)))
+    for u, v, k, d in _get_boundary_edges(graph, dist, label, edge_weight_name):
+        i, j = label[u], label[v]
+        if not g_components.has_edge(i, j) or d < g_components[i][j]['distance']:
+            g_components.add_edge(i, j, distance=d, edge=(u, v, k))
+
+    assert nx.is_connected(g_components), 'Sorry, the required edges can not be connected: some required ' \
+                                          'components are not reachable from the others even through optional edges.'
+
+    connecting_edges = set()
+    for _, _, data in nx.minimum_spanning_edges(g_components, weight='distance', data=True):
+        u, v, k = data['edge']
+        connecting_edges.add((u, v, k))
+        for n in (u, v):  # walk back to the required node the search reached each end from
+            while n in pred:
+                n_prev, k_prev = pred[n]
+                connecting_edges.add((n_prev, n, k_prev))
+                n = n_prev
+    return connecting_edges
+
+
 def create_complete_graph(pair_weights, flip_weights=True):
     """
     Create a perfectly connected graph from a list of node pairs and the distances between them.
@@ -154,6 +305,60 @@ def dedupe_matching(matching):
     return list(set(matched_pairs_w_dupes))
 
 
+class AugmentedGraphView(object):
+    """
+    Read-only overlay of extra augmenting edges on top of a base graph.  The base graph (often itself a view from
+    `create_required_graph`) is neither copied nor modified: its edges and attribute dicts are shared, and only the
+    augmenting edges are stored here.  Provides the parts of the networkx graph API used to build eulerian circuits:
+    `nodes`, `edges`, `degree`, `is_directed` and the edge/node counts.
+    """
+
+    def __init__(self, graph):
+        """
+        Args:
+            graph (networkx graph): base graph
+        """
+        self.graph = graph
+        self.augmenting_edges = []  # (u, v, key, attr)
+        self._pair_counts = collections.Counter()
+        self._degree = collections.Counter()
+
+    def add_edge(self, u, v, **attr):
+        """Add an augmenting edge between `u` and `v` (nodes of the base graph) to the overlay"""
+        pair = (u, v) if self.graph.is_directed() else frozenset((u, v))
+        base_keys = self.graph[u][v] if self.graph.has_edge(u, v) else {}
+        key = (max(base_keys) + 1 if base_keys else 0) + self._pair_counts[pair]
+        self._pair_counts[pair] += 1
+        self._degree[u] += 1
+        self._degree[v] += 1
+        self.augmenting_edges.append((u, v, key, attr))
+        return key
+
+    def is_directed(self):
+        return self.graph.is_directed()
+
+    def nodes(self, data=False):
+        return self.graph.nodes(data=data)
+
+    def edges(self, keys=False, data=False):
+        """
+        Returns:
+            list: edges of the base graph followed by the augmenting edges, as tuples shaped like networkx's
+        """
+        fields = slice(0, 2) if not keys else slice(0, 3)
+        aug = [e[fields] + ((e[3],) if data else ()) for e in self.augmenting_edges]
+        return list(self.graph.edges(keys=keys, data=data)) + aug
+
+    def degree(self):
+        return [(n, d + self._degree[n]) for n, d in self.graph.degree()]
+
+    def number_of_nodes(self):
+        return self.graph.number_of_nodes()
+
+    def number_of_edges(self):
+        return self.graph.number_of_edges() + len(self.augmenting_edges)
+
+
 def add_augmenting_path_to_graph(graph, min_weight_pairs, edge_weight_name='weight'):
     """
     Add the min weight matching edges to the original graph
@@ -167,9 +372,10 @@ def add_augmenting_path_to_graph(graph, min_weight_pairs, edge_weight_name='weig
         edge_weight_name (str): edge attribute used for distance calculation
 
     Returns:
-        networkx graph: `graph` augmented with edges between the odd nodes specified in `min_weight_pairs`
+        AugmentedGraphView: `graph` overlaid with edges between the odd nodes specified in `min_weight_pairs`.
+        `graph` itself is not copied or modified.
     """
-    graph_aug = graph.copy()  # so we don't mess with the original graph
+    graph_aug = AugmentedGraphView(graph)
     for pair in min_weight_pairs:
         graph_aug.add_edge(pair[0],
                            pair[1],
@@ -179,6 +385,125 @@ def add_augmenting_path_to_graph(graph, min_weight_pairs, edge_weight_name='weig
     return graph_aug
 
 
+def add_doubled_edges_to_graph(graph, edge_weight_name='distance'):
+    """
+    Add an augmented copy of every edge to the original graph.  When `graph` is a tree this is the min weight
+    augmentation: every tree edge separates an odd number of odd degree nodes, so every edge is walked exactly twice.
+    Each copy records its single edge path, so `create_eulerian_circuit` doesn't need to search for it.
+
+    Args:
+        graph (networkx graph): tree to augment
+        edge_weight_name (str): edge attribute used for distance calculation
+
+    Returns:
+        AugmentedGraphView: `graph` overlaid with a parallel augmented edge alongside each of its edges
+    """
+    graph_aug = AugmentedGraphView(graph)
+    for e in graph.edges(data=True, keys=True):
+        graph_aug.add_edge(e[0],
+                           e[1],
+                           **{'distance': e[3][edge_weight_name],
+                              'augmented': True,
+                              'path': [e[0], e[1]]}
+                           )
+    return graph_aug
+
+
+def get_node_imbalances(graph):
+    """
+    Directed counterpart of `get_odd_nodes`: the nodes of a directed graph whose in and out degree differ.
+
+    Args:
+        graph (networkx MultiDiGraph): graph to check
+
+    Returns:
+        dict: mapping each unbalanced node to its in degree minus its out degree
+    """
+    imbalances = {}
+    for n in graph.nodes():
+        imbalance = graph.in_degree(n) - graph.out_degree(n)
+        if imbalance:
+            imbalances[n] = imbalance
+    return imbalances
+
+
+def get_balancing_paths(graph, imbalances, edge_weight_name='distance'):
+    """
+    Directed counterpart of the odd node matching: the cheapest extra walks that balance every node.  This is the min
+    cost flow from nodes with more in than out edges to nodes with more out than in edges, over the arcs of `graph`,
+    solved with `flow.min_cost_flow` on integer arrays (parallel arcs collapsed to the shortest).  The flow is then
+    split into paths between unbalanced nodes.
+
+    Args:
+        graph (networkx MultiDiGraph): graph of required and optional arcs that the paths can use
+        imbalances (dict): output of `get_node_imbalances` on the required graph
+        edge_weight_name (str): edge attribute used for distance calculation
+
+    Returns:
+        list[tuple(list, float, int)]: node path, its distance and how many extra times it is walked
+    """
+    if not imbalances:
+        return []
+
+    nodes = list(graph.nodes())
+    node_index = {n: i for i, n in enumerate(nodes)}
+    shortest = {}
+    for u, v, w in graph.edges(data=edge_weight_name):
+        if w < shortest.get((u, v), float('inf')):
+            shortest[(u, v)] = w
+    arcs = list(shortest.items())
+
+    supply = [0] * len(nodes)
+    for n, imbalance in imbalances.items():
+        supply[node_index[n]] = imbalance
+    arc_flow = min_cost_flow(len(nodes), [node_index[u] for (u, _), _ in arcs], [node_index[v] for (_, v), _ in arcs],
+                             [w for _, w in arcs], supply)
+
+    # flow decomposition: follow arcs with flow left from a node with excess until reaching one with demand left
+    out_flow = collections.defaultdict(list)
+    for ((u, v), w), f in zip(arcs, arc_flow):
+        if f:
+            out_flow[u].append([v, f, w])
+    excess = dict(imbalances)
+    paths = []
+    for source in [n for n, i in imbalances.items() if i > 0]:
+        while excess[source] > 0:
+            path, path_arcs, n = [source], [], source
+            while excess.get(n, 0) >= 0:
+                while not out_flow[n][0][1]:
+                    out_flow[n].pop(0)
+                arc = out_flow[n][0]
+                path_arcs.append(arc)
+                n = arc[0]
+                path.append(n)
+            count = min([excess[source], -excess[n]] + [arc[1] for arc in path_arcs])
+            for arc in path_arcs:
+                arc[1] -= count
+            excess[source] -= count
+            excess[n] += count
+            paths.append((path, sum([arc[2] for arc in path_arcs]), count))
+    return paths
+
+
+def add_balancing_paths_to_graph(graph, balancing_paths):
+    """
+    Directed counterpart of `add_augmenting_path_to_graph`: overlay an augmented edge for each balancing path.  Each
+    edge records its path, so `create_eulerian_circuit` doesn't need to search for it.
+
+    Args:
+        graph (networkx MultiDiGraph): graph of required arcs
+        balancing_paths (list[tuple]): output of `get_balancing_paths`
+
+    Returns:
+        AugmentedGraphView: `graph` overlaid with `count` augmented edges from the start to the end of each path
+    """
+    graph_aug = AugmentedGraphView(graph)
+    for path, distance, count in balancing_paths:
+        for _ in range(count):
+            graph_aug.add_edge(path[0], path[-1], **{'distance': distance, 'augmented': True, 'path': path})
+    return graph_aug
+
+
 def create_eulerian_circuit(graph_augmented, graph_original, start_node=None):
     """
     networkx.eulerian_circuit only returns the order in which we hit each node.  It does not return the attributes of the
@@ -188,57 +513,65 @@ def create_eulerian_circuit(graph_augmented, graph_original, start_node=None):
     the direct shortest path pairings between the odd nodes for which there might not be a direct trail)
 
     Args:
-        graph_augmented (networkx graph): graph w links between odd degree nodes created from `add_augmenting_path_to_graph`.
+        graph_augmented (AugmentedGraphView): graph w links between odd degree nodes created from `add_augmenting_path_to_graph`.
         graph_original (networkx graph): orginal graph created from `create_networkx_graph_from_edgelist`
         start_node (str): name of starting (and ending) node for CPP solution.
 
     Returns:
-        networkx graph (`graph_original`) augmented with edges directly between the odd nodes
+        generator of circuit.CircuitEdge: each edge walked in the circuit.  These index like the tuple
+        ("from" node, "to" node, edge key, edge attributes).  Edges built by `add_augmenting_path_to_graph` are
+        expanded into the edges of their path and flagged as augmented.  Neither graph is modified.
     """
 
-    euler_circuit = list(nx.eulerian_circuit(graph_augmented, source=start_node, keys=True))
-    assert len(graph_augmented.edges()) == len(euler_circuit), 'graph and euler_circuit do not have equal number of edges.'
+    compact = CompactGraph.from_networkx(graph_augmented)
+    circuit_nodes, circuit_edges = eulerian_circuit(compact, start_node)
+    nodes, edge_keys, edge_attrs = compact.nodes, compact.edge_keys, compact.edge_attrs
 
-    for edge in euler_circuit:
-        aug_path = nx.shortest_path(graph_original, edge[0], edge[1], weight='distance')
-        edge_attr = graph_augmented[edge[0]][edge[1]][edge[2]]
+    for i, eid in enumerate(circuit_edges):
+        node_from, node_to = nodes[circuit_nodes[i]], nodes[circuit_nodes[i + 1]]
+        edge_attr = edge_attrs[eid]
         if not edge_attr.get('augmented'):
-            yield edge + (edge_attr,)
+            yield CircuitEdge(node_from, node_to, edge_keys[eid], edge_attr.get('id'), False, edge_attr)
         else:
+            aug_path = edge_attr.get('path') or nx.shortest_path(graph_original, node_from, node_to, weight='distance')
+            if aug_path[0] != node_from:
+                aug_path = aug_path[::-1]  # augmented edge walked in the opposite direction it was added
             for edge_aug in list(zip(aug_path[:-1], aug_path[1:])):
                 # find edge with shortest distance (if there are two parallel edges between the same nodes)
                 edge_aug_dict = graph_original[edge_aug[0]][edge_aug[1]]
                 edge_key = min(edge_aug_dict.keys(), key=(lambda k: edge_aug_dict[k]['distance']))  # index with min distance
                 edge_aug_shortest = edge_aug_dict[edge_key]
-                edge_aug_shortest['augmented'] = True
-                edge_aug_shortest['id'] = edge_aug_dict[edge_key]['id']
-                yield edge_aug + (edge_key, edge_aug_shortest, )
+                yield CircuitEdge(edge_aug[0], edge_aug[1], edge_key, edge_aug_shortest.get('id'), True,
+                                  edge_aug_shortest)
 
 
-def create_required_graph(graph):
+def create_required_graph(graph, connecting_edges=None):
     """
     Strip a graph down to just the required nodes and edges.  Used for RPP.  Expected edge attribute "required" with
-     True/False or 0/1 values.
+     True/False or 0/1 values.  Nothing is copied: the result is a filtered, read-only view of `graph`.
 
     Args:
         graph (networkx MultiGraph):
+        connecting_edges (set[3tuple]): optional edges to keep as well (optional), to join the required components.
+            See `connect_required_components`.
 
     Returns:
-        networkx MultiGraph with optional nodes and edges deleted
+        networkx MultiGraph view with optional edges and nodes without required incident edges hidden
     """
-
-    graph_req = graph.copy()  # preserve original structure
-
-    # remove optional edges
-    for e in list(graph_req.edges(data=True, keys=True)):
-        if not e[3]['required']:
-            graph_req.remove_edge(e[0], e[1], key=e[2])
-
-    # remove any nodes left isolated after optional edges are removed (no required incident edges)
-    for n in list(nx.isolates(graph_req)):
-        graph_req.remove_node(n)
-
-    return graph_req
+    # an undirected view checks edges from both ends
+    kept_edges = set()
+    for u, v, k in (connecting_edges or ()):
+        kept_edges.update(((u, v, k), (v, u, k)) if not graph.is_directed() else ((u, v, k),))
+
+    # keep only nodes with at least one required incident edge
+    required_nodes = set()
+    for e in graph.edges(data=True, keys=True):
+        if e[3]['required'] or e[:3] in kept_edges:
+            required_nodes.update(e[:2])
+
+    return nx.subgraph_view(graph,
+                            filter_node=required_nodes.__contains__,
+                            filter_edge=lambda u, v, k: bool(graph[u][v][k]['required']) or (u, v, k) in kept_edges)
 
 
 def assert_graph_is_connected(graph):
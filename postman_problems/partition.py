@@ -0,0 +1,187 @@
+import os
+import heapq
+import logging
+import collections
+import networkx as nx
+from concurrent.futures import ProcessPoolExecutor
+from postman_problems.graph import read_edgelist, create_networkx_graph_from_edgelist
+from postman_problems.solver import PostmanSolver
+from postman_problems.circuit import rotate_circuit
+from postman_problems.stats import calculate_postman_solution_stats
+
+logger_partition = logging.getLogger('{0}.{1}'.format(__name__, 'partition'))
+
+# graph shared by the solves in each worker process, set once per worker by `_init_worker`
+_worker_graph = None
+
+
+def _is_required(attr):
+    return bool(attr.get('required', 1))  # every edge is required in a CPP edgelist
+
+
+def _get_seed_nodes(graph, required_nodes, k, edge_weight='distance'):
+    """
+    Spread `k` seeds over the required nodes: each new seed is the required node farthest from the seeds so far.
+
+    Returns:
+        list: seed nodes
+    """
+    seeds = [required_nodes[0]]
+    while len(seeds) < k:
+        dist = nx.multi_source_dijkstra_path_length(graph, set(seeds), weight=edge_weight)
+        farthest = max(required_nodes, key=lambda n: dist.get(n, float('inf')))
+        if farthest in seeds:
+            break  # fewer distinct nodes than crews
+        seeds.append(farthest)
+    return seeds
+
+
+def partition_required_edges(graph, k, edge_weight='distance'):
+    """
+    Split the required edges into `k` connected partitions of similar length by region growing.  Partitions start
+    from seeds spread out over the required nodes and take turns claiming an unclaimed edge next to the edges they
+    already have, always the partition with the least required length so far.  Optional edges are claimed too, at no
+    cost, so a partition can grow out of a small cluster of required edges towards more work and each partition stays
+    a connected region of the network.  Each node keeps a pointer to its next unclaimed edge, so this is O(m log k)
+    after seeding.
+
+    A partition boxed in by the others stops growing.  Any part of the graph no partition reached is handed to the
+    shortest partition.
+
+    Args:
+        graph (networkx MultiGraph): graph of required and optional edges.  Edges without a "required" attribute are
+            required.
+        k (int): number of partitions (crews)
+        edge_weight (str): name edge attribute that indicates distance
+
+    Returns:
+        list[list[3tuple]]: (node1, node2, key) of the required edges in each partition
+    """
+    incident = collections.defaultdict(list)
+    required_nodes = {}  # ordered set
+    for u, v, key, attr in graph.edges(keys=True, data=True):
+        incident[u].append((u, v, key))
+        incident[v].append((u, v, key))
+        if _is_required(attr):
+            required_nodes.update({u: None, v: None})
+    assert required_nodes, 'There are no required edges to partition.'
+
+    seeds = _get_seed_nodes(graph, list(required_nodes), k, edge_weight)
+    assigned = set()
+    next_edge = collections.Counter()  # per node: edges before this position in `incident[node]` are all claimed
+    partitions = [[] for _ in range(k)]
+    length = [0] * k
+    frontier = [collections.deque([seed]) for seed in seeds] + [collections.deque() for _ in range(k - len(seeds))]
+
+    def has_unclaimed_edge(n):
+        edges = incident[n]
+        while next_edge[n] < len(edges) and edges[next_edge[n]] in assigned:
+            next_edge[n] += 1
+        return next_edge[n] < len(edges)
+
+    def claim_next_edge(p):
+        """Claim an unclaimed edge next to partition `p`, or return False if there are none"""
+        nodes = frontier[p]
+        while nodes:
+            n = nodes[0]
+            if not has_unclaimed_edge(n):
+                nodes.popleft()
+                continue
+            u, v, key = incident[n][next_edge[n]]
+            assigned.add((u, v, key))
+            if _is_required(graph[u][v][key]):
+                partitions[p].append((u, v, key))
+                length[p] += graph[u][v][key][edge_weight]
+            nodes.append(v if n == u else u)
+            return True
+        return False
+
+    n_edges = graph.number_of_edges()
+    reseed_nodes = iter(list(incident))
+    heap = [(0, p) for p in range(len(seeds))]
+    while len(assigned) < n_edges:
+        if not heap:
+            # the rest of the graph wasn't reached (boxed in or disconnected): seed the shortest partition there
+            p = min(range(k), key=lambda i: length[i])
+            frontier[p].append(next(n for n in reseed_nodes if has_unclaimed_edge(n)))
+            heap.append((length[p], p))
+        _, p = heapq.heappop(heap)
+        if claim_next_edge(p):
+            heapq.heappush(heap, (length[p], p))
+    return [partition for partition in partitions if partition]
+
+
+def _init_worker(graph):
+    global _worker_graph
+    _worker_graph = graph
+
+
+def _solve_partition(partition, start_node=None, edge_weight='distance'):
+    """Solve the RPP for the required edges in `partition` on the worker's graph.  Runs in a worker process."""
+    required = set(partition)
+    solver = PostmanSolver(_worker_graph, 'rural', edge_weight)
+    solver.set_required({e: e in required for e in solver.graph.edges(keys=True)})
+    return solver.circuit(start_node)
+
+
+def _get_crew_start(circuit, depot_distances):
+    """Node visited by `circuit` that is closest to the depot"""
+    visited = {e[0] for e in circuit}
+    return min(visited, key=lambda n: depot_distances.get(n, float('inf')))
+
+
+def solve_partitions(graph, k, start_node=None, edge_weight='distance', max_workers=None):
+    """
+    Multi crew postman: split the required edges into `k` balanced, connected partitions (see
+    `partition_required_edges`) and solve the RPP of each partition in parallel worker processes.  The graph is sent
+    once to each worker rather than once per partition.
+
+    Args:
+        graph (networkx MultiGraph): graph of required and optional edges.  Edges without a "required" attribute are
+            required, so a CPP graph works too.
+        k (int): number of crews
+        start_node (str): depot (optional).  Each crew's circuit starts and ends at the node of its route closest to
+            the depot.
+        edge_weight (str): name edge attribute that indicates distance to minimize
+        max_workers (int): number of worker processes.  Defaults to the smaller of `k` and the number of CPUs.
+
+    Returns:
+        tuple(list[circuit.Circuit], list[OrderedDict], OrderedDict): the circuit of each crew, the
+        `stats.calculate_postman_solution_stats` of each circuit, and a summary over all crews: the number of crews,
+        and the total and maximum `distance_walked` of a crew
+    """
+    assert k >= 1, 'Need at least one crew.'
+    partitions = partition_required_edges(graph, k, edge_weight)
+    logger_partition.info('partition lengths: {}'.format(
+        [sum([graph[u][v][key][edge_weight] for u, v, key in partition]) for partition in partitions]))
+
+    max_workers = max_workers or min(len(partitions), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(graph,)) as executor:
+        futures = [executor.submit(_solve_partition, partition, None, edge_weight) for partition in partitions]
+        circuits = [future.result() for future in futures]
+
+    if start_node is not None:
+        depot_distances = nx.single_source_dijkstra_path_length(graph, start_node, weight=edge_weight)
+        circuits = [rotate_circuit(circuit, _get_crew_start(circuit, depot_distances)) for circuit in circuits]
+
+    crew_stats = [calculate_postman_solution_stats(circuit, edge_weight) for circuit in circuits]
+    summary = collections.OrderedDict()
+    summary['crews'] = len(circuits)
+    summary['distance_walked_total'] = sum([stats['distance_walked'] for stats in crew_stats])
+    summary['distance_walked_max'] = max([stats['distance_walked'] for stats in crew_stats])
+    return circuits, crew_stats, summary
+
+
+def k_rpp(edgelist_filename, k, start_node=None, edge_weight='distance', max_workers=None):
+    """
+    Load an edgelist and solve the multi crew RPP with `solve_partitions`.  See `solver.rpp` for the edgelist format.
+    A CPP edgelist (no "required" column) splits every edge between the crews.
+
+    Returns:
+        tuple(list[circuit.Circuit], list[OrderedDict], OrderedDict, networkx.MultiGraph): the outputs of
+        `solve_partitions` and the graph
+    """
+    el = read_edgelist(edgelist_filename, keep_optional=True)
+    graph = create_networkx_graph_from_edgelist(el)
+    circuits, crew_stats, summary = solve_partitions(graph, k, start_node, edge_weight, max_workers)
+    return circuits, crew_stats, summary, graph
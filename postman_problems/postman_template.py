@@ -1,9 +1,16 @@
 import os
+import sys
 import argparse
+import itertools
 import logging
+import pandas as pd
 from postman_problems.solver import cpp, rpp
-from postman_problems.viz import plot_circuit_graphviz, make_circuit_video, make_circuit_images
-from postman_problems.stats import calculate_postman_solution_stats
+from postman_problems.viz import plot_circuit_graphviz, make_circuit_video, make_circuit_images, \
+    make_circuit_animation, add_node_attributes
+from postman_problems.stats import calculate_components_solution_stats, StatsAccumulator
+from postman_problems.circuit import Circuit, get_circuit_writer, stream_circuit
+from postman_problems.validate import CircuitValidator
+from postman_problems.raster import make_circuit_raster_animation
 
 
 def get_args():
@@ -50,6 +57,33 @@ def get_args():
                         help='Edge attribute used to specify the distance between nodes (optional).'
                              'Default is "distance".')
 
+    parser.add_argument('--circuit_output',
+                        required=False,
+                        type=str,
+                        default=None,
+                        help='Filename to write the solution circuit to (optional).  Format is taken from the suffix: '
+                             '.csv, .jsonl or .geojson (needs X, Y node attributes from --nodelist).  Unless --viz or '
+                             '--animation are given, the circuit is streamed to this file without being held in '
+                             'memory or logged edge by edge.')
+
+    parser.add_argument('--directed',
+                        action='store_true',
+                        help='Treat each edge as one-way, from the first node in the edgelist row to the second.  List '
+                             'two-way edges once in each direction.')
+
+    parser.add_argument('--cache_dir',
+                        required=False,
+                        type=str,
+                        default=None,
+                        help='Directory to checkpoint intermediate results (odd nodes, distances, matching, circuit) '
+                             'to.  Rerunning on the same edgelist resumes from the last completed stage.  The '
+                             'animation layout is cached here too.')
+
+    parser.add_argument('--validate',
+                        action='store_true',
+                        help='Check the solution is a closed, contiguous walk over existing edges that covers every '
+                             'required edge.  Exits with status 1 if it is not.')
+
     # ---------------------------------------------------------------
     # CPP viz
     # ---------------------------------------------------------------
@@ -68,6 +102,15 @@ def get_args():
                         default='dot',
                         help='graphviz engine to use for viz layout: "dot", "neato", "fdp", etc) of solution static viz')
 
+    parser.add_argument('--animation_renderer',
+                        required=False,
+                        type=str,
+                        default='graphviz',
+                        choices=['graphviz', 'raster'],
+                        help='How to draw the animation frames.  "raster" draws each edge as a straight line between '
+                             'the X, Y coordinates of its nodes from --nodelist, without graphviz, which is much '
+                             'faster for long routes.  Default is "graphviz".')
+
     parser.add_argument('--animation_engine',
                         required=False,
                         type=str,
@@ -87,6 +130,22 @@ def get_args():
                         default=3,
                         help='Frames per second to use for CPP solution animation.')
 
+    parser.add_argument('--max_frames',
+                        required=False,
+                        type=int,
+                        default=None,
+                        help='Most frames to render for the CPP solution animation (optional).  Consecutive steps are '
+                             'grouped into one frame so long circuits render in bounded time.  Default is one frame '
+                             'per step.')
+
+    parser.add_argument('--frame_spacing',
+                        required=False,
+                        type=str,
+                        default='steps',
+                        choices=['steps', 'distance'],
+                        help='With --max_frames, spread frames evenly over the number of steps or over the distance '
+                             '(--edge_weight) walked.  Default is "steps".')
+
     parser.add_argument('--viz_filename',
                         required=False,
                         type=str,
@@ -105,7 +164,8 @@ def get_args():
                         type=str,
                         default=None,
                         help='Directory where the series of static visualizations will be produced that get stitched '
-                             'into the animation.')
+                             'into the animation.  If not given, frames are streamed to the animation in memory and no '
+                             'image files are written.')
 
     # Grabbing viz file format from the filename
     args = parser.parse_args()
@@ -135,18 +195,48 @@ def generic_postman(postman_type):
     logger = logging.getLogger(__name__)
 
     logger.info('Solving the {} postman problem..'.format(postman_type))
+    stream = args.circuit_output is not None and not (args.viz or args.animation)
     circuit, graph = postman_algo(edgelist_filename=args.edgelist,
-                                       start_node=args.start_node,
-                                       edge_weight=args.edge_weight)
-
-    logger.info('Solution:')
-    for edge in circuit:
-        logger.info(edge)
+                                  start_node=args.start_node,
+                                  edge_weight=args.edge_weight,
+                                  stream=stream,
+                                  cache_dir=args.cache_dir,
+                                  directed=args.directed)
+
+    components = None
+    if not stream and isinstance(circuit, list):
+        # disconnected CPP edgelist: one circuit per connected component, reported one after the other
+        components = circuit
+        logger.info('{} connected components solved separately'.format(len(components)))
+        circuit = Circuit(itertools.chain.from_iterable(components))
+
+    # stats (and validation) are gathered on the way past as the circuit is written or logged
+    accumulator = StatsAccumulator(args.edge_weight)
+    validator = CircuitValidator(graph) if args.validate else None
+    sinks = [accumulator] + ([validator] if validator else [])
+    if args.circuit_output:
+        logger.info('Writing solution to {}'.format(args.circuit_output))
+        graph_nodes = add_node_attributes(graph.copy(), pd.read_csv(args.nodelist)) if args.nodelist else graph
+        with get_circuit_writer(args.circuit_output, graph_nodes) as writer:
+            steps = stream_circuit(circuit, [writer] + sinks)
+        logger.info('{} edges written'.format(steps))
+    else:
+        logger.info('Solution:')
+        stream_circuit(circuit, [logger.info] + sinks)
 
     logger.info('Solution summary stats:')
-    for k, v in calculate_postman_solution_stats(circuit).items():
+    stats = calculate_components_solution_stats(components, args.edge_weight) if components else accumulator.stats()
+    for k, v in stats.items():
         logger.info(str(k) + ' : ' + str(v))
 
+    if validator:
+        problems = validator.problems()
+        for problem in problems:
+            logger.error('Invalid solution: {}'.format(problem))
+        if problems:
+            sys.exit(1)
+        logger.info('Solution is valid')
+
     if args.viz:
         logger.info('Creating single image of {} postman solution...'.format(postman_type))
         message_static = plot_circuit_graphviz(circuit=circuit,
@@ -156,20 +246,46 @@ def generic_postman(postman_type):
                                                engine=args.viz_engine)
         logger.info(message_static)
 
-    if args.animation:
-        animation_images_dir = args.animation_images_dir if args.animation_images_dir else os.path.join(
-            os.path.dirname(args.animation_filename), 'img')
+    frame_weight = args.edge_weight if args.frame_spacing == 'distance' else None
+    if args.animation and args.animation_renderer == 'raster':
+        logger.info('Creating animation from node coordinates...')
+        assert args.nodelist, '--animation_renderer raster needs X, Y node coordinates from --nodelist'
+        message_animation = make_circuit_raster_animation(circuit=circuit,
+                                                          graph=add_node_attributes(graph.copy(),
+                                                                                    pd.read_csv(args.nodelist)),
+                                                          outfile_movie=args.animation_filename,
+                                                          fps=args.fps,
+                                                          max_frames=args.max_frames,
+                                                          frame_weight=frame_weight)
+        logger.info(message_animation)
+
+    elif args.animation and args.animation_images_dir is None:
+        logger.info('Creating animation, streaming frames in memory...')
+        message_animation = make_circuit_animation(circuit=circuit,
+                                                   graph=graph,
+                                                   outfile_movie=args.animation_filename,
+                                                   fps=args.fps,
+                                                   format=args.animation_format,
+                                                   engine=args.animation_engine,
+                                                   layout_cache_dir=args.cache_dir,
+                                                   max_frames=args.max_frames,
+                                                   frame_weight=frame_weight)
+        logger.info(message_animation)
 
+    elif args.animation:
         logger.info('Creating individual files for animation...')
         message_images = make_circuit_images(circuit=circuit,
                                              graph=graph,
-                                             outfile_dir=animation_images_dir,
+                                             outfile_dir=args.animation_images_dir,
                                              format=args.animation_format,
-                                             engine=args.animation_engine)
+                                             engine=args.animation_engine,
+                                             layout_cache_dir=args.cache_dir,
+                                             max_frames=args.max_frames,
+                                             frame_weight=frame_weight)
         logger.info(message_images)
 
         logger.info('Creating animation...')
-        message_animation = make_circuit_video(infile_dir_images=animation_images_dir,
+        message_animation = make_circuit_video(infile_dir_images=args.animation_images_dir,
                                                outfile_movie=args.animation_filename,
                                                fps=args.fps,
                                                format=args.animation_format)
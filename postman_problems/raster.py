@@ -0,0 +1,189 @@
+import imageio
+import tqdm
+import numpy as np
+from PIL import ImageColor
+from postman_problems.viz import get_frame_steps
+
+BACKGROUND = (255, 255, 255)
+UNWALKED = (238, 238, 238)  # #eeeeee, as in the graphviz animation
+WALKED = (0, 0, 0)
+CURRENT = (255, 0, 0)
+
+
+def get_node_pixels(graph, width=800, height=None, margin=10, origin='bottomleft'):
+    """
+    Scale the X, Y node attributes of `graph` (as used by `viz.add_pos_node_attribute`) onto an image, keeping the
+    aspect ratio of the coordinates.
+
+    Args:
+        graph (networkx graph): graph with X, Y node attributes
+        width (int): image width in pixels
+        height (int): image height in pixels.  Defaults to the height that keeps the aspect ratio of the coordinates.
+        margin (int): blank pixels around the drawing
+        origin (str): How to treat origin for X, Y.  One of: 'bottomleft', 'topleft', 'topright', 'bottomright'
+
+    Returns:
+        tuple(dict, int): pixel (row, column) of each node, and the image height
+    """
+    nodes = list(graph.nodes())
+    missing = [n for n in nodes if 'X' not in graph.nodes[n] or 'Y' not in graph.nodes[n]]
+    assert not missing, 'No X, Y coordinates found for nodes: {}'.format(missing[:5])
+
+    xy = np.array([[graph.nodes[n]['X'], graph.nodes[n]['Y']] for n in nodes], dtype=float)
+    flip_x, flip_y = {
+        'bottomleft': (False, True),
+        'topleft': (False, False),
+        'topright': (True, False),
+        'bottomright': (True, True)
+    }[origin]  # image rows count down from the top
+    lo, span = xy.min(axis=0), np.ptp(xy, axis=0)
+    scales = [(width - 1 - 2 * margin) / span[0]] if span[0] else []
+    if span[1] and (height is not None or not scales):
+        scales.append(((height or width) - 1 - 2 * margin) / span[1])
+    scale = min(scales) if scales else 0
+    if height is None:
+        height = int(round(span[1] * scale)) + 1 + 2 * margin
+
+    cols = (xy[:, 0] - lo[0]) * scale
+    rows = (xy[:, 1] - lo[1]) * scale
+    cols = margin + np.rint(span[0] * scale - cols if flip_x else cols).astype(int)
+    rows = margin + np.rint(span[1] * scale - rows if flip_y else rows).astype(int)
+    return {n: (r, c) for n, r, c in zip(nodes, rows, cols)}, height
+
+
+def _line_pixels(start, end, shape, line_width=2):
+    """
+    Flat indices of the pixels of a straight line from pixel `start` to pixel `end`, `line_width` pixels thick.
+
+    Args:
+        start (tuple): pixel (row, column) of one end
+        end (tuple): pixel (row, column) of the other end
+        shape (tuple): image (height, width)
+        line_width (int): thickness of the line in pixels
+
+    Returns:
+        numpy array: sorted flat indices into an image of `shape`
+    """
+    n = max(abs(end[0] - start[0]), abs(end[1] - start[1])) + 1
+    rows = np.rint(np.linspace(start[0], end[0], n)).astype(int)
+    cols = np.rint(np.linspace(start[1], end[1], n)).astype(int)
+    offsets = np.arange(line_width) - (line_width - 1) // 2
+    rows, cols = [a.ravel() for a in np.broadcast_arrays(rows[:, None, None] + offsets[None, :, None],
+                                                         cols[:, None, None] + offsets[None, None, :])]
+    inside = (rows >= 0) & (rows < shape[0]) & (cols >= 0) & (cols < shape[1])
+    return np.unique(rows[inside] * shape[1] + cols[inside])
+
+
+class CircuitRaster(object):
+    """
+    Draws the steps of a circuit onto a persistent RGB frame buffer, without graphviz.  Each edge's line is rasterized
+    once up front; drawing a step then only recolors the pixels of the edges that changed, so frames cost about the
+    same however large the graph is.
+
+    Like the graphviz animation (`viz.make_circuit_animation`), unwalked edges are light grey, walked edges black and
+    the current step red (or the edge's "color" attribute).  Edges are drawn as straight lines between their nodes' X, Y
+    coordinates.  There are no node or edge labels.
+    """
+
+    def __init__(self, graph, width=800, height=None, margin=10, line_width=2, origin='bottomleft'):
+        """
+        Args:
+            graph (networkx graph): graph the circuit was solved on, with X, Y node attributes
+            width (int): frame width in pixels
+            height (int): frame height in pixels.  Defaults to the height that keeps the aspect ratio of the graph.
+            margin (int): blank pixels around the drawing
+            line_width (int): thickness of edges in pixels
+            origin (str): How to treat origin for X, Y.  One of: 'bottomleft', 'topleft', 'topright', 'bottomright'
+        """
+        self.graph = graph
+        self.line_width = line_width
+        self.node_pixels, height = get_node_pixels(graph, width, height, margin, origin)
+        self.shape = (height, width)
+        self._segments = {}
+        for u, v in set(graph.edges()):
+            self._segment(u, v)
+
+        self.frame = np.empty(self.shape + (3,), dtype=np.uint8)
+        self._pixels = self.frame.reshape(-1, 3)  # view: writes go straight to the frame
+        self.reset()
+
+    def _segment(self, u, v):
+        """Flat pixel indices of the line between nodes `u` and `v`, rasterized on first use"""
+        pair = (u, v) if (v, u) not in self._segments else (v, u)
+        if pair not in self._segments:
+            self._segments[pair] = _line_pixels(self.node_pixels[u], self.node_pixels[v], self.shape, self.line_width)
+        return self._segments[pair]
+
+    def reset(self):
+        """Clear the frame to every edge unwalked"""
+        self.frame[:] = BACKGROUND
+        for pixels in self._segments.values():
+            self._pixels[pixels] = UNWALKED
+        self._current = None
+
+    def draw_step(self, e):
+        """
+        Draw circuit step `e` as the current step, and the previous current step as walked.
+
+        Args:
+            e (tuple): circuit edge: "from" node, "to" node, edge key and edge attributes
+        """
+        if self._current is not None:
+            self._pixels[self._current] = WALKED
+        self._current = self._segment(e[0], e[1])
+        color = e[3].get('color') if len(e) > 3 else None
+        self._pixels[self._current] = CURRENT if color is None else ImageColor.getrgb(color)[:3]
+
+    def iter_frames(self, circuit, frame_steps=None):
+        """
+        Draw `circuit` from the start and generate a frame after each step in `frame_steps`.  The same frame buffer is
+        updated in place between frames, so copy it to keep it.
+
+        Args:
+            circuit (list[tuple]): solution of the CPP (result from graph.cpp function
+            frame_steps (list[int]): index of the last circuit step in each frame, ascending (see
+                `viz.get_frame_steps`).  Defaults to every step.
+
+        Returns:
+            generator of numpy array: (height, width, 3) uint8 RGB frame
+        """
+        self.reset()
+        frame_steps = range(len(circuit)) if frame_steps is None else frame_steps
+        step = 0
+        for last_step in frame_steps:
+            for i in range(step, last_step + 1):
+                self.draw_step(circuit[i])
+            step = last_step + 1
+            yield self.frame
+
+
+def make_circuit_raster_animation(circuit, graph, outfile_movie, fps=3, width=800, height=None, margin=10,
+                                  line_width=2, origin='bottomleft', max_frames=None, frame_weight=None):
+    """
+    Graphviz-free version of `viz.make_circuit_animation`: frames are drawn with `CircuitRaster` from the X, Y node
+    coordinates and appended straight to an imageio writer.  No layout is run and no subprocess launched per frame.
+
+    Args:
+        circuit (list[tuple]): solution of the CPP (result from graph.cpp function
+        graph (networkx graph): graph the circuit was solved on, with X, Y node attributes
+        outfile_movie (str): filename of created movie/gif (output)
+        fps (int): frames per second for movie
+        width (int): frame width in pixels
+        height (int): frame height in pixels.  Defaults to the height that keeps the aspect ratio of the graph.
+        margin (int): blank pixels around the drawing
+        line_width (int): thickness of edges in pixels
+        origin (str): How to treat origin for X, Y.  One of: 'bottomleft', 'topleft', 'topright', 'bottomright'
+        max_frames (int): most frames to render.  None renders one per step.
+        frame_weight (str): edge attribute to spread capped frames evenly over (e.g. "distance").  None spreads them
+            over the step count.
+
+    Returns:
+        No return value.  Writes a movie/gif to disk
+    """
+    circuit = list(circuit)
+    frame_steps = get_frame_steps(circuit, max_frames, frame_weight)
+    raster = CircuitRaster(graph, width, height, margin, line_width, origin)
+    with imageio.get_writer(outfile_movie, mode='I', fps=fps) as writer:
+        for frame in tqdm.tqdm(raster.iter_frames(circuit, frame_steps), total=len(frame_steps)):
+            writer.append_data(frame)
+    return 'Movie written to {}'.format(outfile_movie)
@@ -1,68 +1,785 @@
+import os
+import time
 import itertools
 import logging
+import functools
+import threading
+import collections
+import multiprocessing
 import networkx as nx
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
+from postman_problems.cache import StageCache, hash_graph
+from postman_problems.circuit import Circuit, rotate_circuit
 from postman_problems.graph import read_edgelist, create_networkx_graph_from_edgelist, create_required_graph, \
-    assert_graph_is_connected, get_odd_nodes, get_shortest_paths_distances, create_complete_graph, dedupe_matching, \
-    add_augmenting_path_to_graph, create_eulerian_circuit
+    connect_required_components, get_odd_nodes, get_shortest_paths_distances, get_nearest_node_distances, \
+    create_complete_graph, add_augmenting_path_to_graph, add_doubled_edges_to_graph, create_eulerian_circuit, \
+    get_node_imbalances, get_balancing_paths, add_balancing_paths_to_graph
 
 
 logger_rpp = logging.getLogger('{0}.{1}'.format(__name__, 'rpp'))
 logger_cpp = logging.getLogger('{0}.{1}'.format(__name__, 'cpp'))
 
+# Silent stand-in for the loggers above when `verbose` is False.  Choosing a logger per call (rather than toggling
+# `logger.disabled`) keeps concurrent solves with different `verbose` settings from interfering.
+logger_null = logging.getLogger('{0}.{1}'.format(__name__, 'null'))
+logger_null.disabled = True
 
-def rpp(edgelist_filename, start_node=None, edge_weight='distance', verbose=False):
+# stages of `PostmanSolver` worth checkpointing to disk.  The graph stages are cheap views rebuilt from these.
+CHECKPOINT_STAGES = ('odd_nodes', 'distances', 'matching', 'nearest_odd_distances', 'balancing_paths', 'circuit')
+
+# circuit edges emitted between progress events of the circuit stage
+CIRCUIT_PROGRESS_STEP = 1000
+
+# Progress event passed to a `PostmanSolver` progress callback.  `event` is "start" or "end" of stage `stage`, or
+# "progress" within it: `done` steps of `total` (None when not known up front).
+SolverEvent = collections.namedtuple('SolverEvent', ['stage', 'event', 'done', 'total'])
+
+
+class SolverCancelled(Exception):
+    """Raised when a solve is cancelled, by `PostmanSolver.cancel` or by its progress callback"""
+
+
+def is_tree_augmentation(graph_req, graph_full):
+    """
+    Is doubling every edge the min weight augmentation?  True when the required graph is a tree and there are no
+    optional edges to take shortcuts through.
+
+    Args:
+        graph_req (networkx MultiGraph): graph of required edges.
+        graph_full (networkx MultiGraph): graph of required and optional edges.
+
+    Returns:
+        bool
+    """
+    return graph_req.number_of_edges() == graph_full.number_of_edges() and nx.is_tree(graph_req)
+
+
+def get_odd_node_distances(graph_full, odd_nodes, edge_weight='distance', progress=None):
+    """
+    Distance matrix of the odd nodes: shortest path distance between each pair.
+
+    Args:
+        graph_full (networkx MultiGraph): graph of required and optional edges used to find paths
+        odd_nodes (list[str]): odd degree nodes of the required graph
+        edge_weight (str): name edge attribute that indicates distance to minimize
+        progress (callable): called as `progress(done, total)` after each source odd node (optional)
+
+    Returns:
+        dict: mapping each pair of odd nodes to their shortest path distance
+    """
+    return get_shortest_paths_distances(graph_full, itertools.combinations(odd_nodes, 2), edge_weight, progress)
+
+
+def get_min_weight_matching(pair_distances, progress=None):
+    """
+    Min weight perfect matching of the odd nodes using the blossom algorithm.
+
+    Args:
+        pair_distances (dict): output of `get_odd_node_distances`
+        progress (callable): called as `progress(done, total)` after each of the two coarse steps: building the
+            complete graph of odd nodes and the blossom search (optional).  networkx reports nothing in between.
+
+    Returns:
+        list[2tuples]: matched pairs of odd nodes
+    """
+    g_odd_complete = create_complete_graph(pair_distances, flip_weights=True)
+    if progress is not None:
+        progress(1, 2)
+    matching = list(nx.algorithms.max_weight_matching(g_odd_complete, True))
+    if progress is not None:
+        progress(2, 2)
+    return matching
+
+
+def _send_min_weight_matching(pair_distances, connection):
+    """Child process target of `PostmanSolver.circuit_within`: send the min weight matching down `connection`"""
+    connection.send(get_min_weight_matching(pair_distances))
+    connection.close()
+
+
+def _symmetric_distances(pair_distances):
+    """`pair_distances` keyed by both (u, v) and (v, u)"""
+    distances = dict(pair_distances)
+    distances.update({(v, u): d for (u, v), d in pair_distances.items()})
+    return distances
+
+
+def get_matching_cost(matching, pair_distances):
+    """
+    Args:
+        matching (list[2tuples]): matched pairs of odd nodes
+        pair_distances (dict): output of `get_odd_node_distances`
+
+    Returns:
+        total distance of the matched pairs
+    """
+    distances = _symmetric_distances(pair_distances)
+    return sum([distances[pair] for pair in matching])
+
+
+def get_greedy_matching(pair_distances):
+    """
+    Quick perfect matching of the odd nodes: repeatedly match the closest pair of nodes that are both unmatched.
+    O(k^2 log k) for k odd nodes, against O(k^3) for blossom, and usually within a few percent of the min weight.
+
+    Args:
+        pair_distances (dict): output of `get_odd_node_distances`
+
+    Returns:
+        list[2tuples]: matched pairs of odd nodes
     """
-    Solving the RPP from beginning (load network data) to end (finding optimal route).  This optimization makes a
-     relatively strong assumption: the starting graph must stay a connected graph when optional edges are removed.
-    If this is not so, an assertion is raised.  This class of RPP generalizes to the CPP strategy.
+    matched = set()
+    matching = []
+    for (u, v), _ in sorted(pair_distances.items(), key=lambda pair_distance: pair_distance[1]):
+        if u not in matched and v not in matched:
+            matched.update((u, v))
+            matching.append((u, v))
+    return matching
+
+
+def improve_matching(matching, pair_distances, deadline=None, progress=None):
+    """
+    2-opt local search on a perfect matching: for two matched pairs (a, b) and (c, d), swap to (a, c), (b, d) or
+    (a, d), (b, c) when that is shorter.  Repeats until no swap helps or the deadline passes.
+
+    Args:
+        matching (list[2tuples]): perfect matching of the odd nodes, e.g. from `get_greedy_matching`
+        pair_distances (dict): output of `get_odd_node_distances`
+        deadline (float): `time.monotonic()` value at which to stop improving (optional)
+        progress (callable): called as `progress(done, total)` after each matched pair is tried against the rest,
+            counting across passes (optional)
+
+    Returns:
+        list[2tuples]: matching at least as short as `matching`
+    """
+    distances = _symmetric_distances(pair_distances)
+    matching = list(matching)
+    steps = 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(len(matching)):
+            if deadline is not None and time.monotonic() > deadline:
+                return matching
+            if progress is not None:
+                progress(steps, None)
+            steps += 1
+            for j in range(i + 1, len(matching)):
+                (a, b), (c, d) = matching[i], matching[j]
+                current = distances[(a, b)] + distances[(c, d)]
+                if distances[(a, c)] + distances[(b, d)] < current:
+                    matching[i], matching[j] = (a, c), (b, d)
+                    improved = True
+                elif distances[(a, d)] + distances[(b, c)] < current:
+                    matching[i], matching[j] = (a, d), (b, c)
+                    improved = True
+    return matching
+
+
+class PostmanSolver(object):
+    """
+    Solver session.  Loads a network once and exposes each stage of the postman solution separately:
+
+        required_components -> required_graph -> odd_nodes -> distances -> matching -> augmented_graph -> circuit
+
+    Each stage is cached along with the inputs it was computed from, and only recomputed when those inputs change.
+    So repeated solves that differ by...
+        - start node: reuse the circuit, rotated to the new start (see `circuit.rotate_circuit`).
+        - edge weights (`set_edge_weights`, `edge_weight`): reuse the required graph and odd nodes, unless the
+          required edges form several components joined by shortest paths.
+        - required subset (`set_required`, RPP only): reuse the distances and matching if the odd nodes don't change.
+
+    Directed graphs (networkx MultiDiGraph, for one-way streets) replace the odd nodes, distances and matching with a
+    single `balancing_paths` stage: the min cost flow that balances in and out degree.  The circuit follows edge
+    direction.
+
+    A `progress` callback gets a `SolverEvent` when each stage starts and ends (stages start the stages they depend
+    on first, so events nest) and as steps within a stage finish: each source searched in `distances`, each 2-opt
+    step of `circuit_within`'s "heuristic_matching", every `CIRCUIT_PROGRESS_STEP` edges of the circuit (built or
+    streamed) and its last edge.  The blossom matching reports its two coarse steps (complete graph, then the search)
+    and the balancing flow only its start and end.  Every event is also a point where the solve
+    can be cancelled: either the callback raises `SolverCancelled`, or another thread calls `cancel`.
+
+    The session works on its own copy of the graph, so the caller's graph is never modified.
+    """
+
+    def __init__(self, graph, postman_type='rural', edge_weight='distance', verbose=False, copy=True, cache_dir=None,
+                 progress=None):
+        """
+        Args:
+            graph (networkx MultiGraph): network to solve.  For the RPP edges need a "required" attribute.
+            postman_type (str): "rural" or "chinese"
+            edge_weight (str): name edge attribute that indicates distance to minimize
+            verbose (boolean): log info messages?
+            copy (boolean): copy `graph`?  Only skip the copy when the session won't modify it (no calls to
+                `set_edge_weights` or `set_required`), for example for one-off solves of a shared graph.
+            cache_dir (str): directory to checkpoint stage outputs to (optional).  See `cache.StageCache`.  Stages
+                already checkpointed for the same graph and parameters are loaded instead of computed.
+            progress (callable): called with a `SolverEvent` as the solve progresses (optional)
+        """
+        assert postman_type in ('rural', 'chinese'), 'postman_type must be "rural" or "chinese"'
+        self.graph = graph.copy() if copy else graph
+        self.postman_type = postman_type
+        self.logger = (logger_rpp if postman_type == 'rural' else logger_cpp) if verbose else logger_null
+        self._edge_weight = edge_weight
+        self._required_version = 0
+        self._weights_version = 0
+        self._cache = {}
+        self._graph_hash = (None, None)
+        self.stage_cache = StageCache(cache_dir) if cache_dir else None
+        self.stage_counts = collections.Counter()  # how many times each stage was (re)computed
+        self.checkpoint_loads = collections.Counter()  # how many times each stage was loaded from `cache_dir`
+        self.progress = progress
+        self._cancelled = threading.Event()
+
+    def __getstate__(self):
+        """Pickle without the cancel event and progress callback, e.g. to send the session to a process pool"""
+        state = self.__dict__.copy()
+        del state['_cancelled']
+        state['progress'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def from_edgelist(cls, edgelist_filename, postman_type='rural', edge_weight='distance', verbose=False,
+                      cache_dir=None):
+        """
+        Start a session from an edgelist file.  See `cpp` and `rpp` for the expected format.
+
+        Returns:
+            PostmanSolver
+        """
+        el = read_edgelist(edgelist_filename, keep_optional=postman_type == 'rural')
+        return cls(create_networkx_graph_from_edgelist(el), postman_type, edge_weight, verbose, copy=False,
+                   cache_dir=cache_dir)
+
+    # -------------------------------------------------------------------------------------
+    # Inputs
+    # -------------------------------------------------------------------------------------
+
+    @property
+    def edge_weight(self):
+        """str: name edge attribute that indicates distance to minimize.  Setting it invalidates the distances."""
+        return self._edge_weight
+
+    @edge_weight.setter
+    def edge_weight(self, edge_weight):
+        if edge_weight != self._edge_weight:
+            self._edge_weight = edge_weight
+            self._weights_version += 1
+
+    def set_edge_weights(self, weights):
+        """
+        Update edge weights (the `edge_weight` attribute) of the session's graph.
+
+        Args:
+            weights (dict): mapping of edge (node1, node2, key) to its new weight
+        """
+        for (u, v, k), w in weights.items():
+            self.graph[u][v][k][self._edge_weight] = w
+        self._weights_version += 1
+
+    def set_required(self, required):
+        """
+        Update which edges are required (RPP only).
+
+        Args:
+            required (dict): mapping of edge (node1, node2, key) to True/False or 1/0
+        """
+        assert self.postman_type == 'rural', 'Every edge is required in the CPP.'
+        for (u, v, k), r in required.items():
+            self.graph[u][v][k]['required'] = r
+        self._required_version += 1
+
+    # -------------------------------------------------------------------------------------
+    # Progress and cancellation
+    # -------------------------------------------------------------------------------------
+
+    def cancel(self):
+        """
+        Stop the running solve at its next progress event with `SolverCancelled`.  Safe to call from another thread.
+        Stages already finished stay cached, so the session can solve again after.
+        """
+        self._cancelled.set()
+
+    def _report(self, stage, event, done=None, total=None):
+        """Pass a `SolverEvent` to the progress callback, raising `SolverCancelled` if the solve was cancelled"""
+        if self._cancelled.is_set():
+            self._cancelled.clear()
+            raise SolverCancelled('solve cancelled during {}'.format(stage))
+        if self.progress is not None:
+            self.progress(SolverEvent(stage, event, done, total))
+
+    def _step_reporter(self, stage):
+        """`progress(done, total)` callback for the steps of `stage`"""
+        return lambda done, total: self._report(stage, 'progress', done, total)
+
+    def _report_circuit(self, circuit_edges):
+        """Pass on `circuit_edges`, reporting every `CIRCUIT_PROGRESS_STEP` edges and the total after the last"""
+        i = 0
+        for i, edge in enumerate(circuit_edges, 1):
+            yield edge
+            if i % CIRCUIT_PROGRESS_STEP == 0:
+                self._report('circuit', 'progress', i, None)
+        if i % CIRCUIT_PROGRESS_STEP:
+            self._report('circuit', 'progress', i, i)
+
+    # -------------------------------------------------------------------------------------
+    # Stages
+    # -------------------------------------------------------------------------------------
+
+    def _checkpoint_key(self, name):
+        """Key of stage `name` in the checkpoint cache: content hash of the graph plus the solve parameters"""
+        versions = (self._required_version, self._weights_version)
+        if self._graph_hash[0] != versions:
+            self._graph_hash = (versions, hash_graph(self.graph))
+        return StageCache.make_key(self._graph_hash[1], self.postman_type, self._edge_weight, name)
+
+    def _stage(self, name, key, compute):
+        """
+        Return the cached value of stage `name` if it was computed from inputs `key`.  Otherwise load it from the
+        checkpoint cache, or compute it (and checkpoint it).
+        """
+        cached = self._cache.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        checkpoint = self.stage_cache is not None and name in CHECKPOINT_STAGES
+        if checkpoint:
+            found, value = self.stage_cache.load(name, self._checkpoint_key(name))
+            if found:
+                self.logger.info('load {} from checkpoint'.format(name))
+                self._cache[name] = (key, value)
+                self.checkpoint_loads[name] += 1
+                return value
+
+        self.logger.info('compute {}'.format(name))
+        self._report(name, 'start')
+        value = compute()
+        self._report(name, 'end')
+        self._cache[name] = (key, value)
+        self.stage_counts[name] += 1
+        if checkpoint:
+            self.stage_cache.save(name, self._checkpoint_key(name), value)
+        return value
+
+    def required_components(self):
+        """list[set]: node sets of the (weakly) connected components of the required edges (one for the CPP)"""
+        def compute():
+            if self.postman_type == 'chinese':
+                return [set(self.graph.nodes())]
+            components = nx.weakly_connected_components if self.graph.is_directed() else nx.connected_components
+            return list(components(create_required_graph(self.graph)))
+        return self._stage('required_components', (self._required_version,), compute)
+
+    def _required_key(self):
+        """Inputs of the required graph: the connecting paths between several required components depend on weights"""
+        if len(self.required_components()) > 1:
+            return self._required_version, self._weights_version
+        return self._required_version,
+
+    def required_graph(self):
+        """
+        networkx MultiGraph: graph of required edges (the whole graph for the CPP).  When the required edges of the RPP
+        form several components, the optional edges on the shortest paths that connect them are included too (see
+        `graph.connect_required_components`).
+        """
+        def compute():
+            if self.postman_type == 'chinese':
+                return self.graph
+            connecting_edges = connect_required_components(self.graph, self.required_components(), self._edge_weight)
+            return create_required_graph(self.graph, connecting_edges)
+        return self._stage('required_graph', self._required_key(), compute)
+
+    def odd_nodes(self):
+        """list[str]: odd degree nodes of the required graph"""
+        return self._stage('odd_nodes', self._required_key(), lambda: get_odd_nodes(self.required_graph()))
+
+    def distances(self):
+        """dict: shortest path distance between each pair of odd nodes"""
+        odd_nodes = self.odd_nodes()
+        return self._stage('distances', (frozenset(odd_nodes), self._weights_version),
+                           lambda: get_odd_node_distances(self.graph, odd_nodes, self._edge_weight,
+                                                          self._step_reporter('distances')))
+
+    def matching(self):
+        """list[2tuples]: min weight matching of the odd nodes"""
+        odd_nodes = self.odd_nodes()
+
+        def compute():
+            if len(odd_nodes) <= 2:
+                return [tuple(odd_nodes)] if odd_nodes else []
+            return get_min_weight_matching(self.distances(), self._step_reporter('matching'))
+        return self._stage('matching', (frozenset(odd_nodes), self._weights_version), compute)
+
+    def balancing_paths(self):
+        """
+        Directed graphs only: the stage that replaces odd nodes, distances and matching.
+
+        Returns:
+            list[tuple]: extra paths that balance the in and out degree of every node.  See `graph.get_balancing_paths`.
+        """
+        return self._stage('balancing_paths', self._required_key() + (self._weights_version,),
+                           lambda: get_balancing_paths(self.graph, get_node_imbalances(self.required_graph()),
+                                                       self._edge_weight))
+
+    def nearest_odd_distances(self):
+        """dict: distance from each odd node to its nearest other odd node.  See `graph.get_nearest_node_distances`"""
+        odd_nodes = self.odd_nodes()
+        return self._stage('nearest_odd_distances', (frozenset(odd_nodes), self._weights_version),
+                           lambda: get_nearest_node_distances(self.graph, odd_nodes, self._edge_weight))
+
+    def cost(self, lower_bound=False):
+        """
+        Distance of the postman route without building it: the required edges walked once plus the shortest paths
+        between matched odd nodes walked again.  Stops after the matching stage, so there's no augmentation, eulerian
+        circuit or path expansion.
+
+        Args:
+            lower_bound (boolean): skip the exact matching as well and return a lower bound on the distance.  Each odd
+                node is matched to some other odd node, so the matching costs at least half the sum of the distances
+                from each odd node to its nearest odd node.  That takes one multi-source shortest path search rather
+                than a search per odd node and the blossom algorithm.  Exact with two or fewer odd nodes.
+
+        Returns:
+            OrderedDict: `distance_walked`, `distance_doublebacked` and `distance_walked_once`, as in
+            `stats.calculate_postman_solution_stats`
+        """
+        g_req = self.required_graph()
+        odd_nodes = self.odd_nodes() if not self.graph.is_directed() else None
+        distance_once = sum([w for _, _, w in g_req.edges(data=self._edge_weight)])
+
+        if self.graph.is_directed():
+            distance_doublebacked = sum([distance * count for _, distance, count in self.balancing_paths()])
+        elif not odd_nodes:
+            distance_doublebacked = 0
+        elif is_tree_augmentation(g_req, self.graph):
+            distance_doublebacked = distance_once
+        elif lower_bound:
+            distance_doublebacked = sum(self.nearest_odd_distances().values()) / 2
+        else:
+            distances = self.distances()
+            distance_doublebacked = sum([distances[pair] if pair in distances else distances[pair[::-1]]
+                                         for pair in self.matching()])
+
+        cost = collections.OrderedDict()
+        cost['distance_walked'] = distance_once + distance_doublebacked
+        cost['distance_doublebacked'] = distance_doublebacked
+        cost['distance_walked_once'] = distance_once
+        return cost
+
+    def circuit_within(self, time_budget, start_node=None):
+        """
+        Anytime solve for a latency budget.  A greedy matching gives a valid route straight away and is improved with
+        2-opt swaps until the deadline, while the exact blossom matching runs in a child process.  If blossom finishes
+        in time its matching is used (and cached, as `matching`), otherwise the best heuristic one is and the child is
+        terminated, so nothing keeps running after the call returns.
+
+        The clock starts when this is called, so the budget covers the odd nodes and distances stages as well as the
+        matching.  If those spend the whole budget, blossom is not started at all.  Building the circuit from the
+        matching comes after the deadline, so leave room for that.
+
+        Args:
+            time_budget (float): seconds to spend finding the matching, from the call
+            start_node (str): name of starting (and ending) node
+
+        Returns:
+            circuit.Circuit: the best circuit found.  Its `gap` is 0.0 when the matching is exact, otherwise an upper
+            bound on the optimality gap using the lower bound of `cost`.
+        """
+        deadline = time.monotonic() + time_budget
+        if self.graph.is_directed():
+            return self.circuit(start_node)  # the balancing flow is exact and cheap: no heuristic needed
+
+        odd_nodes = self.odd_nodes()
+        matching_key = (frozenset(odd_nodes), self._weights_version)
+        cached = self._cache.get('matching')
+        if len(odd_nodes) <= 2 or is_tree_augmentation(self.required_graph(), self.graph) or \
+                (cached is not None and cached[0] == matching_key):
+            return self.circuit(start_node)
+
+        distances = self.distances()
+        blossom = None
+        if time.monotonic() < deadline:
+            receive, send = multiprocessing.Pipe(duplex=False)
+            blossom = multiprocessing.Process(target=_send_min_weight_matching, args=(distances, send), daemon=True)
+            blossom.start()
+            send.close()
+
+        exact = None
+        try:
+            self._report('heuristic_matching', 'start')
+            matching = improve_matching(get_greedy_matching(distances), distances, deadline,
+                                        self._step_reporter('heuristic_matching'))
+            if blossom is not None and receive.poll(max(0.0, deadline - time.monotonic())):
+                exact = receive.recv()
+        except EOFError:
+            pass  # blossom process died without a result
+        finally:
+            if blossom is not None:
+                blossom.terminate()
+                blossom.join()
+                receive.close()
+
+        self._report('heuristic_matching', 'end')
+        if exact is not None:
+            self.logger.info('exact matching found within the time budget')
+            self._stage('matching', matching_key, lambda: exact)
+            return self.circuit(start_node)
+
+        self.logger.info('time budget spent: using the heuristic matching')
+        bound = self.cost(lower_bound=True)
+        lower_bound = bound['distance_walked']
+        distance = bound['distance_walked_once'] + get_matching_cost(matching, distances)
+        gap = (distance - lower_bound) / lower_bound if lower_bound else 0.0
+        g_augmented = add_augmenting_path_to_graph(self.required_graph(), matching)
+        self._report('circuit', 'start')
+        circuit = Circuit(self._report_circuit(create_eulerian_circuit(g_augmented, self.graph, start_node)), gap=gap)
+        self._report('circuit', 'end')
+        return circuit
+
+    def augmented_graph(self):
+        """AugmentedGraphView: required graph augmented so every node has even degree (in equal to out if directed)"""
+        def compute():
+            g_req = self.required_graph()
+            if self.graph.is_directed():
+                return add_balancing_paths_to_graph(g_req, self.balancing_paths())
+            if self.odd_nodes() and is_tree_augmentation(g_req, self.graph):
+                return add_doubled_edges_to_graph(g_req, self._edge_weight)
+            return add_augmenting_path_to_graph(g_req, self.matching())
+        return self._stage('augmented_graph', (self._required_version, self._weights_version), compute)
+
+    def circuit(self, start_node=None):
+        """
+        Args:
+            start_node (str): name of starting (and ending) node.  A circuit already computed for another start node
+                is rotated rather than solved again.
+
+        Returns:
+            circuit.Circuit: optimal, so its `gap` is 0.0
+        """
+        circuit = self._stage('circuit', (self._required_version, self._weights_version),
+                              lambda: Circuit(self._report_circuit(create_eulerian_circuit(self.augmented_graph(),
+                                                                                           self.graph, start_node)),
+                                              gap=0.0))
+        if start_node is None or circuit[0][0] == start_node:
+            return circuit
+        return rotate_circuit(circuit, start_node)
+
+    def iter_circuit(self, start_node=None):
+        """
+        Lazy version of `circuit`: generate the circuit edges without caching or holding them in memory.  The circuit
+        stage's start, progress and end events are reported as the edges are consumed.
+
+        Returns:
+            generator of circuit.CircuitEdge
+        """
+        augmented_graph = self.augmented_graph()
+
+        def generate():
+            self._report('circuit', 'start')
+            for edge in self._report_circuit(create_eulerian_circuit(augmented_graph, self.graph, start_node)):
+                yield edge
+            self._report('circuit', 'end')
+        return generate()
+
+
+def rpp_from_graph(graph, start_node=None, edge_weight='distance', verbose=False, stream=False, cache_dir=None,
+                   cost_only=False, time_budget=None, progress=None):
+    """
+    Solve the RPP on a graph that is already loaded.  `graph` is only read, never modified, so many solves can share
+    one graph, including from several threads at once (see `solve_concurrently`).
+
+    Args:
+        graph (networkx MultiGraph): graph of required and optional edges.  Edges need a "required" attribute.
+        start_node (str): name of starting node.  See cpp.py for more details
+        edge_weight (str): name edge attribute that indicates distance to minimize in CPP
+        verbose (boolean): log info messages?
+        stream (boolean): return the circuit as a lazy generator rather than a list?
+        cache_dir (str): directory to checkpoint stage outputs to, and resume from (optional)
+        cost_only (boolean or str): only compute the route distance?  See `rpp`.
+        time_budget (float): seconds to spend on the distances and matching before settling for the best found.  See
+            `rpp`.
+        progress (callable): called with a `SolverEvent` as the solve progresses.  See `rpp`.
+
+    Returns:
+        circuit.Circuit (or generator of circuit.CircuitEdge when `stream` is True, or the route distance when
+        `cost_only` is set).  See `rpp`.
+    """
+    solver = PostmanSolver(graph, 'rural', edge_weight, verbose, copy=False, cache_dir=cache_dir, progress=progress)
+    if cost_only:
+        return solver.cost(lower_bound=cost_only == 'lower_bound')
+    if time_budget is not None:
+        return solver.circuit_within(time_budget, start_node)
+    return solver.iter_circuit(start_node) if stream else solver.circuit(start_node)
+
+
+def cpp_from_graph(graph, start_node=None, edge_weight='distance', verbose=False, stream=False, cache_dir=None,
+                   cost_only=False, time_budget=None, progress=None):
+    """
+    Solve the CPP on a graph that is already loaded.  `graph` is only read, never modified, so many solves can share
+    one graph, including from several threads at once (see `solve_concurrently`).
+
+    Args:
+        graph (networkx MultiGraph): graph where every edge must be walked
+        start_node (str): name of starting node.  See cpp.py for more details
+        edge_weight (str): name edge attribute that indicates distance to minimize in CPP
+        verbose (boolean): log info messages?
+        stream (boolean): return the circuit as a lazy generator rather than a list?
+        cache_dir (str): directory to checkpoint stage outputs to, and resume from (optional)
+        cost_only (boolean or str): only compute the route distance?  See `rpp`.
+        time_budget (float): seconds to spend on the distances and matching before settling for the best found.  See
+            `rpp`.
+        progress (callable): called with a `SolverEvent` as the solve progresses.  See `rpp`.
+
+    Returns:
+        circuit.Circuit (or generator of circuit.CircuitEdge when `stream` is True, or the route distance when
+        `cost_only` is set).  See `cpp`.
+    """
+    solver = PostmanSolver(graph, 'chinese', edge_weight, verbose, copy=False, cache_dir=cache_dir, progress=progress)
+    if cost_only:
+        return solver.cost(lower_bound=cost_only == 'lower_bound')
+    if time_budget is not None:
+        return solver.circuit_within(time_budget, start_node)
+    return solver.iter_circuit(start_node) if stream else solver.circuit(start_node)
+
+
+def rpp(edgelist_filename, start_node=None, edge_weight='distance', verbose=False, stream=False,
+        cache_dir=None, cost_only=False, time_budget=None, directed=False, progress=None):
+    """
+    Solving the RPP from beginning (load network data) to end (finding optimal route).  The route is optimal when the
+    required edges form a single connected component.  When they form several, they are first joined by a minimum
+    spanning tree of the shortest paths between components (see `graph.connect_required_components`), a heuristic.
+    An assertion is raised if some required component can't be reached at all.
 
     Args:
         edgelist_filename (str): filename of edgelist.  See cpp.py for more details
         start_node (str): name of starting node.  See cpp.py for more details
         edge_weight (str): name edge attribute that indicates distance to minimize in CPP
         verbose (boolean): log info messages?
+        stream (boolean): return the circuit as a lazy generator rather than a list?  Use with
+            `circuit.stream_circuit` to write very long routes without holding them in memory.
+        cache_dir (str): directory to checkpoint each stage's output to (optional).  A rerun on the same edgelist and
+            parameters resumes from the last completed stage.
+        cost_only (boolean or str): return the distance of the route rather than the route.  True stops after the
+            min weight matching and gives the exact distance.  "lower_bound" skips the matching too, for a quicker
+            lower bound.  See `PostmanSolver.cost`.
+        time_budget (float): latency budget in seconds for the distances and matching (optional).  A heuristic
+            matching gives a valid route at once and is improved until the budget is spent, unless the exact matching
+            is found first.
+            The circuit's `gap` attribute bounds how far from optimal it is.  See `PostmanSolver.circuit_within`.
+        directed (boolean): treat each edgelist row as a one-way edge from the first node to the second (two-way edges
+            are listed once in each direction)?  In and out degree are then balanced with a min cost flow, and the
+            circuit follows edge direction.
+        progress (callable): called with a `solver.SolverEvent` as each stage starts, makes progress and ends
+            (optional), e.g. to drive a progress bar.  Raising `SolverCancelled` from it stops the solve.  See
+            `PostmanSolver`.
+        max_workers (int): worker processes for the components of a disconnected edgelist.  1 solves them in this
+            process.  See `cpp_components_from_graph`.
 
     Returns:
-        tuple(list[tuple(str, str, dict)], networkx.MultiGraph]:
-        Each tuple is a direction (from one node to another) from the CPP solution route.
+        tuple(circuit.Circuit, networkx.MultiGraph]:
+        Each element of the circuit is a direction (from one node to another) from the CPP solution route.  These are
+        `circuit.CircuitEdge` records which index like the tuple (from node, to node, edge key, edge attributes):
           The first element is the starting ("from") node.
           The second element is the end ("to") node.
-          The third element is the dict of edge attributes for that edge.
-        The original graph is returned as well.  This is needed for visualization
+          The third element is the key of the edge walked.
+          The fourth element is a read-only view of the attributes for that edge.
+        A generator of the same records is returned instead when `stream` is True.
+        With `cost_only`, an OrderedDict of the route's `distance_walked`, `distance_doublebacked` and
+        `distance_walked_once` is returned instead of the circuit.
+        The original graph is returned as well, unmodified.  This is needed for visualization
     """
+    (logger_rpp if verbose else logger_null).info('read edgelist and create full graph')
+    el = read_edgelist(edgelist_filename, keep_optional=True)
+    g_full = create_networkx_graph_from_edgelist(el, directed=directed)
 
-    logger_rpp.disabled = not verbose
+    circuit = rpp_from_graph(g_full, start_node, edge_weight, verbose, stream, cache_dir, cost_only, time_budget,
+                             progress)
+    return circuit, g_full
 
-    logger_rpp.info('read edgelist')
-    el = read_edgelist(edgelist_filename, keep_optional=True)
 
-    logger_rpp.info('create full and required graph')
-    g_full = create_networkx_graph_from_edgelist(el)
-    g_req = create_required_graph(g_full)
-    assert_graph_is_connected(g_req)
+def get_component_graphs(graph):
+    """
+    Split a graph into its connected components (weakly connected if directed), largest first.
 
-    logger_rpp.info('getting odd node pairs')
-    odd_nodes = get_odd_nodes(g_req)
-    odd_node_pairs = itertools.combinations(odd_nodes, 2)
+    Args:
+        graph (networkx MultiGraph)
 
-    logger_rpp.info('get shortest paths between odd nodes')
-    odd_node_pairs_shortest_paths = get_shortest_paths_distances(g_full, odd_node_pairs, edge_weight)
+    Returns:
+        list[networkx MultiGraph]: one independent copy per component, ordered by number of edges, descending
+    """
+    components = nx.weakly_connected_components if graph.is_directed() else nx.connected_components
+    component_graphs = [graph.subgraph(nodes).copy() for nodes in components(graph)]
+    return sorted(component_graphs, key=lambda g: g.number_of_edges(), reverse=True)
 
-    logger_rpp.info('Find min weight matching using blossom algorithm')
-    g_odd_complete = create_complete_graph(odd_node_pairs_shortest_paths, flip_weights=True)
-    odd_matching = nx.algorithms.max_weight_matching(g_odd_complete, True)
 
-    logger_rpp.info('add the min weight matching edges to g')
-    g_aug = add_augmenting_path_to_graph(g_req, odd_matching)
+def cpp_components_from_graph(graph, start_node=None, edge_weight='distance', verbose=False, cost_only=False,
+                              time_budget=None, max_workers=None, cache_dir=None):
+    """
+    Solve the CPP of each connected component of `graph` independently, in parallel worker processes.  Each component
+    is sent to one worker only, and the largest are submitted first, so the total time is close to the time of the
+    largest component.  If the solve is interrupted (e.g. by a batch job timeout), components not yet started are
+    cancelled and the workers are terminated rather than waited for.
 
-    logger_rpp.info('get eulerian circuit route')
-    circuit = list(create_eulerian_circuit(g_aug, g_full, start_node))
+    Args:
+        graph (networkx MultiGraph): graph where every edge must be walked, with several connected components
+        start_node (str): name of starting node, used for the component that contains it (optional)
+        edge_weight (str): name edge attribute that indicates distance to minimize in CPP
+        verbose (boolean): log info messages?
+        cost_only (boolean or str): only compute the route distance of each component?  See `cpp`.
+        time_budget (float): seconds to spend on each component's matching.  See `cpp`.
+        max_workers (int): number of worker processes.  Defaults to the smaller of the number of components and CPUs.
+            1 solves the components one after the other in this process, without a pool.
+        cache_dir (str): directory to checkpoint each component's stages to (optional).  Components hash differently,
+            so they share the directory safely.  See `cpp`.
+
+    Returns:
+        list[circuit.Circuit]: one circuit per component, largest component first (or one cost per component with
+        `cost_only`)
+    """
+    component_graphs = get_component_graphs(graph)
+    start_nodes = [start_node if start_node in g else None for g in component_graphs]
+    (logger_cpp if verbose else logger_null).info('solve {} components'.format(len(component_graphs)))
+
+    max_workers = max_workers or min(len(component_graphs), os.cpu_count() or 1)
+    solve = functools.partial(cpp_from_graph, edge_weight=edge_weight, verbose=verbose, cost_only=cost_only,
+                              time_budget=time_budget, cache_dir=cache_dir)
+    if max_workers == 1:
+        return list(map(solve, component_graphs, start_nodes))
+
+    # batch the small components so many tiny areas don't each cost a round trip to a worker
+    chunksize = max(1, len(component_graphs) // (4 * max_workers))
+    executor = ProcessPoolExecutor(max_workers=max_workers)
+    futures = []
+    try:
+        for i in range(0, len(component_graphs), chunksize):
+            futures.append(executor.submit(_solve_components, solve, component_graphs[i:i + chunksize],
+                                           start_nodes[i:i + chunksize]))
+        circuits = list(itertools.chain.from_iterable(future.result() for future in futures))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        workers = list((executor._processes or {}).values())  # no public API to stop running tasks
+        executor.shutdown(wait=False)
+        for worker in workers:
+            worker.terminate()
+        raise
+    executor.shutdown()
+    return circuits
 
-    return circuit, g_full
 
+def _solve_components(solve, component_graphs, start_nodes):
+    """Worker task of `cpp_components_from_graph`: solve a chunk of components"""
+    return [solve(g, n) for g, n in zip(component_graphs, start_nodes)]
 
-def cpp(edgelist_filename, start_node=None, edge_weight='distance', verbose=False):
+
+def cpp(edgelist_filename, start_node=None, edge_weight='distance', verbose=False, stream=False,
+        cache_dir=None, cost_only=False, time_budget=None, directed=False, progress=None, max_workers=None):
     """
     Solving the CPP from beginning (load network data) to end (finding optimal route).
     Can be run from command line with arguments from cpp.py, or from an interactive Python session (ex jupyter notebook)
@@ -72,34 +789,79 @@ def cpp(edgelist_filename, start_node=None, edge_weight='distance', verbose=Fals
         start_node (str): name of starting node.  See cpp.py for more details
         edge_weight (str): name edge attribute that indicates distance to minimize in CPP
         verbose (boolean): log info messages?
+        stream (boolean): return the circuit as a lazy generator rather than a list?  Use with
+            `circuit.stream_circuit` to write very long routes without holding them in memory.
+        cache_dir (str): directory to checkpoint each stage's output to (optional).  A rerun on the same edgelist and
+            parameters resumes from the last completed stage.
+        cost_only (boolean or str): return the distance of the route rather than the route.  True stops after the
+            min weight matching and gives the exact distance.  "lower_bound" skips the matching too, for a quicker
+            lower bound.  See `PostmanSolver.cost`.
+        time_budget (float): latency budget in seconds for the distances and matching (optional).  A heuristic
+            matching gives a valid route at once and is improved until the budget is spent, unless the exact matching
+            is found first.
+            The circuit's `gap` attribute bounds how far from optimal it is.  See `PostmanSolver.circuit_within`.
+        directed (boolean): treat each edgelist row as a one-way edge from the first node to the second (two-way edges
+            are listed once in each direction)?  In and out degree are then balanced with a min cost flow, and the
+            circuit follows edge direction.
+        progress (callable): called with a `solver.SolverEvent` as each stage starts, makes progress and ends
+            (optional), e.g. to drive a progress bar.  Raising `SolverCancelled` from it stops the solve.  See
+            `PostmanSolver`.
 
     Returns:
-        tuple(list[tuple(str, str, dict)], networkx.MultiGraph]:
-        Each tuple is a direction (from one node to another) from the CPP solution route.
+        tuple(circuit.Circuit, networkx.MultiGraph]:
+        Each element of the circuit is a direction (from one node to another) from the CPP solution route.  These are
+        `circuit.CircuitEdge` records which index like the tuple (from node, to node, edge key, edge attributes):
           The first element is the starting ("from") node.
           The second element is the end ("to") node.
-          The third element is the dict of edge attributes for that edge.
-        The original graph is returned as well.  This is needed for visualization
+          The third element is the key of the edge walked.
+          The fourth element is a read-only view of the attributes for that edge.
+        A generator of the same records is returned instead when `stream` is True.
+        With `cost_only`, an OrderedDict of the route's `distance_walked`, `distance_doublebacked` and
+        `distance_walked_once` is returned instead of the circuit.
+        When the edgelist has several connected components (e.g. merged operating areas), each is solved separately
+        in parallel (see `cpp_components_from_graph`) and a list of circuits is returned, one per component, largest
+        first.  `stats.calculate_components_solution_stats` combines their stats.  With `stream` their edges are
+        generated one component after the other, and with `cost_only` the costs of the components are summed.
+        Checkpoints are kept per component.  Components are solved in other processes, so `progress` is not supported
+        for them.
+        The original graph is returned as well, unmodified.  This is needed for visualization
     """
-    logger_cpp.disabled = not verbose
-
-    logger_cpp.info('read edgelist and create base graph')
+    (logger_cpp if verbose else logger_null).info('read edgelist and create base graph')
     el = read_edgelist(edgelist_filename, keep_optional=False)
-    g = create_networkx_graph_from_edgelist(el)
+    g = create_networkx_graph_from_edgelist(el, directed=directed)
 
-    logger_cpp.info('get augmenting path for odd nodes')
-    odd_nodes = get_odd_nodes(g)
-    odd_node_pairs = itertools.combinations(odd_nodes, 2)
-    odd_node_pairs_shortest_paths = get_shortest_paths_distances(g, odd_node_pairs, edge_weight)
-    g_odd_complete = create_complete_graph(odd_node_pairs_shortest_paths, flip_weights=True)
+    is_connected = nx.is_weakly_connected if directed else nx.is_connected
+    if not is_connected(g):
+        assert progress is None, 'progress is not supported on disconnected edgelists: components solve in parallel'
+        circuits = cpp_components_from_graph(g, start_node, edge_weight, verbose, cost_only, time_budget,
+                                             max_workers, cache_dir)
+        if cost_only:
+            return collections.OrderedDict([(k, sum([cost[k] for cost in circuits])) for k in circuits[0]]), g
+        return (itertools.chain.from_iterable(circuits) if stream else circuits), g
 
-    logger_cpp.info('Find min weight matching using blossom algorithm')
-    odd_matching = nx.algorithms.max_weight_matching(g_odd_complete, True)
+    circuit = cpp_from_graph(g, start_node, edge_weight, verbose, stream, cache_dir, cost_only, time_budget, progress)
+    return circuit, g
 
-    logger_cpp.info('add the min weight matching edges to g')
-    g_aug = add_augmenting_path_to_graph(g, odd_matching)
 
-    logger_cpp.info('get eulerian circuit route')
-    circuit = list(create_eulerian_circuit(g_aug, g, start_node))
+def solve_concurrently(graph, requests, postman_type='chinese', max_workers=None):
+    """
+    Solve many requests against one shared, read-only graph with a thread pool.  Meant for a long running service
+    that loads its network once and answers concurrent requests from the same warm process.
 
-    return circuit, g
+    The solvers hold no shared mutable state and never modify `graph`, so this is safe as long as nothing else
+    modifies `graph` while the solves run.  Note the solvers are pure python: threads give concurrency (requests are
+    served side by side) rather than parallel speed up, which would need processes.
+
+    Args:
+        graph (networkx MultiGraph): loaded graph, shared by every solve
+        requests (list[dict]): keyword arguments for each solve: any of `start_node`, `edge_weight`, `verbose`
+        postman_type (str): "rural" or "chinese"
+        max_workers (int): number of threads.  None uses the `ThreadPoolExecutor` default.
+
+    Returns:
+        list[circuit.Circuit]: one circuit per request, in the order of `requests`
+    """
+    solve = {'chinese': cpp_from_graph, 'rural': rpp_from_graph}[postman_type]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(solve, graph, **request) for request in requests]
+        return [future.result() for future in futures]
@@ -1,30 +1,123 @@
 import collections
+import numpy as np
 
 
-def calculate_postman_solution_stats(circuit, edge_weight_name='distance'):
+def get_circuit_columns(circuit, edge_weight_name='distance'):
     """
-    Calculate summary stats on the route
+    Columnar form of a circuit for vectorized stats: the edge attributes are read once per step.  A `circuit.Circuit`
+    is read straight from its columns, without materializing its edges.
+
     Args:
         circuit (list[tuple]): output from `cpp` or `rpp` solvers
         edge_weight_name (str): parameter name for edge attribute with distance/weight
 
     Returns:
-        summary table (OrderedDict)
+        tuple(numpy.ndarray, numpy.ndarray, numpy.ndarray): weight of each step, and boolean arrays flagging the
+        augmented (double backed) and optional steps
     """
+    if hasattr(circuit, 'attribute_column'):
+        weights = circuit.attribute_column(edge_weight_name)
+        augmented = np.frombuffer(circuit.augmented_flags(), dtype=np.uint8).astype(bool)
+        optional = [required == 0 for required in circuit.attribute_column('required')]
+    else:
+        weights, augmented, optional = [], [], []
+        for e in circuit:
+            weights.append(e[3][edge_weight_name])
+            augmented.append('augmented' in e[3])
+            optional.append(e[3].get('required') == 0)
+    return np.array(weights), np.array(augmented, dtype=bool), np.array(optional, dtype=bool)
+
+
+def _summarize(distance_walked, distance_doublebacked, distance_optional, edges_walked, edges_doublebacked,
+               edges_optional):
+    """Summary table from the totals over all steps and over the double backed and optional steps"""
     summary_stats = collections.OrderedDict()
 
     # Distance
-    summary_stats['distance_walked'] = sum([e[3][edge_weight_name] for e in circuit])
-    summary_stats['distance_doublebacked'] = sum([e[3][edge_weight_name] for e in circuit if 'augmented' in e[3]])
-    summary_stats['distance_walked_once'] = summary_stats['distance_walked'] - summary_stats['distance_doublebacked']
-    summary_stats['distance_walked_optional'] = sum([e[3]['distance'] for e in circuit if e[3].get('required') == 0])
-    summary_stats['distance_walked_required'] = summary_stats['distance_walked'] - summary_stats['distance_walked_optional']
+    summary_stats['distance_walked'] = distance_walked
+    summary_stats['distance_doublebacked'] = distance_doublebacked
+    summary_stats['distance_walked_once'] = distance_walked - distance_doublebacked
+    summary_stats['distance_walked_optional'] = distance_optional
+    summary_stats['distance_walked_required'] = distance_walked - distance_optional
 
     # Number of edges
-    summary_stats['edges_walked'] = len(circuit)
-    summary_stats['edges_doublebacked'] = collections.Counter([e[3].get('augmented') for e in circuit])[True]
-    summary_stats['edges_walked_once'] = summary_stats['edges_walked'] - summary_stats['edges_doublebacked']
-    summary_stats['edges_walked_optional'] = collections.Counter([e[3].get('required') for e in circuit])[0]
-    summary_stats['edges_walked_required'] = summary_stats['edges_walked'] - summary_stats['edges_walked_optional']
+    summary_stats['edges_walked'] = edges_walked
+    summary_stats['edges_doublebacked'] = edges_doublebacked
+    summary_stats['edges_walked_once'] = edges_walked - edges_doublebacked
+    summary_stats['edges_walked_optional'] = edges_optional
+    summary_stats['edges_walked_required'] = edges_walked - edges_optional
 
     return summary_stats
+
+
+def calculate_postman_solution_stats(circuit, edge_weight_name='distance'):
+    """
+    Calculate summary stats on the route
+    Args:
+        circuit (list[tuple]): output from `cpp` or `rpp` solvers
+        edge_weight_name (str): parameter name for edge attribute with distance/weight
+
+    Returns:
+        summary table (OrderedDict)
+    """
+    weights, augmented, optional = get_circuit_columns(circuit, edge_weight_name)
+    return _summarize(weights.sum().item(), weights[augmented].sum().item(), weights[optional].sum().item(),
+                      len(weights), int(augmented.sum()), int(optional.sum()))
+
+
+def calculate_components_solution_stats(circuits, edge_weight_name='distance'):
+    """
+    Combined summary stats of routes solved separately, e.g. one per connected component (see `solver.cpp`)
+
+    Args:
+        circuits (list[list[tuple]]): one circuit per component
+        edge_weight_name (str): parameter name for edge attribute with distance/weight
+
+    Returns:
+        summary table (OrderedDict): number of components plus the sum of each stat of
+        `calculate_postman_solution_stats` over the components
+    """
+    component_stats = [calculate_postman_solution_stats(circuit, edge_weight_name) for circuit in circuits]
+    summary_stats = collections.OrderedDict([('components', len(circuits))])
+    for k in component_stats[0]:
+        summary_stats[k] = sum([stats[k] for stats in component_stats])
+    return summary_stats
+
+
+class StatsAccumulator(object):
+    """
+    Sink that computes the summary stats of a circuit as it streams past, one edge at a time, so a streamed circuit
+    gets its stats without being held in memory or read twice.  Use with `circuit.stream_circuit`.
+    """
+
+    def __init__(self, edge_weight_name='distance'):
+        """
+        Args:
+            edge_weight_name (str): parameter name for edge attribute with distance/weight
+        """
+        self.edge_weight_name = edge_weight_name
+        self._distance = [0, 0, 0]  # walked, doublebacked, optional
+        self._edges = [0, 0, 0]
+
+    def write(self, edge):
+        """
+        Args:
+            edge (tuple): circuit edge: "from" node, "to" node, edge key and edge attributes
+        """
+        attr = edge[3]
+        weight = attr[self.edge_weight_name]
+        self._distance[0] += weight
+        self._edges[0] += 1
+        if 'augmented' in attr:
+            self._distance[1] += weight
+            self._edges[1] += 1
+        if attr.get('required') == 0:
+            self._distance[2] += weight
+            self._edges[2] += 1
+
+    def stats(self):
+        """
+        Returns:
+            summary table (OrderedDict) of the edges seen so far, as from `calculate_postman_solution_stats`
+        """
+        return _summarize(*(self._distance + self._edges))
@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import pytest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from postman_problems import async_solver
+from postman_problems.async_solver import AsyncPostmanSolver, cpp_async, rpp_async
+from postman_problems.solver import cpp_from_graph, rpp_from_graph
+
+
+def _walked(circuit):
+    return sum([e[3]['distance'] for e in circuit])
+
+
+def test_async_solver_gather(GRAPH_1, GRAPH_2):
+    async def solve_all():
+        async with AsyncPostmanSolver(GRAPH_2, max_workers=2) as solver:
+            return await asyncio.gather(solver.rpp(start_node='a'), solver.rpp(start_node='b'),
+                                        solver.cpp(start_node='c'))
+
+    rpp_a, rpp_b, cpp_c = asyncio.run(solve_all())
+    assert _walked(rpp_a) == _walked(rpp_b) == _walked(rpp_from_graph(GRAPH_2))
+    assert _walked(cpp_c) == _walked(cpp_from_graph(GRAPH_2))
+    assert (rpp_a[0][0], rpp_b[0][0], cpp_c[0][0]) == ('a', 'b', 'c')
+    assert rpp_a.gap == 0.0
+
+
+def test_async_solver_thread_executor(GRAPH_1):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        circuit = asyncio.run(cpp_async(GRAPH_1, start_node='a', executor=executor))
+    assert _walked(circuit) == _walked(cpp_from_graph(GRAPH_1)) == 45
+    assert circuit[0][0] == 'a'
+
+
+def test_async_solver_caller_process_pool(GRAPH_1):
+    # sessions are pickled to the caller's pool with every stage
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        circuit = asyncio.run(cpp_async(GRAPH_1, start_node='a', executor=executor))
+    assert _walked(circuit) == 45
+    assert circuit[0][0] == 'a'
+
+
+def test_async_solver_default_executor(GRAPH_2):
+    circuit = asyncio.run(rpp_async(GRAPH_2))
+    assert _walked(circuit) == _walked(rpp_from_graph(GRAPH_2))
+
+
+def test_async_solver_cancel_between_stages(GRAPH_1):
+    started, release = threading.Event(), threading.Event()
+
+    def blocked_odd_nodes(solver):
+        started.set()
+        release.wait(10)
+        return [], False
+
+    async def solve_and_cancel(solver):
+        task = asyncio.ensure_future(solver.cpp())
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 10)  # inside the odd nodes stage
+        task.cancel()
+        try:
+            await task
+        finally:
+            release.set()
+
+    circuit_stage = mock.Mock()
+    with ThreadPoolExecutor(max_workers=1) as executor, \
+            mock.patch.object(async_solver, '_odd_nodes_stage', blocked_odd_nodes), \
+            mock.patch.object(async_solver, '_circuit_stage', circuit_stage):
+        with pytest.raises(asyncio.CancelledError):
+            asyncio.run(solve_and_cancel(AsyncPostmanSolver(GRAPH_1, executor)))
+    assert started.is_set()
+    circuit_stage.assert_not_called()
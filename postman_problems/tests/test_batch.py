@@ -0,0 +1,51 @@
+import time
+import pandas as pd
+from unittest.mock import patch
+from postman_problems.batch import find_edgelists, solve_job, solve_batch
+
+
+def _write_edgelist(path, edges):
+    pd.DataFrame(edges, columns=['node1', 'node2', 'distance']).to_csv(str(path), index=False)
+
+
+def test_find_edgelists(tmpdir):
+    _write_edgelist(tmpdir.join('b.csv'), [('a', 'b', 1), ('b', 'a', 2)])
+    _write_edgelist(tmpdir.join('a.csv'), [('a', 'b', 1), ('b', 'a', 2)])
+    tmpdir.join('notes.txt').write('not an edgelist')
+    assert find_edgelists(str(tmpdir)) == [str(tmpdir.join('a.csv')), str(tmpdir.join('b.csv'))]
+
+    tmpdir.join('manifest.txt').write('# nightly routes\nb.csv\n\na.csv\n')
+    assert find_edgelists(str(tmpdir.join('manifest.txt'))) == [str(tmpdir.join('b.csv')), str(tmpdir.join('a.csv'))]
+
+
+def test_solve_batch(tmpdir):
+    inputs, output_dir = tmpdir.mkdir('in'), tmpdir.join('out')
+    _write_edgelist(inputs.join('triangle.csv'), [('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 3)])
+    _write_edgelist(inputs.join('path.csv'), [('a', 'b', 1), ('b', 'c', 2)])
+    _write_edgelist(inputs.join('two_areas.csv'), [('a', 'b', 1), ('b', 'a', 2), ('x', 'y', 3)])
+    edgelists = find_edgelists(str(inputs)) + [str(inputs.join('missing.csv'))]
+
+    summary = solve_batch(edgelists, str(output_dir), start_node='a', max_workers=2)
+    assert list(summary['status']) == ['ok', 'ok', 'ok', 'error']
+    assert list(summary['distance_walked'][:3]) == [6, 6, 3 + 6]
+    assert 'FileNotFoundError' in summary['error'][3]
+
+    assert output_dir.join('batch_summary.csv').check()
+    assert len(pd.read_csv(str(output_dir.join('path_circuit.csv')))) == 4
+    assert pd.read_csv(str(output_dir.join('triangle_stats.csv')))['edges_walked'][0] == 3
+    assert len(pd.read_csv(str(output_dir.join('two_areas_circuit.csv')))) == 4  # both components
+
+
+@patch('postman_problems.batch.cpp', side_effect=lambda *args, **kwargs: time.sleep(5))
+def test_solve_job_timeout(mock_cpp, tmpdir):
+    result = solve_job('slow.csv', 'slow', str(tmpdir), timeout=0.1)
+    assert result['status'] == 'timeout'
+    assert result['seconds'] < 5
+
+
+@patch('postman_problems.solver.cpp_from_graph', side_effect=lambda *args, **kwargs: time.sleep(5))
+def test_solve_job_timeout_disconnected(mock_cpp_from_graph, tmpdir):
+    _write_edgelist(tmpdir.join('two_areas.csv'), [('a', 'b', 1), ('b', 'a', 2), ('x', 'y', 3), ('y', 'x', 4)])
+    result = solve_job(str(tmpdir.join('two_areas.csv')), 'two_areas', str(tmpdir), timeout=0.5)
+    assert result['status'] == 'timeout'
+    assert result['seconds'] < 2  # abandoned at the timeout, not after the components finish
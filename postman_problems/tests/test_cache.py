@@ -0,0 +1,75 @@
+import pytest
+import pandas as pd
+import networkx as nx
+from postman_problems.tests.utils import create_mock_csv_from_dataframe
+from postman_problems.cache import StageCache, hash_graph
+from postman_problems.solver import PostmanSolver, rpp, cpp
+
+
+def test_hash_graph(GRAPH_2):
+    assert hash_graph(GRAPH_2) == hash_graph(GRAPH_2.copy())
+
+    graph = GRAPH_2.copy()
+    graph['b']['c'][0]['distance'] = 50
+    assert hash_graph(graph) != hash_graph(GRAPH_2)
+    assert hash_graph(GRAPH_2.to_directed()) != hash_graph(GRAPH_2)
+
+
+def test_stage_cache_load_save(tmpdir):
+    cache = StageCache(str(tmpdir.join('checkpoints')))
+    key = StageCache.make_key('abc', 'rural', 'distance')
+    assert cache.load('matching', key) == (False, None)
+
+    cache.save('matching', key, [('a', 'b')])
+    assert cache.load('matching', key) == (True, [('a', 'b')])
+    assert StageCache(cache.cache_dir).load('matching', key) == (True, [('a', 'b')])
+
+    cache.clear()
+    assert cache.load('matching', key) == (False, None)
+
+
+def test_postman_solver_resume(GRAPH_2, tmpdir):
+    cache_dir = str(tmpdir)
+    solver = PostmanSolver(GRAPH_2, 'rural', cache_dir=cache_dir)
+    circuit = solver.circuit('a')
+    assert solver.stage_counts['circuit'] == 1
+    assert sum(solver.checkpoint_loads.values()) == 0
+
+    # a fresh session on the same graph loads every checkpointed stage instead of computing it
+    solver_rerun = PostmanSolver(GRAPH_2, 'rural', cache_dir=cache_dir)
+    circuit_rerun = solver_rerun.circuit('a')
+    assert list(circuit_rerun) == list(circuit)
+    assert solver_rerun.checkpoint_loads['circuit'] == 1
+    assert solver_rerun.stage_counts['matching'] == 0
+
+    # an interrupted solve resumes from its last completed stage
+    StageCache(cache_dir).clear()
+    PostmanSolver(GRAPH_2, 'rural', cache_dir=cache_dir).matching()
+    solver_resume = PostmanSolver(GRAPH_2, 'rural', cache_dir=cache_dir)
+    solver_resume.circuit('a')
+    assert solver_resume.checkpoint_loads['matching'] == 1
+    assert solver_resume.stage_counts['distances'] == 0
+    assert solver_resume.stage_counts['circuit'] == 1
+
+    # new edge weights are a different graph
+    solver_rerun.set_edge_weights({('b', 'c', 0): 50})
+    assert sum([e[3]['distance'] for e in solver_rerun.circuit('a')]) == 119
+    assert solver_rerun.stage_counts['circuit'] == 1
+
+
+def test_rpp_cache_dir(GRAPH_2, tmpdir):
+    edgelist = nx.to_pandas_edgelist(GRAPH_2, source='_node1', target='_node2')
+    circuit, graph = rpp(create_mock_csv_from_dataframe(edgelist), start_node='a', cache_dir=str(tmpdir))
+    assert sum([e[3]['distance'] for e in circuit]) == 116
+    assert len(tmpdir.listdir()) == 4
+    assert isinstance(graph, nx.MultiGraph)
+
+
+def test_cpp_cache_dir_directed(tmpdir):
+    # a one-way path has no directed circuit, but an undirected one walks it there and back
+    edgelist = pd.DataFrame([('a', 'b', 1), ('b', 'c', 2)], columns=['node1', 'node2', 'distance'])
+    circuit, _ = cpp(create_mock_csv_from_dataframe(edgelist), start_node='a', cache_dir=str(tmpdir))
+    assert len(circuit) == 4
+
+    with pytest.raises(nx.NetworkXUnfeasible):
+        cpp(create_mock_csv_from_dataframe(edgelist), start_node='a', cache_dir=str(tmpdir), directed=True)
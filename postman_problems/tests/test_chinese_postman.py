@@ -1,8 +1,10 @@
 import sys
 import os
+import json
 import pytest
 import tempfile
 import shutil
+import imageio
 import pkg_resources
 from unittest.mock import patch
 from postman_problems.postman_chinese import chinese_postman
@@ -56,6 +58,41 @@ def test_chinese_postman_sleeping_giant():
         chinese_postman()
 
 
+def test_chinese_postman_sleeping_giant_circuit_output():
+    tmpdir = tempfile.mkdtemp()
+    testargs = ["chinese_postman",
+                "--edgelist", EDGELIST_SLEEPING_GIANT,
+                "--nodelist", NODELIST_SLEEPING_GIANT,
+                "--circuit_output", os.path.join(tmpdir, 'circuit.geojson'),
+                "--validate"
+                ]
+    with patch.object(sys, 'argv', testargs):
+        chinese_postman()
+
+    with open(os.path.join(tmpdir, 'circuit.geojson')) as f:
+        assert len(json.load(f)['features']) == 155
+
+    shutil.rmtree(tmpdir)
+
+
+def test_chinese_postman_sleeping_giant_raster_animation():
+    tmpdir = tempfile.mkdtemp()
+    testargs = ["chinese_postman",
+                "--edgelist", EDGELIST_SLEEPING_GIANT,
+                "--nodelist", NODELIST_SLEEPING_GIANT,
+                "--animation",
+                "--animation_renderer", "raster",
+                "--animation_filename", os.path.join(tmpdir, 'cpp_graph.gif'),
+                "--max_frames", "20"
+                ]
+    with patch.object(sys, 'argv', testargs):
+        chinese_postman()
+
+    assert len(imageio.mimread(os.path.join(tmpdir, 'cpp_graph.gif'))) == 20
+
+    shutil.rmtree(tmpdir)
+
+
 def test_entry_point_example_chinese_postman_seven_bridges(script_runner):
     """
     Just testing that seven_bridges example runs with pre-parameterized config.
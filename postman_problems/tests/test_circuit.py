@@ -0,0 +1,134 @@
+import csv
+import json
+import types
+from io import StringIO
+from unittest.mock import patch
+
+import networkx as nx
+import pytest
+from postman_problems.circuit import (
+    Circuit, CircuitEdge, CsvCircuitWriter, JsonlCircuitWriter, GeoJsonCircuitWriter, get_circuit_writer,
+    stream_circuit, get_circuit_start_offsets, rotate_circuit, iter_circuit_rotations
+)
+from postman_problems.solver import cpp
+
+
+def test_circuit_edge():
+    attr = {'distance': 5, 'id': 1}
+    edge = CircuitEdge('a', 'b', 0, 1, True, attr)
+    assert edge == ('a', 'b', 0, {'distance': 5, 'id': 1, 'augmented': True})
+    assert edge[3]['augmented'] is True
+    assert edge.attributes.get('color') is None
+    assert attr == {'distance': 5, 'id': 1}  # augmented flag lives on the record, not the graph
+
+    edge_once = CircuitEdge('b', 'a', 0, 1, False, attr)
+    assert 'augmented' not in edge_once[3]
+    assert dict(edge_once[3]) == attr
+
+
+def test_circuit(GRAPH_1_CIRCUIT_CPP):
+    circuit = Circuit(GRAPH_1_CIRCUIT_CPP)
+    assert len(circuit) == 7
+    assert list(circuit) == GRAPH_1_CIRCUIT_CPP
+    assert circuit[-1] == GRAPH_1_CIRCUIT_CPP[-1]
+    assert isinstance(circuit[1:3], Circuit)
+    assert list(circuit[1:3]) == GRAPH_1_CIRCUIT_CPP[1:3]
+
+
+def test_get_circuit_start_offsets(GRAPH_1_CIRCUIT_CPP):
+    assert get_circuit_start_offsets(GRAPH_1_CIRCUIT_CPP) == {'a': 0, 'b': 1, 'd': 2, 'c': 3}
+    assert list(get_circuit_start_offsets(Circuit(GRAPH_1_CIRCUIT_CPP)).items()) == [('a', 0), ('b', 1), ('d', 2),
+                                                                                     ('c', 3)]
+
+
+def test_circuit_rotation_reads_node_columns(GRAPH_1_CIRCUIT_CPP):
+    circuit = Circuit(GRAPH_1_CIRCUIT_CPP)
+    with patch('postman_problems.circuit.CircuitEdge', wraps=CircuitEdge) as circuit_edge:
+        get_circuit_start_offsets(circuit)
+        rotate_circuit(circuit, 'c')
+    assert circuit_edge.call_count == 4  # only the closed circuit checks, not a step each
+
+
+@pytest.mark.parametrize('as_circuit', [True, False])
+def test_rotate_circuit(GRAPH_1_CIRCUIT_CPP, as_circuit):
+    circuit = Circuit(GRAPH_1_CIRCUIT_CPP) if as_circuit else GRAPH_1_CIRCUIT_CPP
+    rotated = rotate_circuit(circuit, 'c')
+    assert len(rotated) == 7
+    assert rotated[0][0] == rotated[-1][1] == 'c'
+    assert list(rotated) == GRAPH_1_CIRCUIT_CPP[3:] + GRAPH_1_CIRCUIT_CPP[:3]
+    assert sum([e[3]['distance'] for e in rotated]) == 45
+
+    with pytest.raises(ValueError):
+        rotate_circuit(circuit, 'z')
+
+
+def test_iter_circuit_rotations(GRAPH_1_CIRCUIT_CPP):
+    rotations = dict(iter_circuit_rotations(Circuit(GRAPH_1_CIRCUIT_CPP)))
+    assert set(rotations) == {'a', 'b', 'c', 'd'}
+    for node, rotated in rotations.items():
+        assert rotated[0][0] == rotated[-1][1] == node
+
+    assert [n for n, _ in iter_circuit_rotations(GRAPH_1_CIRCUIT_CPP, ['d', 'b'])] == ['d', 'b']
+
+
+def test_csv_circuit_writer(GRAPH_1_CIRCUIT_CPP):
+    f = StringIO()
+    with CsvCircuitWriter(f) as writer:
+        assert stream_circuit(GRAPH_1_CIRCUIT_CPP, [writer]) == 7
+
+    f.seek(0)
+    rows = list(csv.DictReader(f))
+    assert len(rows) == 7
+    assert rows[0]['node_from'] == 'a'
+    assert rows[1]['augmented'] == 'True'
+    assert sum([int(r['distance']) for r in rows]) == 45
+
+
+def test_jsonl_circuit_writer(GRAPH_1_CIRCUIT_CPP):
+    f = StringIO()
+    with JsonlCircuitWriter(f) as writer:
+        stream_circuit(GRAPH_1_CIRCUIT_CPP, [writer])
+
+    rows = [json.loads(line) for line in f.getvalue().splitlines()]
+    assert [r['step'] for r in rows] == list(range(7))
+    assert [r['augmented'] for r in rows].count(True) == 2
+    assert rows[-1]['node_to'] == 'a'
+
+
+def test_geojson_circuit_writer(GRAPH_1_CIRCUIT_CPP):
+    graph = nx.MultiGraph()
+    graph.add_nodes_from([(n, {'X': i, 'Y': 2 * i}) for i, n in enumerate('abcd')])
+
+    f = StringIO()
+    with GeoJsonCircuitWriter(f, graph) as writer:
+        stream_circuit(GRAPH_1_CIRCUIT_CPP, [writer])
+
+    geojson = json.loads(f.getvalue())
+    assert len(geojson['features']) == 7
+    assert geojson['features'][0]['geometry']['coordinates'] == [[0, 0], [1, 2]]
+
+
+def test_stream_circuit_callable_sink(GRAPH_1_CIRCUIT_CPP):
+    seen = []
+    assert stream_circuit(iter(GRAPH_1_CIRCUIT_CPP), [seen.append]) == 7
+    assert seen == GRAPH_1_CIRCUIT_CPP
+
+
+def test_get_circuit_writer(tmpdir):
+    with get_circuit_writer(str(tmpdir.join('circuit.csv'))) as writer:
+        assert isinstance(writer, CsvCircuitWriter)
+    with get_circuit_writer(str(tmpdir.join('circuit.jsonl'))) as writer:
+        assert isinstance(writer, JsonlCircuitWriter)
+    with pytest.raises(ValueError):
+        get_circuit_writer(str(tmpdir.join('circuit.xyz')))
+    with pytest.raises(ValueError):
+        get_circuit_writer(str(tmpdir.join('circuit.json')), nx.MultiGraph())  # not silently GeoJSON
+
+
+def test_cpp_stream(GRAPH_1_EDGELIST_CSV):
+    circuit, graph = cpp(GRAPH_1_EDGELIST_CSV, start_node='a', stream=True)
+    assert isinstance(circuit, types.GeneratorType)
+
+    f = StringIO()
+    with CsvCircuitWriter(f) as writer:
+        assert stream_circuit(circuit, [writer]) == 7
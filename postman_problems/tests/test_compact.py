@@ -0,0 +1,56 @@
+import networkx as nx
+import pytest
+from postman_problems.compact import CompactGraph, eulerian_circuit
+from postman_problems.graph import add_augmenting_path_to_graph
+
+
+def test_compact_graph_from_networkx(GRAPH_1):
+    compact = CompactGraph.from_networkx(GRAPH_1)
+    assert compact.number_of_nodes() == 4
+    assert compact.number_of_edges() == 5
+    assert [compact.degree(compact.node_index[n]) for n in 'abcd'] == [2, 3, 3, 2]
+    assert sorted([a['id'] for a in compact.edge_attrs]) == [1, 2, 3, 4, 5]
+
+
+def test_eulerian_circuit(GRAPH_1):
+    compact = CompactGraph.from_networkx(add_augmenting_path_to_graph(GRAPH_1, [('b', 'c')]))
+    nodes, edges = eulerian_circuit(compact, 'a')
+    assert len(edges) == 6
+    assert len(nodes) == 7
+    assert sorted(edges) == list(range(6))  # each edge walked exactly once
+    assert compact.nodes[nodes[0]] == compact.nodes[nodes[-1]] == 'a'
+
+    # each edge connects the nodes it is walked between
+    for i, e in enumerate(edges):
+        assert {compact.edge_u[e], compact.edge_v[e]} == {nodes[i], nodes[i + 1]}
+
+
+def test_eulerian_circuit_self_loop():
+    compact = CompactGraph.from_networkx(nx.MultiGraph([('a', 'b'), ('b', 'b'), ('b', 'a')]))
+    nodes, edges = eulerian_circuit(compact)
+    assert sorted(edges) == [0, 1, 2]
+    assert nodes[0] == nodes[-1]
+
+
+def test_eulerian_circuit_not_eulerian(GRAPH_1):
+    with pytest.raises(nx.NetworkXError):
+        eulerian_circuit(CompactGraph.from_networkx(GRAPH_1))
+
+    with pytest.raises(nx.NetworkXError):
+        eulerian_circuit(CompactGraph.from_networkx(nx.MultiGraph([('a', 'b'), ('b', 'a'), ('c', 'd'), ('d', 'c')])))
+
+
+def test_eulerian_circuit_directed():
+    graph = nx.MultiDiGraph([('a', 'b'), ('b', 'c'), ('c', 'a'), ('a', 'c'), ('c', 'a')])
+    compact = CompactGraph.from_networkx(graph)
+    assert compact.directed
+    assert [compact.degree(compact.node_index[n]) for n in 'abc'] == [2, 1, 2]  # out degree
+
+    nodes, edges = eulerian_circuit(compact, 'a')
+    assert sorted(edges) == list(range(5))
+    for i, e in enumerate(edges):
+        assert (compact.edge_u[e], compact.edge_v[e]) == (nodes[i], nodes[i + 1])  # walked forward
+
+    # balanced total degree isn't enough when directed
+    with pytest.raises(nx.NetworkXError):
+        eulerian_circuit(CompactGraph.from_networkx(nx.MultiDiGraph([('a', 'b'), ('a', 'b')])))
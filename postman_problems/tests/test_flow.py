@@ -0,0 +1,24 @@
+import networkx as nx
+import pytest
+from postman_problems.flow import min_cost_flow
+
+
+def test_min_cost_flow():
+    # two units from 0 to 3.  Arcs are uncapacitated, so both take the cheapest path 0-1-3
+    arcs = [(0, 1, 1), (1, 3, 1), (0, 2, 3), (2, 3, 3), (1, 2, 1)]
+    flow = min_cost_flow(4, [a[0] for a in arcs], [a[1] for a in arcs], [a[2] for a in arcs], [2, 0, 0, -2])
+    assert list(flow) == [2, 2, 0, 0, 0]
+
+    # matches networkx on a graph where the second path has to undo flow of the first (a backward residual arc)
+    graph = nx.DiGraph()
+    graph.add_weighted_edges_from([(0, 1, 1), (1, 2, 1), (2, 3, 1), (0, 2, 4), (1, 3, 4)])
+    supply = [1, 1, -1, -1]
+    nx.set_node_attributes(graph, {i: -s for i, s in enumerate(supply)}, 'demand')
+    arcs = list(graph.edges(data='weight'))
+    flow = min_cost_flow(4, [a[0] for a in arcs], [a[1] for a in arcs], [a[2] for a in arcs], supply)
+    assert sum([f * a[2] for f, a in zip(flow, arcs)]) == nx.min_cost_flow_cost(graph)
+
+
+def test_min_cost_flow_unfeasible():
+    with pytest.raises(nx.NetworkXUnfeasible):
+        min_cost_flow(3, [0, 2], [1, 1], [1, 1], [-1, 0, 1])  # 2 can reach 1 only
@@ -6,8 +6,9 @@ import networkx as nx
 import pytest
 from postman_problems.graph import (
     read_edgelist, create_networkx_graph_from_edgelist, get_odd_nodes, get_even_nodes, get_shortest_paths_distances,
-    create_complete_graph, dedupe_matching, add_augmenting_path_to_graph, create_eulerian_circuit,
-    assert_graph_is_connected, create_required_graph
+    get_nearest_node_distances, connect_required_components, create_complete_graph, dedupe_matching,
+    add_augmenting_path_to_graph, add_doubled_edges_to_graph, create_eulerian_circuit, assert_graph_is_connected,
+    create_required_graph
 )
 
 
@@ -86,6 +87,61 @@ def test_get_shortest_paths_distances(GRAPH_1):
     assert odd_node_pairs_shortest_paths[bc_key] == 5
 
 
+def test_get_nearest_node_distances(GRAPH_1):
+    graph = GRAPH_1.copy()
+    graph.add_edge('b', 'e', distance=7)
+    graph.add_edge('c', 'f', distance=1)
+    nodes = ['a', 'd', 'e', 'f']
+
+    # matches the brute force search
+    all_pairs = dict(nx.all_pairs_dijkstra_path_length(graph, weight='distance'))
+    expected = {u: min([all_pairs[u][v] for v in nodes if v != u]) for u in nodes}
+    assert get_nearest_node_distances(graph, nodes, 'distance') == expected
+
+    with pytest.raises(nx.NetworkXNoPath):
+        graph.add_edge('x', 'y', distance=1)
+        get_nearest_node_distances(graph, ['a', 'x'], 'distance')
+
+
+def test_connect_required_components():
+    # required edges along the rows of a grid, so each row is its own component
+    graph = nx.MultiGraph()
+    for (u, v) in nx.grid_2d_graph(6, 5).edges():
+        graph.add_edge(u, v, distance=1 + (u[0] * 7 + u[1] * 3 + v[0] * 5) % 4, required=int(u[0] == v[0]))
+    graph_req = create_required_graph(graph)
+    components = list(nx.connected_components(graph_req))
+    assert len(components) == 6
+
+    connecting_edges = connect_required_components(graph, components, 'distance')
+    assert not any([graph[u][v][k]['required'] for u, v, k in connecting_edges])
+    assert nx.is_connected(create_required_graph(graph, connecting_edges))
+
+    # matches the spanning tree over shortest paths between every pair of components
+    g_components = nx.Graph()
+    for i, j in itertools.combinations(range(len(components)), 2):
+        g_components.add_edge(i, j, distance=min([
+            nx.dijkstra_path_length(graph, u, v, weight='distance') for u in components[i] for v in components[j]]))
+    mst_distance = nx.minimum_spanning_tree(g_components, weight='distance').size(weight='distance')
+    assert sum([graph[u][v][k]['distance'] for u, v, k in connecting_edges]) == mst_distance
+
+    assert connect_required_components(graph, components[:1], 'distance') == set()
+
+
+def test_connect_required_components_directed():
+    # the same rows of one-way streets, with two-way streets between rows: joined up to weak connectivity
+    graph = nx.MultiDiGraph()
+    for (u, v) in nx.grid_2d_graph(6, 5).edges():
+        graph.add_edge(u, v, distance=1, required=int(u[0] == v[0]))
+        if u[0] != v[0]:
+            graph.add_edge(v, u, distance=1, required=0)
+    components = list(nx.weakly_connected_components(create_required_graph(graph)))
+    assert len(components) == 6
+
+    connecting_edges = connect_required_components(graph, components, 'distance')
+    assert all([graph.has_edge(u, v, k) and not graph[u][v][k]['required'] for u, v, k in connecting_edges])
+    assert nx.is_weakly_connected(create_required_graph(graph, connecting_edges))
+
+
 def test_create_complete_graph():
     # with flipped weights
     graph_complete = create_complete_graph(NODE_PAIRS, flip_weights=True)
@@ -111,6 +167,8 @@ def test_add_augmenting_path_to_graph(GRAPH_1):
     assert len(graph_aug.edges()) == 6
     assert sum([e[3]['distance'] for e in graph_aug.edges(data=True, keys=True)]) == 45
     assert [set([e[0], e[1]]) for e in graph_aug.edges(data=True)].count(set(['b', 'c'])) == 2
+    assert len(GRAPH_1.edges()) == 5  # overlay leaves the base graph alone
+    assert dict(graph_aug.degree())['b'] == 4
 
 
 def test_create_eulerian_circuit(GRAPH_1):
@@ -122,6 +180,22 @@ def test_create_eulerian_circuit(GRAPH_1):
     assert circuit[-1][1] == 'a'
     assert collections.Counter([e[3]['id'] for e in circuit]) == collections.Counter({4: 2, 5: 2, 2: 1, 3: 1, 1: 1})
 
+    # augmented walks are flagged on the circuit, without touching the graph
+    assert [e[3].get('augmented') for e in circuit].count(True) == 2
+    assert not any(['augmented' in e[3] for e in GRAPH_1.edges(data=True, keys=True)])
+
+
+def test_create_eulerian_circuit_doubled_tree():
+    tree = nx.MultiGraph([('a', 'b', {'id': 1, 'distance': 5}), ('b', 'c', {'id': 2, 'distance': 3})])
+    graph_aug = add_doubled_edges_to_graph(tree, 'distance')
+    assert len(graph_aug.edges()) == 4
+    assert len(tree.edges()) == 2
+
+    circuit = list(create_eulerian_circuit(graph_aug, tree, 'c'))
+    assert sum([e[3]['distance'] for e in circuit]) == 16
+    assert circuit[0][0] == circuit[-1][1] == 'c'
+    assert collections.Counter([e[3]['id'] for e in circuit]) == collections.Counter({1: 2, 2: 2})
+
 
 def test_check_graph_is_connected(GRAPH_1):
     assert assert_graph_is_connected(GRAPH_1)  # check that a connected graph is deemed as such
@@ -139,6 +213,7 @@ def test_create_required_graph(GRAPH_1):
     GRAPH_1_FULL['c']['d'][0]['required'] = False  # testing 0 and False values for 'required'
 
     GRAPH_1_REQ = create_required_graph(GRAPH_1_FULL)
+    assert nx.is_frozen(GRAPH_1_REQ)  # read-only view, not a copy
     assert set(GRAPH_1_REQ.nodes()) == set(['a', 'b', 'c'])
     assert set(GRAPH_1.nodes()) == set(['a', 'b', 'c', 'd'])
     assert len(GRAPH_1_REQ.edges()) == 3
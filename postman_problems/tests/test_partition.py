@@ -0,0 +1,56 @@
+import random
+import networkx as nx
+from postman_problems.partition import partition_required_edges, solve_partitions, k_rpp
+from postman_problems.solver import rpp_from_graph
+from postman_problems.tests.utils import create_mock_csv_from_dataframe
+
+
+def _grid(size, required_share, seed=0):
+    rand = random.Random(seed)
+    graph = nx.MultiGraph()
+    for u, v in nx.grid_2d_graph(size, size).edges():
+        graph.add_edge(u, v, distance=rand.randint(1, 9), required=int(rand.random() < required_share))
+    return graph
+
+
+def test_partition_required_edges():
+    graph = _grid(10, 0.5)
+    partitions = partition_required_edges(graph, 4)
+    assert len(partitions) == 4
+
+    # every required edge in exactly one partition
+    claimed = [e for partition in partitions for e in partition]
+    assert len(claimed) == len(set(claimed))
+    assert set(claimed) == {(u, v, k) for u, v, k, r in graph.edges(keys=True, data='required') if r}
+
+    lengths = [sum([graph[u][v][k]['distance'] for u, v, k in partition]) for partition in partitions]
+    assert max(lengths) < 1.25 * sum(lengths) / 4
+
+
+def test_partition_required_edges_cpp(GRAPH_1):
+    partitions = partition_required_edges(GRAPH_1, 2)  # no "required" attribute: every edge is required
+    assert sorted([e for partition in partitions for e in partition]) == sorted(GRAPH_1.edges(keys=True))
+
+
+def test_solve_partitions():
+    graph = _grid(8, 0.6)
+    circuits, crew_stats, summary = solve_partitions(graph, 3, start_node=(0, 0), max_workers=2)
+    assert len(circuits) == len(crew_stats) == summary['crews'] == 3
+    assert summary['distance_walked_total'] == sum([stats['distance_walked'] for stats in crew_stats])
+    assert summary['distance_walked_max'] == max([stats['distance_walked'] for stats in crew_stats])
+
+    walked = {e[:3] for circuit in circuits for e in circuit}
+    walked |= {(v, u, k) for u, v, k in walked}
+    assert all([(u, v, k) in walked for u, v, k, r in graph.edges(keys=True, data='required') if r])
+    # each crew starts from the node of its route closest to the depot
+    depot_distances = nx.single_source_dijkstra_path_length(graph, (0, 0), weight='distance')
+    for circuit in circuits:
+        assert circuit[0][0] == circuit[-1][1]
+        assert depot_distances[circuit[0][0]] == min([depot_distances[e[0]] for e in circuit])
+
+
+def test_k_rpp_single_crew(GRAPH_2):
+    edgelist = create_mock_csv_from_dataframe(nx.to_pandas_edgelist(GRAPH_2, source='_node1', target='_node2'))
+    circuits, crew_stats, summary, graph = k_rpp(edgelist, 1, start_node='a')
+    assert summary['distance_walked_max'] == sum([e[3]['distance'] for e in rpp_from_graph(GRAPH_2)]) == 116
+    assert circuits[0][0][0] == 'a'
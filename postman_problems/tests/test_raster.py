@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import imageio
+import pytest
+import numpy as np
+import networkx as nx
+from postman_problems.raster import get_node_pixels, CircuitRaster, make_circuit_raster_animation, UNWALKED, \
+    WALKED, CURRENT
+
+
+def _graph_1_xy():
+    graph = nx.MultiGraph([
+        ('a', 'b', {'distance': 5}),
+        ('a', 'c', {'distance': 20}),
+        ('b', 'c', {'distance': 10}),
+        ('c', 'd', {'distance': 3}),
+        ('d', 'b', {'distance': 2})
+    ])
+    for node, (x, y) in zip('abcd', [(0, 0), (100, 0), (100, 50), (50, 50)]):
+        graph.nodes[node].update(X=x, Y=y)
+    return graph
+
+
+def _count(frame, color):
+    return int((frame == color).all(axis=-1).sum())
+
+
+def test_get_node_pixels():
+    node_pixels, height = get_node_pixels(_graph_1_xy(), width=111, margin=5)
+    assert height == 61  # keeps the 2:1 aspect ratio of the coordinates
+    assert node_pixels == {'a': (55, 5), 'b': (55, 105), 'c': (5, 105), 'd': (5, 55)}
+
+    node_pixels, _ = get_node_pixels(_graph_1_xy(), width=111, margin=5, origin='topright')
+    assert node_pixels['a'] == (5, 105)
+
+
+def test_get_node_pixels_needs_coordinates():
+    graph = _graph_1_xy()
+    del graph.nodes['d']['X']
+    with pytest.raises(AssertionError):
+        get_node_pixels(graph)
+
+
+def test_circuit_raster_frames(GRAPH_1_CIRCUIT_CPP):
+    raster = CircuitRaster(_graph_1_xy(), width=111, margin=5, line_width=1)
+    assert _count(raster.frame, WALKED) == 0 and _count(raster.frame, CURRENT) == 0
+
+    frames = [frame.copy() for frame in raster.iter_frames(GRAPH_1_CIRCUIT_CPP)]
+    assert len(frames) == 7
+    assert all(_count(frame, CURRENT) > 0 for frame in frames)
+    assert _count(frames[-1], UNWALKED) == 0  # every edge walked
+
+    # grouped frames match the frame of the last step in each group
+    grouped = [frame.copy() for frame in raster.iter_frames(GRAPH_1_CIRCUIT_CPP, [1, 3, 6])]
+    assert all((g == frames[step]).all() for g, step in zip(grouped, [1, 3, 6]))
+
+
+def test_make_circuit_raster_animation(GRAPH_1_CIRCUIT_CPP):
+    outfile_dir = tempfile.mkdtemp()
+    outfile_movie = os.path.join(outfile_dir, 'movie.gif')
+    make_circuit_raster_animation(GRAPH_1_CIRCUIT_CPP, _graph_1_xy(), outfile_movie, width=111, margin=5,
+                                  max_frames=4)
+    frames = imageio.mimread(outfile_movie)
+    assert len(frames) == 4
+    assert np.asarray(frames[0]).shape[:2] == (61, 111)
+    shutil.rmtree(outfile_dir)
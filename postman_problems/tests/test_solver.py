@@ -1,5 +1,14 @@
+import time
+import signal
 import pytest
-from postman_problems.solver import cpp, rpp
+import multiprocessing
+import pandas as pd
+from unittest.mock import patch
+from postman_problems.solver import cpp, rpp, cpp_from_graph, rpp_from_graph, solve_concurrently, PostmanSolver, \
+    get_greedy_matching, improve_matching, get_matching_cost, SolverEvent, SolverCancelled, \
+    cpp_components_from_graph
+from postman_problems.graph import create_networkx_graph_from_edgelist
+from postman_problems.tests.utils import create_mock_csv_from_dataframe
 from postman_problems.tests.test_stats import (
     test_stats_on_simple_graph_required_edges_only,
     test_stats_on_star_graph_with_optional_edges
@@ -23,9 +32,319 @@ def test_rpp_graph_2(GRAPH_2_EDGELIST_CSV):
 
 
 def test_rpp_graph_3(GRAPH_3_EDGELIST_CSV):
-    """Testing that RPP fails on graph with 2 connected components when optional edges are removed."""
+    """Testing that RPP joins the 2 connected components left when optional edges are removed."""
+    circuit, graph = rpp(GRAPH_3_EDGELIST_CSV, start_node='a')
+    assert circuit[0][0] == circuit[-1][1] == 'a'
+    assert sum([e[3]['distance'] for e in circuit]) == 146  # required 118, b-f connector 7 and matching c-g, d-e 21
+
+    # every required edge is walked
+    walked = {frozenset(e[:2]) for e in circuit}
+    assert all([frozenset((u, v)) in walked for u, v, d in graph.edges(data='required') if d])
+
+
+def test_rpp_unreachable_component(GRAPH_2):
+    graph = GRAPH_2.copy()
+    graph.add_edge('x', 'y', distance=1, required=1)
+    with pytest.raises(AssertionError):
+        rpp_from_graph(graph)
+
+
+def _edgelist_csv(edges):
+    return create_mock_csv_from_dataframe(pd.DataFrame(edges, columns=['node1', 'node2', 'distance']))
+
+
+# two operating areas in one edgelist: a triangle with a one edge spur, and a separate path
+_TWO_AREAS = [('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 3), ('c', 'd', 4), ('x', 'y', 5), ('y', 'z', 6)]
+
+
+def test_cpp_components():
+    circuits, graph = cpp(_edgelist_csv(_TWO_AREAS), start_node='y')
+    assert len(circuits) == 2
+    assert [sum([e[3]['distance'] for e in circuit]) for circuit in circuits] == [6 + 4 * 2, (5 + 6) * 2]
+    assert all([circuit[0][0] == circuit[-1][1] for circuit in circuits])
+    assert circuits[1][0][0] == 'y'  # start node of the component that has it
+
+    cost, _ = cpp(_edgelist_csv(_TWO_AREAS), cost_only=True)
+    assert cost['distance_walked'] == 14 + 22
+
+    edges, _ = cpp(_edgelist_csv(_TWO_AREAS), stream=True)
+    assert len(list(edges)) == sum([len(circuit) for circuit in circuits])
+
     with pytest.raises(AssertionError):
-        _, _ = rpp(GRAPH_3_EDGELIST_CSV, start_node='a')
+        cpp(_edgelist_csv(_TWO_AREAS), progress=lambda event: None)
+
+
+class _Interrupt(Exception):
+    pass
+
+
+def _raise_interrupt(signum, frame):
+    raise _Interrupt()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'setitimer') or multiprocessing.get_start_method() != 'fork',
+                    reason='needs SIGALRM, and the slow stub must reach the workers')
+def _slow_circuit(solver, start_node=None):
+    time.sleep(3)
+
+
+@patch.object(PostmanSolver, 'circuit', _slow_circuit)
+def test_cpp_components_interrupted():
+    graph = create_networkx_graph_from_edgelist(pd.DataFrame(_TWO_AREAS, columns=['node1', 'node2', 'distance']))
+    previous_handler = signal.signal(signal.SIGALRM, _raise_interrupt)
+    signal.setitimer(signal.ITIMER_REAL, 0.3)
+    start = time.monotonic()
+    try:
+        with pytest.raises(_Interrupt):
+            cpp_components_from_graph(graph, max_workers=2)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+    assert time.monotonic() - start < 2  # the pool is not waited on
+    time.sleep(0.1)
+    assert multiprocessing.active_children() == []  # nor left running
+
+
+def test_cpp_components_cache_dir(tmpdir):
+    circuits, _ = cpp(_edgelist_csv(_TWO_AREAS), cache_dir=str(tmpdir))
+    assert len(tmpdir.listdir('circuit-*')) == 2  # each component checkpoints its own stages
+    circuits_rerun, _ = cpp(_edgelist_csv(_TWO_AREAS), cache_dir=str(tmpdir))
+    assert [list(c) for c in circuits_rerun] == [list(c) for c in circuits]
+
+
+@patch('postman_problems.solver.create_complete_graph')
+def test_cpp_eulerian_fast_path(mock_complete_graph):
+    circuit, graph = cpp(_edgelist_csv([('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 3)]), start_node='a')
+    mock_complete_graph.assert_not_called()
+    assert len(circuit) == 3
+    assert sum([e[3]['distance'] for e in circuit]) == 6
+    assert not any([e[3].get('augmented') for e in circuit])
+    assert circuit[0][0] == circuit[-1][1] == 'a'
+
+
+@patch('postman_problems.solver.create_complete_graph')
+def test_cpp_two_odd_nodes_fast_path(mock_complete_graph):
+    circuit, graph = cpp(_edgelist_csv([('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 3), ('c', 'd', 4)]), start_node='a')
+    mock_complete_graph.assert_not_called()
+    assert len(circuit) == 5
+    assert sum([e[3]['distance'] for e in circuit]) == 14
+    assert circuit[0][0] == circuit[-1][1] == 'a'
+
+
+@patch('postman_problems.solver.create_complete_graph')
+def test_cpp_tree_fast_path(mock_complete_graph):
+    circuit, graph = cpp(_edgelist_csv([('a', 'b', 1), ('a', 'c', 2), ('a', 'd', 3), ('d', 'e', 4)]), start_node='e')
+    mock_complete_graph.assert_not_called()
+    assert len(circuit) == 8
+    assert sum([e[3]['distance'] for e in circuit]) == 20
+    assert [e[3].get('augmented') for e in circuit].count(True) == 4
+    assert circuit[0][0] == circuit[-1][1] == 'e'
+
+
+def test_solve_concurrently(GRAPH_1, GRAPH_2):
+    graph_1_edges = [(e[0], e[1], e[2], dict(e[3])) for e in GRAPH_1.edges(keys=True, data=True)]
+
+    circuits = solve_concurrently(GRAPH_1, [{'start_node': n} for n in 'abcd' * 5], max_workers=4)
+    assert len(circuits) == 20
+    for n, circuit in zip('abcd' * 5, circuits):
+        assert circuit[0][0] == circuit[-1][1] == n
+        assert sum([e[3]['distance'] for e in circuit]) == 45
+
+    # the shared graph is untouched
+    assert [(e[0], e[1], e[2], dict(e[3])) for e in GRAPH_1.edges(keys=True, data=True)] == graph_1_edges
+
+    circuits = solve_concurrently(GRAPH_2, [{'start_node': 'a'}, {'start_node': 'c'}], postman_type='rural')
+    assert [sum([e[3]['distance'] for e in circuit]) for circuit in circuits] == [116, 116]
+
+
+def test_solve_from_graph(GRAPH_2):
+    assert len(rpp_from_graph(GRAPH_2, start_node='a')) == 6
+    assert len(cpp_from_graph(GRAPH_2, start_node='a')) == 10
+
+
+def test_postman_solver_stages(GRAPH_2):
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    assert set(solver.odd_nodes()) == {'b', 'c', 'd', 'e'}
+    assert len(solver.distances()) == 6
+    assert len(solver.matching()) == 2
+    assert solver.augmented_graph().number_of_edges() == 6
+
+    circuit = solver.circuit('a')
+    assert sum([e[3]['distance'] for e in circuit]) == 116
+
+    # a new start node only rotates the cached circuit
+    circuit_c = solver.circuit('c')
+    assert circuit_c[0][0] == circuit_c[-1][1] == 'c'
+    assert sum([e[3]['distance'] for e in circuit_c]) == 116
+    assert all([n == 1 for n in solver.stage_counts.values()])
+
+
+def test_postman_solver_edge_weights(GRAPH_2):
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    solver.circuit('a')
+
+    solver.set_edge_weights({('b', 'c', 0): 50})
+    circuit = solver.circuit('a')
+    assert sum([e[3]['distance'] for e in circuit]) == 110 + 6 + 3  # b-e and c-d instead of b-c and d-e
+    assert solver.stage_counts['odd_nodes'] == 1
+    assert solver.stage_counts['distances'] == 2
+    assert GRAPH_2['b']['c'][0]['distance'] == 2  # session works on its own copy
+
+
+def test_postman_solver_required_subset(GRAPH_2):
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    solver.circuit('a')
+
+    # requiring the whole ring keeps the same odd nodes, so distances and matching are reused
+    solver.set_required({('b', 'c', 0): 1, ('c', 'd', 0): 1, ('d', 'e', 0): 1, ('e', 'b', 0): 1})
+    circuit = solver.circuit('a')
+    assert len(circuit) == 10
+    assert solver.stage_counts['required_graph'] == 2
+    assert solver.stage_counts['distances'] == 1
+    assert solver.stage_counts['matching'] == 1
+
+
+def test_cost_only(GRAPH_1, GRAPH_2):
+    assert cpp_from_graph(GRAPH_1, cost_only=True) == {
+        'distance_walked': 45, 'distance_doublebacked': 5, 'distance_walked_once': 40}
+    assert rpp_from_graph(GRAPH_2, cost_only=True)['distance_walked'] == 116
+
+    # no augmentation or circuit
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    solver.cost()
+    assert set(solver.stage_counts) == {'required_components', 'required_graph', 'odd_nodes', 'distances', 'matching'}
+
+    # lower bound skips the matching
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    assert solver.cost(lower_bound=True)['distance_walked'] == 110 + (2 + 2 + 3 + 4) / 2  # nearest of b, c, d, e: c, b, c, d
+    assert 'matching' not in solver.stage_counts
+
+
+def test_cost_only_lower_bound_is_exact_with_two_odd_nodes(GRAPH_1):
+    assert cpp_from_graph(GRAPH_1, cost_only='lower_bound')['distance_walked'] == 45
+
+
+def test_greedy_and_improved_matching():
+    # nodes on a line at 0, 2, 3, 5: greedy takes the closest pair (b, c) first
+    position = {'a': 0, 'b': 2, 'c': 3, 'd': 5}
+    distances = {(u, v): abs(position[u] - position[v]) for u in 'abcd' for v in 'abcd' if u < v}
+    greedy = get_greedy_matching(distances)
+    assert get_matching_cost(greedy, distances) == 6
+
+    improved = improve_matching(greedy, distances)
+    assert sorted(map(sorted, improved)) == [['a', 'b'], ['c', 'd']]
+    assert get_matching_cost(improved, distances) == 4
+
+
+def test_time_budget_exact(GRAPH_2):
+    circuit = rpp_from_graph(GRAPH_2, 'a', time_budget=10)
+    assert circuit.gap == 0.0
+    assert sum([e[3]['distance'] for e in circuit]) == 116
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='the blossom stub must reach the child')
+@patch('postman_problems.solver.get_min_weight_matching', side_effect=lambda distances: time.sleep(10))
+def test_time_budget_heuristic(mock_blossom, GRAPH_2):
+    start = time.monotonic()
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    circuit = solver.circuit_within(0.05, 'a')
+    assert time.monotonic() - start < 10
+    assert 'matching' not in solver.stage_counts
+    assert multiprocessing.active_children() == []  # the blossom search was terminated, not left running
+
+    # greedy matches b-c and d-e, which is optimal here, against the lower bound of 115.5
+    assert circuit[0][0] == circuit[-1][1] == 'a'
+    assert sum([e[3]['distance'] for e in circuit]) == 116
+    assert circuit.gap == pytest.approx((116 - 115.5) / 115.5)
+
+
+@patch('postman_problems.solver.multiprocessing.Process')
+def test_time_budget_spent_before_matching(mock_process, GRAPH_2):
+    # the budget counts from the call: with none left after the distances, blossom is never started
+    circuit = PostmanSolver(GRAPH_2, 'rural').circuit_within(0, 'a')
+    mock_process.assert_not_called()
+    assert sum([e[3]['distance'] for e in circuit]) == 116
+    assert circuit.gap > 0
+
+
+@patch('postman_problems.solver.CIRCUIT_PROGRESS_STEP', 2)
+def test_progress_events(GRAPH_2):
+    events = []
+    circuit = rpp_from_graph(GRAPH_2, 'a', progress=events.append)
+
+    stages = [e.stage for e in events if e.event == 'start']
+    assert stages[0] == 'circuit'  # starts the stages it depends on before it ends
+    assert {'required_graph', 'odd_nodes', 'distances', 'matching', 'augmented_graph'} <= set(stages)
+    assert all([SolverEvent(stage, 'end', None, None) in events for stage in stages])
+
+    # one event per source odd node searched (b, c and d), and every 2 circuit edges
+    assert [(e.done, e.total) for e in events if e.stage == 'distances' and e.event == 'progress'] == \
+        [(1, 3), (2, 3), (3, 3)]
+    assert [e.done for e in events if e.stage == 'circuit' and e.event == 'progress'] == [2, 4, 6]
+    assert [(e.done, e.total) for e in events if e.stage == 'matching' and e.event == 'progress'] == [(1, 2), (2, 2)]
+    assert len(circuit) == 6
+
+
+@patch('postman_problems.solver.CIRCUIT_PROGRESS_STEP', 4)
+def test_progress_events_stream(GRAPH_2):
+    events = []
+    edges = rpp_from_graph(GRAPH_2, 'a', stream=True, progress=events.append)
+    assert not [e for e in events if e.stage == 'circuit']  # reported as the edges are consumed
+    assert len(list(edges)) == 6
+    assert [e for e in events if e.stage == 'circuit'] == [
+        SolverEvent('circuit', 'start', None, None), SolverEvent('circuit', 'progress', 4, None),
+        SolverEvent('circuit', 'progress', 6, 6), SolverEvent('circuit', 'end', None, None)]
+
+
+def test_cancel_from_progress_callback(GRAPH_2):
+    def cancel_in_distances(event):
+        if event.stage == 'distances' and event.event == 'progress':
+            raise SolverCancelled()
+
+    solver = PostmanSolver(GRAPH_2, 'rural', progress=cancel_in_distances)
+    with pytest.raises(SolverCancelled):
+        solver.circuit('a')
+    assert 'matching' not in solver.stage_counts
+    assert solver.stage_counts['odd_nodes'] == 1
+
+    # finished stages stay cached for the next solve
+    solver.progress = None
+    assert sum([e[3]['distance'] for e in solver.circuit('a')]) == 116
+    assert solver.stage_counts['odd_nodes'] == 1
+
+
+def test_cancel(GRAPH_2):
+    solver = PostmanSolver(GRAPH_2, 'rural')
+    solver.cancel()
+    with pytest.raises(SolverCancelled):
+        solver.circuit('a')
+    assert len(solver.circuit('a')) == 6  # a cancel stops one solve only
+
+
+def test_cpp_directed():
+    # one-way triangle a-b-c plus a one-way a-c street
+    edges = [('a', 'b', 1), ('b', 'c', 2), ('c', 'a', 3), ('a', 'c', 10)]
+    circuit, graph = cpp(_edgelist_csv(edges), start_node='a', directed=True)
+    assert graph.is_directed()
+    assert circuit[0][0] == circuit[-1][1] == 'a'
+    assert all([graph.has_edge(*e[:3]) for e in circuit])  # every step follows edge direction
+    assert all([circuit[i][1] == circuit[i + 1][0] for i in range(len(circuit) - 1)])
+
+    # a has one more out edge than in: the cheapest way back in is c-a
+    assert sum([e[3]['distance'] for e in circuit]) == 16 + 3
+    cost, _ = cpp(_edgelist_csv(edges), directed=True, cost_only=True)
+    assert cost['distance_doublebacked'] == 3
 
 
+def test_rpp_directed(GRAPH_2):
+    graph = GRAPH_2.to_directed()
+    for u, v, k in list(graph.edges(keys=True)):
+        if u == 'a':
+            graph.remove_edge(u, v, k)  # a only has one-way edges in
+    graph.add_edge('a', 'b', distance=20, required=1)
 
+    circuit = rpp_from_graph(graph, 'a')
+    walked = {e[:3] for e in circuit}
+    assert all([(u, v, k) in walked for u, v, k, r in graph.edges(keys=True, data='required') if r])
+    assert all([graph.has_edge(*e[:3]) for e in circuit])
+    assert circuit[0][0] == circuit[-1][1] == 'a'
@@ -1,4 +1,6 @@
-from postman_problems.stats import calculate_postman_solution_stats
+from postman_problems.stats import calculate_postman_solution_stats, calculate_components_solution_stats, \
+    StatsAccumulator
+from postman_problems.circuit import Circuit, stream_circuit
 
 
 def test_stats_on_simple_graph_required_edges_only(GRAPH_1_CIRCUIT_CPP):
@@ -34,3 +36,28 @@ def test_stats_on_star_graph_with_optional_edges(GRAPH_2_CIRCUIT_RPP):
     assert stats['edges_walked_required'] == 4
     assert stats['edges_walked_optional'] == 2
 
+
+def test_stats_on_components(GRAPH_1_CIRCUIT_CPP, GRAPH_2_CIRCUIT_RPP):
+    stats = calculate_components_solution_stats([GRAPH_1_CIRCUIT_CPP, GRAPH_2_CIRCUIT_RPP])
+    assert stats['components'] == 2
+    assert stats['distance_walked'] == 45 + 116
+    assert stats['edges_walked'] == 7 + 6
+
+
+def test_stats_on_circuit_columns(GRAPH_2_CIRCUIT_RPP):
+    assert calculate_postman_solution_stats(Circuit(GRAPH_2_CIRCUIT_RPP)) == \
+        calculate_postman_solution_stats(GRAPH_2_CIRCUIT_RPP)
+
+
+def test_stats_use_edge_weight_name(GRAPH_2_CIRCUIT_RPP):
+    circuit = [(e[0], e[1], e[2], dict(e[3], minutes=e[3]['distance'] * 2)) for e in GRAPH_2_CIRCUIT_RPP]
+    stats = calculate_postman_solution_stats(circuit, 'minutes')
+    assert stats['distance_walked'] == 232
+    assert stats['distance_walked_optional'] == 12
+
+
+def test_stats_accumulator(GRAPH_1_CIRCUIT_CPP, GRAPH_2_CIRCUIT_RPP):
+    for circuit in (GRAPH_1_CIRCUIT_CPP, GRAPH_2_CIRCUIT_RPP):
+        accumulator = StatsAccumulator()
+        stream_circuit(iter(circuit), [accumulator])
+        assert accumulator.stats() == calculate_postman_solution_stats(circuit)
@@ -0,0 +1,52 @@
+import networkx as nx
+from postman_problems.validate import CircuitValidator, validate_circuit
+from postman_problems.solver import cpp_from_graph, rpp_from_graph, cpp_components_from_graph
+from postman_problems.circuit import stream_circuit
+
+
+def test_validate_solutions(GRAPH_1, GRAPH_2):
+    assert validate_circuit(cpp_from_graph(GRAPH_1, 'a'), GRAPH_1) == []
+    assert validate_circuit(rpp_from_graph(GRAPH_2, 'a'), GRAPH_2) == []
+    assert validate_circuit(cpp_from_graph(GRAPH_2, 'a'), GRAPH_2) == []
+
+
+def test_validate_streamed(GRAPH_1):
+    validator = CircuitValidator(GRAPH_1)
+    stream_circuit(cpp_from_graph(GRAPH_1, 'a', stream=True), [validator])
+    assert validator.steps == 7
+    assert validator.problems() == []
+
+
+def test_validate_missing_step(GRAPH_1):
+    circuit = list(cpp_from_graph(GRAPH_1, 'a'))
+    problems = validate_circuit(circuit[:3] + circuit[4:], GRAPH_1)
+    assert problems[0] == 'step 3: starts at {} but the previous step ended at {}'.format(circuit[4][0], circuit[3][0])
+
+
+def test_validate_unknown_edge_and_open_circuit(GRAPH_1):
+    circuit = [('a', 'b', 0, {}), ('b', 'a', 5, {})]
+    problems = validate_circuit(circuit, GRAPH_1)
+    assert problems[0] == "step 1: edge ('b', 'a', 5) is not in the graph"
+    assert problems[-1].startswith('4 required edges are not walked')
+
+    problems = validate_circuit([('a', 'b', 0, {})], GRAPH_1)
+    assert 'circuit is not closed: starts at a and ends at b' in problems
+
+
+def test_validate_optional_edges_not_required(GRAPH_2):
+    # the RPP doesn't need to walk the optional ring, but the CPP does
+    circuit = rpp_from_graph(GRAPH_2, 'a')
+    assert validate_circuit(circuit, GRAPH_2) == []
+    cpp_graph = nx.MultiGraph(GRAPH_2.edges(keys=True))  # no "required" attribute: every edge is required
+    assert validate_circuit(circuit, cpp_graph)[-1].startswith('2 required edges are not walked')
+
+
+def test_validate_components(GRAPH_1):
+    graph = nx.disjoint_union(GRAPH_1, GRAPH_1)
+    circuits = cpp_components_from_graph(graph, max_workers=1)
+    assert validate_circuit([e for circuit in circuits for e in circuit], graph) == []
+
+    # a second closed walk somewhere else in a connected graph is not part of the route
+    circuit = list(cpp_from_graph(GRAPH_1, 'a'))
+    problems = validate_circuit(circuit + [('d', 'b', 0, {}), ('b', 'd', 0, {})], GRAPH_1)
+    assert problems == ['circuit is 2 separate walks over 1 connected components']
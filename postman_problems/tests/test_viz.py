@@ -1,6 +1,18 @@
+import io
+import os
+import shutil
+import tempfile
+import multiprocessing
+import pytest
+import imageio
 import pandas as pd
 import networkx as nx
-from postman_problems.viz import add_node_attributes
+import graphviz as gv
+from PIL import Image
+from unittest.mock import patch
+from postman_problems import viz
+from postman_problems.viz import add_node_attributes, prepare_networkx_graph_circuit_for_transformation_to_graphviz, \
+    make_circuit_images, make_circuit_animation, MovieWriter
 
 
 # ###################
@@ -29,3 +41,178 @@ def test_add_node_attributes():
     graph_node_attrs = add_node_attributes(GRAPH, NODE_ATTRIBUTES)
     assert set([n[1]['attr_fruit'] for n in graph_node_attrs.nodes(data=True)]) == \
            set(['apple', 'banana', 'cherry', 'durian'])
+
+
+def test_prepare_networkx_graph_circuit_for_transformation_to_graphviz(GRAPH_1_CIRCUIT_CPP):
+    graph = nx.MultiGraph([
+        ('a', 'b', {'id': 0, 'distance': 5}),
+        ('a', 'c', {'id': 1, 'distance': 20}),
+        ('b', 'c', {'id': 2, 'distance': 10}),
+        ('c', 'd', {'id': 3, 'distance': 3}),
+        ('d', 'b', {'id': 4, 'distance': 2})
+    ])
+    graph_gv = prepare_networkx_graph_circuit_for_transformation_to_graphviz(GRAPH_1_CIRCUIT_CPP, graph)
+    assert graph_gv['b']['d'][0]['label'] == '1, 4'
+    assert graph_gv['b']['d'][0]['penwidth'] == 4
+
+    # caller's graph is untouched
+    assert 'label' not in graph['b']['d'][0]
+
+
+def _graph_1_ids():
+    return nx.MultiGraph([
+        ('a', 'b', {'id': 0, 'distance': 5}),
+        ('a', 'c', {'id': 1, 'distance': 20}),
+        ('b', 'c', {'id': 2, 'distance': 10}),
+        ('c', 'd', {'id': 3, 'distance': 3}),
+        ('d', 'b', {'id': 4, 'distance': 2})
+    ])
+
+
+def _record_frames(frames):
+    """Stand-in for `plot_graphviz` that records the node colors and edge styles of each frame"""
+    def plot(graph, filename, *args):
+        frames[os.path.basename(filename)] = (sorted(graph.nodes(data='color')),
+                                              sorted([(u, v, k, d['color'], d['label'], d['penwidth'])
+                                                      for u, v, k, d in graph.edges(keys=True, data=True)]))
+    return plot
+
+
+def test_render_frame_ranges(GRAPH_1_CIRCUIT_CPP):
+    graph = _graph_1_ids()
+    graph_white = viz._get_blank_circuit_graph(GRAPH_1_CIRCUIT_CPP, graph)
+    viz._init_frame_worker(GRAPH_1_CIRCUIT_CPP, graph, graph_white)
+    render_args = ('out', 'png', 'neato', None, None, None)
+
+    sequential, ranges = {}, {}
+    with patch('postman_problems.viz.plot_graphviz', side_effect=_record_frames(sequential)):
+        viz._render_frames(0, 7, *render_args)
+    with patch('postman_problems.viz.plot_graphviz', side_effect=_record_frames(ranges)):
+        for start, stop in [(4, 7), (0, 2), (2, 4)]:
+            viz._render_frames(start, stop, *render_args)
+
+    # a range starting part way through the circuit renders the same frames as the sequential pass
+    assert sorted(sequential) == ['img{}'.format(i) for i in range(7)]
+    assert ranges == sequential
+
+    # frames are built one step at a time, but label the edges as if the whole prefix were prepared at once
+    prefix = prepare_networkx_graph_circuit_for_transformation_to_graphviz(GRAPH_1_CIRCUIT_CPP[:5], graph_white)
+    assert [(e[4], e[5]) for e in sequential['img4'][1]] == \
+        [(d['label'], d['penwidth']) for _, _, _, d in sorted(prefix.edges(keys=True, data=True))]
+    assert ('b', 'd', 0, 'red', '1, 4', 4) in sequential['img4'][1]
+
+
+def test_get_frame_steps(GRAPH_1_CIRCUIT_CPP):
+    assert viz.get_frame_steps(GRAPH_1_CIRCUIT_CPP) == list(range(7))
+    assert viz.get_frame_steps(GRAPH_1_CIRCUIT_CPP, max_frames=10) == list(range(7))
+    assert viz.get_frame_steps(GRAPH_1_CIRCUIT_CPP, max_frames=3) == [1, 3, 6]
+
+    distances = [e[3]['distance'] for e in GRAPH_1_CIRCUIT_CPP]
+    frame_steps = viz.get_frame_steps(GRAPH_1_CIRCUIT_CPP, max_frames=3, edge_weight='distance')
+    assert len(frame_steps) <= 3 and frame_steps[-1] == 6
+    for k, step in enumerate(frame_steps[:-1]):
+        assert sum(distances[:step + 1]) >= 45 * (k + 1) / 3 > sum(distances[:step])
+
+
+def test_render_frames_max_frames(GRAPH_1_CIRCUIT_CPP):
+    graph = _graph_1_ids()
+    graph_white = viz._get_blank_circuit_graph(GRAPH_1_CIRCUIT_CPP, graph)
+    render_args = ('out', 'png', 'neato', None, None, None)
+
+    every_step, grouped = {}, {}
+    viz._init_frame_worker(GRAPH_1_CIRCUIT_CPP, graph, graph_white)
+    with patch('postman_problems.viz.plot_graphviz', side_effect=_record_frames(every_step)):
+        viz._render_frames(0, 7, *render_args)
+    viz._init_frame_worker(GRAPH_1_CIRCUIT_CPP, graph, graph_white, [1, 3, 6])
+    with patch('postman_problems.viz.plot_graphviz', side_effect=_record_frames(grouped)):
+        for start, stop in [(1, 3), (0, 1)]:
+            viz._render_frames(start, stop, *render_args)
+
+    # each grouped frame shows the circuit as it stands after the last of its steps
+    assert grouped == {'img0': every_step['img1'], 'img1': every_step['img3'], 'img2': every_step['img6']}
+
+
+def test_get_circuit_layout():
+    graph = _graph_1_ids()
+    plain = 'graph 1 2 2\nnode a 0.5 1.5 0.75 0.5 a solid ellipse black lightgrey\n' \
+            'node b 1 1 0.75 0.5 b solid ellipse black lightgrey\nnode c 2 0.5 0.75 0.5 c solid ellipse black ' \
+            'lightgrey\nnode d 2 2 0.75 0.5 d solid ellipse black lightgrey\nstop\n'
+    cache_dir = tempfile.mkdtemp()
+    with patch('graphviz.Graph.pipe', return_value=plain) as pipe:
+        layout = viz.get_circuit_layout(graph, 'dot', cache_dir)
+        assert viz.get_circuit_layout(graph, 'dot', cache_dir) == layout  # second call loads the cached layout
+    assert pipe.call_count == 1
+    assert layout == {'a': '0.5,1.5!', 'b': '1,1!', 'c': '2,0.5!', 'd': '2,2!'}
+
+    # positions from the nodelist are kept
+    for node, pos in layout.items():
+        graph.nodes[node]['pos'] = pos
+    with patch('graphviz.Graph.pipe') as pipe:
+        assert viz.get_circuit_layout(graph) == layout
+    pipe.assert_not_called()
+    shutil.rmtree(cache_dir)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='workers need the patched renderer')
+def test_make_circuit_images_parallel(GRAPH_1_CIRCUIT_CPP):
+    def touch(graph, filename, *args):
+        open(filename + '.png', 'w').close()
+
+    graph = _graph_1_ids()
+    for node in graph:
+        graph.nodes[node]['pos'] = '0,0!'  # no layout needed
+    outfile_dir = tempfile.mkdtemp()
+    with patch('postman_problems.viz.plot_graphviz', side_effect=touch):
+        make_circuit_images(GRAPH_1_CIRCUIT_CPP, graph, outfile_dir, max_workers=2)
+    assert sorted(os.listdir(outfile_dir)) == sorted(['img{}.png'.format(i) for i in range(7)])
+    shutil.rmtree(outfile_dir)
+
+
+class _RecordingMovieWriter(object):
+    """Stand-in for `MovieWriter` that keeps the frames it is given"""
+    frames = []
+
+    def __init__(self, outfile_movie, fps=3):
+        _RecordingMovieWriter.frames = []
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+def _render_frames_in_memory(circuit, graph, **kwargs):
+    """Run `make_circuit_animation` with each frame "rendered" to its dot source"""
+    with patch.object(gv.Graph, 'pipe', autospec=True, side_effect=lambda self, *args: self.source.encode()), \
+            patch('postman_problems.viz.MovieWriter', _RecordingMovieWriter):
+        make_circuit_animation(circuit, graph, 'movie.gif', **kwargs)
+    return _RecordingMovieWriter.frames
+
+
+def test_make_circuit_animation_in_memory(GRAPH_1_CIRCUIT_CPP):
+    graph = _graph_1_ids()
+    for node in graph:
+        graph.nodes[node]['pos'] = '0,0!'
+    frames = _render_frames_in_memory(GRAPH_1_CIRCUIT_CPP, graph, max_workers=1, frames_per_task=3)
+    assert len(frames) == 7
+    assert len(set(frames)) == 7
+
+    if multiprocessing.get_start_method() == 'fork':
+        assert _render_frames_in_memory(GRAPH_1_CIRCUIT_CPP, graph, max_workers=2, frames_per_task=2,
+                                        max_pending=2) == frames
+
+
+def test_movie_writer():
+    outfile_dir = tempfile.mkdtemp()
+    with MovieWriter(os.path.join(outfile_dir, 'movie.gif'), fps=3) as writer:
+        for color in [(255, 0, 0), (0, 255, 0), (0, 0, 255)]:
+            png = io.BytesIO()
+            Image.new('RGB', (8, 8), color).save(png, 'PNG')
+            writer.write(png.getvalue())
+    assert writer.frames == 3
+    assert len(imageio.mimread(os.path.join(outfile_dir, 'movie.gif'))) == 3
+    shutil.rmtree(outfile_dir)
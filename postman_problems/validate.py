@@ -0,0 +1,114 @@
+import networkx as nx
+from postman_problems.compact import CompactGraph
+
+# problems reported one by one before the rest are only counted
+MAX_PROBLEMS = 20
+
+
+class CircuitValidator(object):
+    """
+    Sink that checks a circuit from `cpp` or `rpp` against its graph as it streams past, in O(1) per step plus one
+    O(m) setup and summary.  Edges are looked up by their id in a `CompactGraph` and walks are marked in a bitmap, so
+    this is cheap enough to run on every solve, including on streamed circuits with `circuit.stream_circuit`.
+
+    A valid circuit...
+        - only walks edges that exist in the graph (in their direction, for directed graphs).
+        - is contiguous: each step starts where the previous one ended.
+        - is closed: it ends where it started.
+        - walks every required edge at least once.  Edges without a "required" attribute are required.
+
+    The circuits of a disconnected CPP (one per connected component, see `solver.cpp`) can be checked together: each
+    step that jumps away from a closed walk starts a new walk, as long as there is one walk per component.
+    """
+
+    def __init__(self, graph):
+        """
+        Args:
+            graph (networkx MultiGraph): graph the circuit was solved on
+        """
+        self.graph = graph
+        self.compact = CompactGraph.from_networkx(graph)
+        self._edge_index = {}
+        for eid, (u, v, key) in enumerate(zip(self.compact.edge_u, self.compact.edge_v, self.compact.edge_keys)):
+            self._edge_index[(u, v, key)] = eid
+            if not self.compact.directed:
+                self._edge_index[(v, u, key)] = eid
+        self._required = bytearray([1 if attr.get('required', 1) else 0 for attr in self.compact.edge_attrs])
+        self._walked = bytearray(self.compact.number_of_edges())
+        self._walk_start = None
+        self._last = None
+        self._problems = []
+        self._more_problems = 0
+        self.steps = 0
+        self.walks = 0
+
+    def _problem(self, message):
+        if len(self._problems) < MAX_PROBLEMS:
+            self._problems.append(message)
+        else:
+            self._more_problems += 1
+
+    def write(self, edge):
+        """
+        Args:
+            edge (tuple): circuit edge: "from" node, "to" node, edge key and edge attributes
+        """
+        node_index = self.compact.node_index
+        eid = self._edge_index.get((node_index.get(edge[0]), node_index.get(edge[1]), edge[2]))
+        if eid is None:
+            self._problem('step {}: edge {} is not in the graph'.format(self.steps, tuple(edge[:3])))
+        else:
+            self._walked[eid] = 1
+
+        if self._last is None or (edge[0] != self._last and self._last == self._walk_start):
+            self.walks += 1
+            self._walk_start = edge[0]
+        elif edge[0] != self._last:
+            self._problem('step {}: starts at {} but the previous step ended at {}'.format(self.steps, edge[0],
+                                                                                         self._last))
+        self._last = edge[1]
+        self.steps += 1
+
+    def problems(self):
+        """
+        Returns:
+            list[str]: description of each problem found in the steps seen so far.  Empty if the circuit is valid.
+        """
+        problems = list(self._problems)
+        if self._more_problems:
+            problems.append('... and {} more problems with single steps'.format(self._more_problems))
+        if self._last is not None and self._last != self._walk_start:
+            problems.append('circuit is not closed: starts at {} and ends at {}'.format(self._walk_start, self._last))
+
+        if self.walks > 1:
+            components = nx.number_weakly_connected_components(self.graph) if self.compact.directed else \
+                nx.number_connected_components(self.graph)
+            if self.walks != components:
+                problems.append('circuit is {} separate walks over {} connected components'.format(self.walks,
+                                                                                                   components))
+
+        missing = [eid for eid, (required, walked) in enumerate(zip(self._required, self._walked))
+                   if required and not walked]
+        if missing:
+            compact = self.compact
+            examples = [(compact.nodes[compact.edge_u[eid]], compact.nodes[compact.edge_v[eid]], compact.edge_keys[eid])
+                        for eid in missing[:5]]
+            problems.append('{} required edges are not walked, e.g. {}'.format(len(missing), examples))
+        return problems
+
+
+def validate_circuit(circuit, graph):
+    """
+    Check a circuit from `cpp` or `rpp` before dispatching it.  See `CircuitValidator` for the checks.
+
+    Args:
+        circuit (iterable[tuple]): circuit edges, as from `cpp` or `rpp`
+        graph (networkx MultiGraph): graph the circuit was solved on
+
+    Returns:
+        list[str]: description of each problem found.  Empty if the circuit is valid.
+    """
+    validator = CircuitValidator(graph)
+    for edge in circuit:
+        validator.write(edge)
+    return validator.problems()
@@ -1,11 +1,19 @@
 import os
 import glob
+import shlex
+import shutil
 import imageio
+import subprocess
 import tqdm
 import numpy as np
 import networkx as nx
 import graphviz as gv
-from collections import defaultdict
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from postman_problems.cache import StageCache, hash_graph
+
+# circuit and graphs shared by the frame renders in each worker process, set once per worker by `_init_frame_worker`
+_frame_worker = {}
 
 
 def add_node_attributes(graph, nodelist):
@@ -68,30 +76,36 @@ def prepare_networkx_graph_circuit_for_transformation_to_graphviz(circuit, graph
 
     Args:
         circuit (list[tuple]): CPP solution from `graph.cpp`
-        graph (networkx graph): original graph
+        graph (networkx graph): original graph.  Not modified.
         edge_label_attr (str) optional name of graph edge attribute to use for label. Default None uses index from circuit.
 
     Returns:
-        networkx graph: `graph` augmented with information from `circuit`
+        networkx graph: copy of `graph` augmented with information from `circuit`
     """
+    graph = graph.copy()  # attributes are written to the copy, so callers can share `graph` between threads
     edge_cnter = defaultdict(lambda: 0)
     for i, e in enumerate(circuit):
+        _label_circuit_step(graph, i, e, edge_cnter, edge_label_attr)
+    return graph
 
-        # edge attributes
-        eid = e[3]['id']
-        key = e[2]
 
-        if eid not in edge_cnter:
-            graph[e[0]][e[1]][key]['label'] = str(graph[e[0]][e[1]][key][edge_label_attr]) if edge_label_attr else str(i)
-            graph[e[0]][e[1]][key]['penwidth'] = 1
-            graph[e[0]][e[1]][key]['decorate'] = 'true'
-        else:
-            if edge_label_attr is None:
-                graph[e[0]][e[1]][key]['label'] += ', ' + str(i)
-            graph[e[0]][e[1]][key]['penwidth'] += 3
-        edge_cnter[eid] += 1
+def _label_circuit_step(graph, i, e, edge_cnter, edge_label_attr=None):
+    """
+    Write the label, penwidth and decoration of step `i` of a circuit, edge `e`, to `graph`.  `edge_cnter` counts the
+    walks of each edge id so far and is updated.
+    """
+    eid = e[3]['id']
+    key = e[2]
 
-    return graph
+    if eid not in edge_cnter:
+        graph[e[0]][e[1]][key]['label'] = str(graph[e[0]][e[1]][key][edge_label_attr]) if edge_label_attr else str(i)
+        graph[e[0]][e[1]][key]['penwidth'] = 1
+        graph[e[0]][e[1]][key]['decorate'] = 'true'
+    else:
+        if edge_label_attr is None:
+            graph[e[0]][e[1]][key]['label'] += ', ' + str(i)
+        graph[e[0]][e[1]][key]['penwidth'] += 3
+    edge_cnter[eid] += 1
 
 
 def convert_networkx_graph_to_graphiz(graph, directed=False):
@@ -132,7 +146,7 @@ def plot_graphviz(graph, filename=None, format='svg', engine='dot', edge_label_a
     Creates a dot (graphviz) representation of a networkx graph and saves a visualization.
 
     Args:
-        graph (networkx graph): original graph augmented with ``
+        graph (networkx graph): original graph augmented with ``.  Not modified.
         filename (str): filename of viz output (leave off the file extension... this is appended from `format`)
         format (str): 'svg', 'png`, etc
         engine (str) : which graphviz engine to use: 'dot', 'neato'. 'circo', etc
@@ -147,10 +161,23 @@ def plot_graphviz(graph, filename=None, format='svg', engine='dot', edge_label_a
     """
 
     if edge_label_attr:
+        graph = graph.copy()  # don't write labels into the caller's graph
         for i, e in enumerate(graph.edges(data=True, keys=True)):
             key = e[2]
             graph[e[0]][e[1]][key]['label'] = str(graph[e[0]][e[1]][key][edge_label_attr])
 
+    graph_gv = _build_graphviz(graph, format, engine, graph_attr, node_attr, edge_attr)
+
+    # write to disk
+    if filename:
+        graph_gv.render(filename=filename, view=False)
+
+    return "Plot written to {}".format(filename)
+
+
+def _build_graphviz(graph, format='svg', engine='dot', graph_attr=None, node_attr=None, edge_attr=None):
+    """graphviz object of `graph`, ready to render.  See `plot_graphviz` for the arguments."""
+
     # convert networkx object to graphviz object
     graph_gv = convert_networkx_graph_to_graphiz(graph, directed=False)
     graph_gv.engine = engine
@@ -171,11 +198,7 @@ def plot_graphviz(graph, filename=None, format='svg', engine='dot', edge_label_a
         for k, v in edge_attr.items():
             graph_gv.edge_attr[k] = v
 
-    # write to disk
-    if filename:
-        graph_gv.render(filename=filename, view=False)
-
-    return "Plot written to {}".format(filename)
+    return graph_gv
 
 
 def plot_circuit_graphviz(circuit, graph, filename=None, format='svg', engine='dot', edge_label_attr=None,
@@ -206,49 +229,215 @@ def plot_circuit_graphviz(circuit, graph, filename=None, format='svg', engine='d
     return plot_graphviz(graph_gv, filename, format, engine, edge_label_attr, graph_attr, node_attr, edge_attr)
 
 
-def make_circuit_images(circuit, graph, outfile_dir, format='png', engine='neato',
-                        graph_attr={'strict': 'false', 'forcelabels': 'true'}, node_attr=None, edge_attr=None):
+def get_circuit_layout(graph, engine='neato', cache_dir=None):
     """
-    Builds (in a hacky way) a sequence of plots that simulate the network growing according to the eulerian path.
-    TODO: fix bug where edge labels populate with each direction (multiple walk) as soon as the first one comes up.
+    Node positions for the frames of an animation, laid out once by graphviz so every frame can pin them rather than
+    lay the graph out again.  Nodes that already have a "pos" attribute (see `add_pos_node_attribute`) keep it and no
+    layout is computed.
 
     Args:
-        circuit (list[tuple]): solution of the CPP (result from graph.cpp function
-        graph (networkx graph):
-        outfile_dir (str): path to where a series of images named like img[X].[format] will be saved.
-        format (str): 'svg', 'png`, etc
-        engine: which graphviz engine to use: 'dot', 'neato'. 'circo', etc
-        graph_attr (dict): of graphviz graph level attributes.
-        node_attr (dict): of graphviz node attributes to pass to each node
-        edge_attr (dict): of graphviz edge attributes to pass to each edge.
+        graph (networkx graph): graph to lay out
+        engine (str): which graphviz engine to lay the graph out with: 'dot', 'neato'. 'circo', etc
+        cache_dir (str): directory to cache layouts in (optional).  Layouts are keyed by a content hash of `graph` and
+            `engine`, so rendering the same graph again skips the layout.
 
     Returns:
-        No return value.  Writes a viz to disk for each instruction in the CPP.
+        dict: mapping each node to its pinned graphviz position, "x,y!" in inches
     """
-    graph_white = prepare_networkx_graph_circuit_for_transformation_to_graphviz(circuit, graph.copy())
+    if all('pos' in attr for _, attr in graph.nodes(data=True)):
+        return dict(graph.nodes(data='pos'))
+
+    cache = StageCache(cache_dir) if cache_dir else None
+    if cache:
+        key = StageCache.make_key(hash_graph(graph), engine)
+        found, layout = cache.load('layout', key)
+        if found:
+            return layout
+
+    graph_gv = convert_networkx_graph_to_graphiz(graph)
+    graph_gv.engine = engine
+    names = {str(n): n for n in graph.nodes()}
+    layout = {}
+    for line in graph_gv.pipe(format='plain', encoding='utf-8').splitlines():
+        fields = shlex.split(line)  # node names with spaces are quoted
+        if fields and fields[0] == 'node':
+            layout[names[fields[1]]] = '{},{}!'.format(fields[2], fields[3])
+
+    if cache:
+        cache.save('layout', key, layout)
+    return layout
 
-    # Start w a blank (OK, opaque) canvas
+
+def _get_blank_circuit_graph(circuit, graph):
+    """Graph of the whole circuit (see `prepare_networkx_graph_circuit_for_transformation_to_graphviz`), all greyed out"""
+    graph_white = prepare_networkx_graph_circuit_for_transformation_to_graphviz(circuit, graph)
     for e in graph_white.edges(keys=True):
         graph_white.nodes[e[0]]['color'] = graph_white.nodes[e[1]]['color'] = '#eeeeee'
         graph_white[e[0]][e[1]][e[2]]['color'] = '#eeeeee'
         graph_white[e[0]][e[1]][e[2]]['label'] = ''
+    return graph_white
+
+
+def _get_pinned_circuit_graph(circuit, graph, engine='neato', layout_cache_dir=None):
+    """Blank graph of the circuit with every node pinned to its position in `get_circuit_layout`"""
+    graph_white = _get_blank_circuit_graph(circuit, graph)
+    for node, pos in get_circuit_layout(graph, engine, layout_cache_dir).items():
+        graph_white.nodes[node]['pos'] = pos
+    return graph_white
+
+
+def _color_circuit_step(graph_white, graph, e):
+    """Color the nodes and edge of circuit step `e` as the current step of an animation frame"""
+    graph_white.nodes[e[0]]['color'] = 'black'
+    graph_white.nodes[e[1]]['color'] = 'red'  # will get overwritten at next step
+    key = e[2]
+    graph_white[e[0]][e[1]][key]['color'] = graph[e[0]][e[1]][key]['color'] if 'color' in graph[e[0]][e[1]][key] else 'red'
+
+
+def get_frame_steps(circuit, max_frames=None, edge_weight=None):
+    """
+    Choose the circuit steps that end each frame of an animation, so that at most `max_frames` frames are rendered
+    however long the circuit is.  Consecutive steps between two frames are drawn together in the later frame.  Frames
+    are spread evenly over the step count, or over the cumulative `edge_weight` of the route if given, so a frame
+    covers about the same distance walked.
+
+    Args:
+        circuit (list[tuple]): solution of the CPP (result from graph.cpp function
+        max_frames (int): most frames to render.  None renders a frame for every step.
+        edge_weight (str): edge attribute to spread frames evenly over (e.g. "distance").  None spreads them evenly
+            over the step count.
+
+    Returns:
+        list[int]: index of the last circuit step drawn in each frame, ascending.  The last is always the final step.
+    """
+    n_steps = len(circuit)
+    if not max_frames or max_frames >= n_steps:
+        return list(range(n_steps))
+
+    if edge_weight is None:
+        frame_steps = (np.arange(1, max_frames + 1) * n_steps) // max_frames - 1
+    else:
+        walked = np.cumsum([e[3].get(edge_weight, 0) for e in circuit], dtype=float)
+        targets = walked[-1] * np.arange(1, max_frames + 1) / max_frames
+        frame_steps = np.minimum(np.searchsorted(walked, targets), n_steps - 1)  # first step reaching each target
+    return np.unique(frame_steps).tolist()
 
-    # Now let's start adding some color to it, one edge at a time:
-    for i, e in enumerate(tqdm.tqdm(circuit)):
 
-        # adding node colors
-        eid = e[3]['id']
-        graph_white.nodes[e[0]]['color'] = 'black'
-        graph_white.nodes[e[1]]['color'] = 'red'  # will get overwritten at next step
+def _init_frame_worker(circuit, graph, graph_white, frame_steps=None):
+    frame_steps = list(range(len(circuit))) if frame_steps is None else frame_steps
+    _frame_worker.update(circuit=circuit, graph=graph, graph_white=graph_white, frame_steps=frame_steps)
 
-        # adding edge colors and attributes
-        key = e[2]
-        graph_white[e[0]][e[1]][key]['color'] = graph[e[0]][e[1]][key]['color'] if 'color' in graph[e[0]][e[1]][key] else 'red'
 
+def _iter_frames(start, stop):
+    """
+    Generate the graph of frames `start` to `stop` - 1 of the animation.  The state of frame `start` is built straight
+    from the circuit prefix before it, so any range can be rendered independently of the others, in any worker.  Each
+    frame then adds the colors and labels of its own steps (see `get_frame_steps`) to the previous frame's graph,
+    rather than preparing the whole prefix of the circuit again.  The same graph is updated in place between frames.
+
+    Returns:
+        generator of tuple(int, networkx graph): frame number and the graph to render for it
+    """
+    circuit, graph = _frame_worker['circuit'], _frame_worker['graph']
+    frame_steps = _frame_worker['frame_steps']
+    graph_white = _frame_worker['graph_white'].copy()
+    edge_cnter = defaultdict(lambda: 0)
+
+    def walk(first, last):
+        for i in range(first, last):
+            e = circuit[i]
+            _color_circuit_step(graph_white, graph, e)
+            _label_circuit_step(graph_white, i, e, edge_cnter)
+            graph_white[e[0]][e[1]][e[2]]['color'] = 'black'  # set walked edge back to black
+
+    step = frame_steps[start - 1] + 1 if start else 0
+    walk(0, step)
+    for i in range(start, stop):
+        walk(step, frame_steps[i])
+        e = circuit[frame_steps[i]]
+        _color_circuit_step(graph_white, graph, e)
+        _label_circuit_step(graph_white, frame_steps[i], e, edge_cnter)
+        yield i, graph_white
+        graph_white[e[0]][e[1]][e[2]]['color'] = 'black'
+        step = frame_steps[i] + 1
+
+
+def _render_frames(start, stop, outfile_dir, format, engine, graph_attr, node_attr, edge_attr):
+    """
+    Render frames `start` to `stop` - 1 of the animation to `outfile_dir`.  See `_iter_frames`.
+
+    Returns:
+        int: number of frames rendered
+    """
+    for i, graph_frame in _iter_frames(start, stop):
         png_filename = os.path.join(outfile_dir, 'img' + str(i))
-        graph_gv = plot_circuit_graphviz(circuit[0:i + 1], graph_white, png_filename, format, engine, None, graph_attr, node_attr, edge_attr)
+        plot_graphviz(graph_frame, png_filename, format, engine, None, graph_attr, node_attr, edge_attr)
+    return stop - start
+
+
+def _render_frame_bytes(start, stop, format, engine, graph_attr, node_attr, edge_attr):
+    """
+    Render frames `start` to `stop` - 1 of the animation in memory.  See `_iter_frames`.
+
+    Returns:
+        list[bytes]: each frame, encoded in image `format`
+    """
+    return [_build_graphviz(graph_frame, format, engine, graph_attr, node_attr, edge_attr).pipe()
+            for _, graph_frame in _iter_frames(start, stop)]
+
+
+def make_circuit_images(circuit, graph, outfile_dir, format='png', engine='neato',
+                        graph_attr={'strict': 'false', 'forcelabels': 'true'}, node_attr=None, edge_attr=None,
+                        max_workers=None, layout_cache_dir=None, max_frames=None, frame_weight=None):
+    """
+    Builds (in a hacky way) a sequence of plots that simulate the network growing according to the eulerian path.
+    The graph is laid out once (see `get_circuit_layout`) and every frame is drawn by neato with the nodes pinned to
+    that layout, so frames only change edge styles.  Frames are rendered in parallel worker processes, each taking
+    ranges of consecutive frames.  Frame `i` is always written to `img[i].[format]`, whichever worker renders it.
+    Long circuits can be capped at `max_frames` frames, each drawing several steps (see `get_frame_steps`).
+    TODO: fix bug where edge labels populate with each direction (multiple walk) as soon as the first one comes up.
+
+    Args:
+        circuit (list[tuple]): solution of the CPP (result from graph.cpp function
+        graph (networkx graph):
+        outfile_dir (str): path to where a series of images named like img[X].[format] will be saved.
+        format (str): 'svg', 'png`, etc
+        engine: which graphviz engine to lay the graph out with: 'dot', 'neato'. 'circo', etc
+        graph_attr (dict): of graphviz graph level attributes.
+        node_attr (dict): of graphviz node attributes to pass to each node
+        edge_attr (dict): of graphviz edge attributes to pass to each edge.
+        max_workers (int): number of worker processes.  Defaults to the number of CPUs.  1 renders every frame in
+            this process.
+        layout_cache_dir (str): directory to cache the layout in, keyed by graph content (optional)
+        max_frames (int): most images to create.  None creates one per step.
+        frame_weight (str): edge attribute to spread capped frames evenly over (e.g. "distance").  None spreads them
+            over the step count.
 
-        graph_white[e[0]][e[1]][key]['color'] = 'black'  # set walked edge back to black
+    Returns:
+        No return value.  Writes a viz to disk for each instruction in the CPP (or each frame, with `max_frames`).
+    """
+    circuit = list(circuit)
+    graph_white = _get_pinned_circuit_graph(circuit, graph, engine, layout_cache_dir)
+    frame_steps = get_frame_steps(circuit, max_frames, frame_weight)
+    render_args = (outfile_dir, format, 'neato', graph_attr, node_attr, edge_attr)  # neato keeps pinned positions
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1:
+        _init_frame_worker(circuit, graph, graph_white, frame_steps)
+        _render_frames(0, len(frame_steps), *render_args)
+        return 'Images created in {}'.format(outfile_dir)
+
+    # a few ranges per worker evens out frames that take longer to render.  Each range replays the steps before it,
+    # which is cheap next to a graphviz render.
+    n_ranges = min(len(frame_steps), 4 * max_workers)
+    bounds = [len(frame_steps) * r // n_ranges for r in range(n_ranges + 1)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_frame_worker,
+                             initargs=(circuit, graph, graph_white, frame_steps)) as executor:
+        futures = [executor.submit(_render_frames, start, stop, *render_args)
+                   for start, stop in zip(bounds[:-1], bounds[1:])]
+        with tqdm.tqdm(total=len(frame_steps)) as progress:
+            for future in as_completed(futures):
+                progress.update(future.result())
 
     return 'Images created in {}'.format(outfile_dir)
 
@@ -276,3 +465,128 @@ def make_circuit_video(infile_dir_images, outfile_movie, fps=3, format='png'):
             image = imageio.imread(filename)
             writer.append_data(image)
     return 'Movie written to {}'.format(outfile_movie)
+
+
+class MovieWriter(object):
+    """
+    Encodes frames held in memory (encoded images, e.g. PNG bytes) into a movie or GIF, one frame at a time.  MP4s are
+    piped straight into an `ffmpeg` subprocess when ffmpeg is on the PATH; anything else is decoded and appended to an
+    imageio writer.  Writers are context managers.
+    """
+
+    def __init__(self, outfile_movie, fps=3):
+        """
+        Args:
+            outfile_movie (str): filename of created movie/gif (output)
+            fps (int): frames per second for movie
+        """
+        self.outfile_movie = outfile_movie
+        self.frames = 0
+        self._ffmpeg = None
+        self._writer = None
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg and outfile_movie.lower().endswith('.mp4'):
+            self._ffmpeg = subprocess.Popen([ffmpeg, '-loglevel', 'error', '-y', '-f', 'image2pipe',
+                                             '-framerate', str(fps), '-i', '-', '-pix_fmt', 'yuv420p',
+                                             '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', outfile_movie],
+                                            stdin=subprocess.PIPE)
+        else:
+            self._writer = imageio.get_writer(outfile_movie, mode='I', fps=fps)
+
+    def write(self, frame):
+        """
+        Args:
+            frame (bytes): one encoded image
+        """
+        if self._ffmpeg is not None:
+            self._ffmpeg.stdin.write(frame)
+        else:
+            self._writer.append_data(imageio.imread(frame))
+        self.frames += 1
+
+    def close(self):
+        if self._ffmpeg is not None:
+            self._ffmpeg.stdin.close()
+            if self._ffmpeg.wait():
+                raise RuntimeError('ffmpeg failed writing {}'.format(self.outfile_movie))
+        else:
+            self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def make_circuit_animation(circuit, graph, outfile_movie, fps=3, format='png', engine='neato',
+                           graph_attr={'strict': 'false', 'forcelabels': 'true'}, node_attr=None, edge_attr=None,
+                           max_workers=None, frames_per_task=16, max_pending=None, layout_cache_dir=None,
+                           max_frames=None, frame_weight=None):
+    """
+    In-memory version of `make_circuit_images` followed by `make_circuit_video`: each frame is rendered to bytes and
+    streamed straight into the movie encoder (see `MovieWriter`), with no image files written or read back.
+
+    Frames are rendered by worker processes in ranges of `frames_per_task` and written in order as the ranges finish.
+    At most `max_pending` ranges are rendered or waiting at once, which bounds the frames held in memory.  Long
+    circuits can be capped at `max_frames` frames, each drawing several steps (see `get_frame_steps`).
+
+    Args:
+        circuit (list[tuple]): solution of the CPP (result from graph.cpp function
+        graph (networkx graph):
+        outfile_movie (str): filename of created movie/gif (output)
+        fps (int): frames per second for movie
+        format (str): image format of each frame: 'png', 'jpg', etc
+        engine: which graphviz engine to lay the graph out with: 'dot', 'neato'. 'circo', etc
+        graph_attr (dict): of graphviz graph level attributes.
+        node_attr (dict): of graphviz node attributes to pass to each node
+        edge_attr (dict): of graphviz edge attributes to pass to each edge.
+        max_workers (int): number of worker processes.  Defaults to the number of CPUs.  1 renders every frame in
+            this process.
+        frames_per_task (int): frames rendered by a worker per task
+        max_pending (int): most tasks in flight at once.  Defaults to twice `max_workers`.
+        layout_cache_dir (str): directory to cache the layout in, keyed by graph content (optional)
+        max_frames (int): most frames to render.  None renders one per step.
+        frame_weight (str): edge attribute to spread capped frames evenly over (e.g. "distance").  None spreads them
+            over the step count.
+
+    Returns:
+        No return value.  Writes a movie/gif to disk
+    """
+    circuit = list(circuit)
+    graph_white = _get_pinned_circuit_graph(circuit, graph, engine, layout_cache_dir)
+    frame_steps = get_frame_steps(circuit, max_frames, frame_weight)
+    render_args = (format, 'neato', graph_attr, node_attr, edge_attr)  # neato keeps pinned positions
+    bounds = list(range(0, len(frame_steps), frames_per_task)) + [len(frame_steps)]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+
+    max_workers = max_workers or os.cpu_count() or 1
+    with MovieWriter(outfile_movie, fps) as writer, tqdm.tqdm(total=len(frame_steps)) as progress:
+        if max_workers == 1:
+            _init_frame_worker(circuit, graph, graph_white, frame_steps)
+            for start, stop in ranges:
+                for frame in _render_frame_bytes(start, stop, *render_args):
+                    writer.write(frame)
+                progress.update(stop - start)
+            return 'Movie written to {}'.format(outfile_movie)
+
+        max_pending = max_pending or 2 * max_workers
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_frame_worker,
+                                 initargs=(circuit, graph, graph_white, frame_steps)) as executor:
+            pending = deque()
+            ranges = iter(ranges)
+
+            def submit_next_range():
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(executor.submit(_render_frame_bytes, *(next_range + render_args)))
+
+            for _ in range(max_pending):
+                submit_next_range()
+            while pending:
+                frames = pending.popleft().result()  # in frame order, whichever range finishes first
+                for frame in frames:
+                    writer.write(frame)
+                progress.update(len(frames))
+                submit_next_range()
+    return 'Movie written to {}'.format(outfile_movie)
@@ -41,6 +41,7 @@ setup(
         'console_scripts': [
             'chinese_postman=postman_problems.postman_chinese:chinese_postman',
             'rural_postman=postman_problems.postman_rural:rural_postman',
+            'postman_batch=postman_problems.batch:postman_batch',
             'chinese_postman_sleeping_giant=postman_problems.examples.sleeping_giant.cpp_sleeping_giant:main',
             'rural_postman_sleeping_giant=postman_problems.examples.sleeping_giant.rpp_sleeping_giant:main',
             'chinese_postman_seven_bridges=postman_problems.examples.seven_bridges.cpp_seven_bridges:main',
@@ -49,11 +50,12 @@ setup(
     },
     python_requires='>=3.7.1',
     install_requires=[
+        'numpy',
         'pandas',
         'networkx>=2.0'
     ],
     extras_require={
-        'viz': ['imageio', 'matplotlib', 'graphviz', 'tqdm'],
+        'viz': ['imageio', 'matplotlib', 'graphviz', 'tqdm', 'pillow'],
         'test': ['pytest', 'pytest-cov', 'pytest-console-scripts']
     }
 )